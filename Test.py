@@ -2,9 +2,19 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import io
+import os
 import datetime
 import locale
-import yfinance as yf
+from armazem_dados import ArmazemDados
+from cache_resultados import CacheResultados, impressao_completa, impressao_digital
+from instrumentacao import Instrumentacao, configurar_log, contado
+from tarefas import ExecutorTarefas
+from fontes_dados import COLUNAS_YAHOO, CacheOHLCV, abrir_colunar, baixar_universo, caminho_colunar, formatar_ticker, impressao_do_arquivo, ler_intraday_em_blocos, podar_colunares, salvar_colunar
+from motor_backtest import (PERIODOS_RECENTES, construir_piramide, horario_do_segundo, processar_dados, aplicar_gatilho_e_criar_resumo, criar_resumo_por_horario_fixo, preparar_dados_day_trade,
+                            simular_day_trade_com_percentagens, varrer_variacoes_day_trade, calcular_metricas_de_resumo, calcular_metricas_recentes,
+                            calcular_metricas_recentes_por_dia_semana, calcular_series_rolantes, criar_tabela_dia_semana, otimizar_janelas_intraday,
+                            METODOS_REAMOSTRAGEM, reamostrar_trades, alinhar_universo, simular_day_trade_universo)
+from walk_forward import CRITERIO_PADRAO, criar_pool_processos, executar_walk_forward
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -21,292 +31,255 @@ except locale.Error:
 
 # --- Bloco de Funções ---
 
-def carregar_dados(arquivo_enviado):
+def carregar_dados(arquivo_enviado, impressao, salvar_versao_colunar=False):
     if arquivo_enviado is None: return None
+    caminho = caminho_colunar(impressao)
+    if os.path.exists(caminho):
+        dados = abrir_colunar(caminho)
+        st.success("Versão colunar do arquivo reaberta do cache.")
+        return dados
     try:
-        if arquivo_enviado.name.endswith('.csv'):
-            dados = pd.read_csv(arquivo_enviado, sep=';', encoding='latin1', header=0, decimal=',')
-            st.success("Arquivo CSV lido com sucesso.")
-            return dados
-        elif arquivo_enviado.name.endswith('.xlsx'):
-            dados = pd.read_excel(arquivo_enviado, engine='openpyxl')
-            st.success("Arquivo XLSX lido com sucesso.")
-            return dados
+        dados = ler_intraday_em_blocos(arquivo_enviado, arquivo_enviado.name)
+        st.success(f"Arquivo {'CSV' if arquivo_enviado.name.endswith('.csv') else 'XLSX'} lido com sucesso.")
+    except ValueError as e:
+        # Arquivo lido, mas sem o formato esperado (coluna ausente, extensão não suportada): a mensagem já diz o que falta
+        st.error(f"Falha ao ler o arquivo. {e}")
+        return None
     except Exception as e:
         st.error(f"Falha ao ler o arquivo. Verifique o formato e a codificação. Erro: {e}")
         return None
+    if salvar_versao_colunar:
+        try:
+            salvar_colunar(dados, caminho)
+            podar_colunares()
+        except Exception as e: st.warning(f"Não foi possível salvar a versão colunar do arquivo. Erro: {e}")
+    return dados
+
+@st.cache_resource
+def obter_cache_ohlcv():
+    return CacheOHLCV()
+
+@st.cache_resource
+def iniciar_log_etapas():
+    # Uma vez por processo: as etapas medidas em todas as sessões vão para o mesmo log JSON.
+    return configurar_log()
+
+@st.cache_resource
+def obter_armazem():
+    # Os datasets carregados ficam num armazém único do processo; a sessão guarda só a referência ao frame.
+    # Ao subir, apaga o que execuções anteriores deixaram no disco.
+    armazem = ArmazemDados()
+    armazem.limpar_disco()
+    podar_colunares()
+    return armazem
+
+@st.cache_resource
+def obter_pool_walk_forward():
+    # Um pool de processos por processo do app: as dobras de todos os walk-forwards em andamento dividem os
+    # mesmos PROCESSOS_PADRAO processos, em vez de cada tarefa abrir o seu.
+    return criar_pool_processos()
 
-def processar_dados(dados, modo_analise):
-    dados_processados = dados.copy()
+@st.cache_resource
+def obter_executor_tarefas():
+    # Buscas e backtests longos rodam fora do script, num executor único do processo; os resultados ficam
+    # guardados pelos parâmetros e qualquer rerun ou sessão que peça os mesmos parâmetros os reaproveita.
+    return ExecutorTarefas(max_workers=4, max_por_usuario=2)
+
+def enviar_tarefa(chave, descricao, funcao, *args, **kwargs):
     try:
-        if modo_analise == "Análise Intraday":
-            dados_processados['Data'] = pd.to_datetime(dados_processados['Data'], dayfirst=True, errors='coerce')
-            dados_processados.dropna(subset=['Data'], inplace=True)
-            if 'Hora' not in dados_processados.columns:
-                st.error("Para a Análise Intraday com arquivo, a coluna 'Hora' é necessária.")
-                return None
-            dados_processados['Timestamp'] = pd.to_datetime(dados_processados['Data'].dt.strftime('%Y-%m-%d') + ' ' + dados_processados['Hora'].astype(str))
-            dados_processados = dados_processados.set_index('Timestamp').sort_index()
-        elif modo_analise == "Análise Day Trade":
-            if isinstance(dados.index, pd.DatetimeIndex):
-                dados_processados = dados
-            else:
-                dados_processados['Data'] = pd.to_datetime(dados_processados['Data'], dayfirst=True, errors='coerce')
-                dados_processados.dropna(subset=['Data'], inplace=True)
-                dados_processados['Data'] = dados_processados['Data'].dt.normalize()
-                dados_processados.drop_duplicates(subset=['Data'], keep='first', inplace=True)
-                dados_processados = dados_processados.set_index('Data')
-    except Exception as e:
-        st.error(f"Erro ao processar a coluna 'Data'. Verifique o formato. Erro: {e}")
+        return obter_executor_tarefas().enviar(st.session_state.instrumentacao.sessao, chave, descricao, funcao, *args, **kwargs)
+    except ValueError as e:
+        st.warning(str(e))
         return None
-    return dados_processados
 
-@st.cache_data
-def buscar_dados_intraday_online(ticker, data_inicio, data_fim, tipo_ativo):
-    if (data_fim - data_inicio).days > 60:
-        st.error("Período muito longo! Para dados intraday de 15 minutos, o Yahoo Finance permite buscar no máximo 60 dias.")
-        return None
-    ticker_formatado = ticker.upper()
-    if tipo_ativo == "Ação (Brasil)":
-        if not ticker_formatado.endswith('.SA'): ticker_formatado = f"{ticker_formatado}.SA"
-    elif tipo_ativo == "Forex":
-        ticker_formatado = f"{ticker_formatado}=X"
-    try:
-        ativo = yf.Ticker(ticker_formatado)
-        dados = ativo.history(start=data_inicio, end=data_fim, interval="15m", auto_adjust=False)
-        if dados.empty:
-            st.error(f"Nenhum dado intraday encontrado para '{ticker_formatado}'. O ativo pode não ter liquidez ou o período é muito antigo.")
-            return None
-        dados.index = dados.index.tz_convert('America/Sao_Paulo').tz_localize(None)
-        dados.rename(columns={'Open': 'Abertura', 'High': 'Máxima', 'Low': 'Mínima', 'Close': 'Fechamento'}, inplace=True)
-        return dados
-    except Exception as e:
-        st.error(f"Falha ao buscar dados online. Erro: {e}")
+# Nomes, no session_state, das tarefas cujo resultado alguma seção desta sessão ainda vai recolher.
+TAREFAS_DA_SESSAO = ('tarefa_intraday', 'tarefa_universo', 'tarefa_walk_forward')
+
+def acompanhar_tarefa(nome, chave):
+    st.session_state[nome] = chave
+    st.session_state.chaves_avisadas.discard(chave)
+
+def chaves_acompanhadas():
+    # A tarefa pode ser de outra sessão (mesmos parâmetros): quem acompanha é a sessão que guardou a chave.
+    return {st.session_state[nome] for nome in TAREFAS_DA_SESSAO if st.session_state.get(nome) is not None}
+
+def tarefa_concluida(nome):
+    # Confere a tarefa registrada na sessão sob `nome`. Enquanto ela roda devolve None (o progresso aparece no
+    # painel da barra lateral); quando termina, esquece o registro e devolve o resultado (None se falhou ou foi cancelada).
+    chave = st.session_state.get(nome)
+    if chave is None: return None
+    executor = obter_executor_tarefas()
+    tarefa = executor.obter(chave)
+    if tarefa is not None and tarefa.ativa:
+        st.info(f"{tarefa.descricao} em andamento em segundo plano. Acompanhe ou cancele pela barra lateral.")
         return None
+    st.session_state[nome] = None
+    st.session_state.chaves_avisadas.discard(chave)
+    if tarefa is None: return None
+    if tarefa.estado == 'Erro': st.error(f"{tarefa.descricao} falhou. Erro: {tarefa.erro}")
+    elif tarefa.estado == 'Cancelada': st.info(f"{tarefa.descricao} cancelada.")
+    return executor.resultado(chave) if tarefa.estado == 'Concluída' else None
+
+@st.fragment(run_every=1.0)
+def painel_tarefas():
+    # Atualiza sozinho, sem rerodar a página. Quando alguma tarefa acompanhada termina (inclusive antes do fim do
+    # script que a pediu, ou sendo de outra sessão), reroda a página inteira uma vez para que a seção pegue o
+    # resultado. Se a seção não estiver na tela, a chave fica esperando sem rerodar de novo.
+    executor = obter_executor_tarefas()
+    acompanhadas = chaves_acompanhadas()
+    ativas = {tarefa.chave: tarefa for tarefa in executor.tarefas(st.session_state.instrumentacao.sessao) if tarefa.ativa}
+    ativas.update({chave: tarefa for chave in acompanhadas if (tarefa := executor.obter(chave)) is not None and tarefa.ativa})
+    terminaram = acompanhadas - ativas.keys() - st.session_state.chaves_avisadas
+    if terminaram:
+        st.session_state.chaves_avisadas |= terminaram
+        st.rerun()
+    st.subheader("⏳ Tarefas em Segundo Plano")
+    for posicao, tarefa in enumerate(ativas.values()):
+        st.progress(min(tarefa.progresso, 1.0), text=f"{tarefa.descricao} · {tarefa.mensagem or tarefa.estado} · {tarefa.duracao():.0f} s")
+        if st.button("Cancelar", key=f"cancelar_tarefa_{posicao}_{hash(tarefa.chave)}"): tarefa.cancelar()
+
+def executar_walk_forward_em_segundo_plano(tarefa, *args, **kwargs):
+    return executar_walk_forward(*args, progresso=lambda feitas, total: tarefa.informar(feitas, total, f"Dobras avaliadas: {feitas}/{total}"), **kwargs)
+
+def buscar_dados_intraday_online(tarefa, cache_ohlcv, armazem, chave):
+    # Roda em segundo plano, sem chamadas ao Streamlit: baixa pelo cache em disco e publica no armazém. Devolve
+    # só a chave: o frame fica com o armazém, e o resultado guardado da tarefa não o impede de ser solto.
+    _, ticker_formatado, intervalo, data_inicio, data_fim = chave
+    def baixar():
+        dados = cache_ohlcv.obter(ticker_formatado, data_inicio, data_fim, intervalo=intervalo, progresso=lambda feitas, total: tarefa.informar(feitas, total, f"Janelas baixadas: {feitas}/{total}"))
+        if dados.empty: raise ValueError(f"Nenhum dado intraday encontrado para '{ticker_formatado}'. O ativo pode não ter liquidez ou o período é muito antigo.")
+        return dados.rename(columns=COLUNAS_YAHOO)
+    armazem.obter_ou_publicar(chave, baixar)
+    return chave
 
-def aplicar_gatilho_e_criar_resumo(df, variacao_teste, hora_final):
-    df_original = df.copy()
-    fechamentos_diarios = df_original.resample('D')['Fechamento'].last()
-    fechamento_anterior = fechamentos_diarios.shift(1).dropna()
-    dias_com_gatilho = []
-    for dia, fech_anterior in fechamento_anterior.items():
-        preco_gatilho = fech_anterior * (1 + variacao_teste / 100)
-        dados_do_dia = df_original[df_original.index.date == dia.date()]
-        candle_gatilho = None
-        if variacao_teste > 0:
-            primeiro_candle_acima = dados_do_dia[dados_do_dia['Máxima'] >= preco_gatilho]
-            if not primeiro_candle_acima.empty: candle_gatilho = primeiro_candle_acima.iloc[0]
-        else:
-            primeiro_candle_abaixo = dados_do_dia[dados_do_dia['Mínima'] <= preco_gatilho]
-            if not primeiro_candle_abaixo.empty: candle_gatilho = primeiro_candle_abaixo.iloc[0]
-        if candle_gatilho is not None:
-            hora_entrada, hora_saida = candle_gatilho.name, datetime.datetime.combine(dia.date(), hora_final)
-            if hora_saida > hora_entrada:
-                candle_saida_lookup = df_original.asof(hora_saida)
-                dados_operacao = dados_do_dia.loc[hora_entrada:hora_saida]
-                if dados_operacao.empty: continue
-                dias_com_gatilho.append({'Timestamp': dia, 'Hora Abertura': candle_gatilho.name.time(),'Abertura': preco_gatilho, 'Hora Máxima': dados_operacao['Máxima'].idxmax().time(),'Maxima': dados_operacao['Máxima'].max(), 'Hora Mínima': dados_operacao['Mínima'].idxmin().time(),'Minima': dados_operacao['Mínima'].min(), 'Hora Fechamento': candle_saida_lookup.name.time(),'Fechamento': candle_saida_lookup['Fechamento']})
-    if not dias_com_gatilho: return None
-    return pd.DataFrame(dias_com_gatilho).set_index('Timestamp')
-
-def criar_resumo_por_horario_fixo(df, hora_inicial, hora_final):
-    operacoes_diarias = []
-    for dia, dados_do_dia in df.groupby(df.index.date):
-        if hora_inicial >= hora_final: continue
-        dados_operacao = dados_do_dia.between_time(hora_inicial, hora_final)
-        if dados_operacao.empty: continue
-        candle_entrada = dados_operacao.iloc[0]
-        candle_saida = dados_operacao.iloc[-1]
-        operacoes_diarias.append({'Timestamp': pd.to_datetime(dia), 'Hora Abertura': candle_entrada.name.time(), 'Abertura': candle_entrada['Abertura'], 'Hora Máxima': dados_operacao['Máxima'].idxmax().time(), 'Maxima': dados_operacao['Máxima'].max(), 'Hora Mínima': dados_operacao['Mínima'].idxmin().time(), 'Minima': dados_operacao['Mínima'].min(), 'Hora Fechamento': candle_saida.name.time(), 'Fechamento': candle_saida['Fechamento']})
-    if not operacoes_diarias: return None
-    return pd.DataFrame(operacoes_diarias).set_index('Timestamp')
-
-@st.cache_data
 def buscar_dados_online_daytrade(ticker, data_inicio, data_fim, tipo_ativo):
-    ticker_formatado = ticker.upper()
-    if tipo_ativo == "Ação (Brasil)":
-        if not ticker_formatado.endswith('.SA'): ticker_formatado = f"{ticker_formatado}.SA"
-    elif tipo_ativo == "Forex":
-        ticker_formatado = f"{ticker_formatado}=X"
-    try:
-        ativo = yf.Ticker(ticker_formatado)
-        dados = ativo.history(start=data_inicio, end=data_fim, auto_adjust=False)
+    ticker_formatado = formatar_ticker(ticker, tipo_ativo)
+    def baixar():
+        dados = obter_cache_ohlcv().obter(ticker_formatado, data_inicio, data_fim, intervalo="1d")
         if dados.empty:
             st.error(f"Nenhum dado encontrado para o ticker '{ticker_formatado}'. Verifique o código do ativo, o tipo ou o período.")
             return None
-        dados.index = dados.index.tz_localize(None)
-        return dados
+        return preparar_dados_day_trade(dados)
+    try:
+        return obter_armazem().obter_ou_publicar(('yahoo', ticker_formatado, '1d', data_inicio, data_fim), contado(baixar))
     except Exception as e:
         st.error(f"Falha ao buscar dados online. Erro: {e}")
         return None
 
-def preparar_dados_day_trade(df):
-    df_prep = df.copy()
-    df_prep.rename(columns={'Open': 'Abertura', 'High': 'Máxima', 'Low': 'Mínima', 'Close': 'Fechamento', 'Volume': 'Volume'}, inplace=True)
-    df_prep['Fechamento_Anterior'] = df_prep['Fechamento'].shift(1)
-    df_prep.dropna(inplace=True)
-    df_prep['% Abertura'] = (df_prep['Abertura'] / df_prep['Fechamento_Anterior'] - 1)
-    df_prep['% Máxima'] = (df_prep['Máxima'] / df_prep['Fechamento_Anterior'] - 1)
-    df_prep['% Mínima'] = (df_prep['Mínima'] / df_prep['Fechamento_Anterior'] - 1)
-    df_prep['% Fechamento'] = (df_prep['Fechamento'] / df_prep['Fechamento_Anterior'] - 1)
-    df_prep.index.name = 'Data'
-    colunas_necessarias = ['Abertura', 'Máxima', 'Mínima', 'Fechamento', 'Volume', '% Abertura', '% Máxima', '% Mínima', '% Fechamento']
-    return df_prep[colunas_necessarias]
-
-def simular_day_trade_com_percentagens(df, variacao_teste, tipo_operacao):
-    operacoes = []
-    df_copy = df.copy()
-    variacao_teste_decimal = variacao_teste / 100.0
-    for index, dia in df_copy.iterrows():
-        gatilho_atingido = False
-        ponto_zero_decimal = 0.0
-        abertura_pct_decimal = dia['% Abertura']
-        maxima_pct_decimal = dia['% Máxima']
-        minima_pct_decimal = dia['% Mínima']
-        fechamento_pct_decimal = dia['% Fechamento']
-        abertura_acionou = False
-        if variacao_teste_decimal > 0 and abertura_pct_decimal >= variacao_teste_decimal: abertura_acionou = True
-        elif variacao_teste_decimal < 0 and abertura_pct_decimal <= variacao_teste_decimal: abertura_acionou = True
-        if abertura_acionou:
-            gatilho_atingido = True
-            ponto_zero_decimal = abertura_pct_decimal
-        else:
-            if variacao_teste_decimal > 0 and maxima_pct_decimal >= variacao_teste_decimal:
-                gatilho_atingido = True; ponto_zero_decimal = variacao_teste_decimal
-            elif variacao_teste_decimal < 0 and minima_pct_decimal <= variacao_teste_decimal:
-                gatilho_atingido = True; ponto_zero_decimal = variacao_teste_decimal
-        if gatilho_atingido:
-            resultado_decimal = 0.0
-            if tipo_operacao == 'Compra': resultado_decimal = fechamento_pct_decimal - ponto_zero_decimal
-            else: resultado_decimal = ponto_zero_decimal - fechamento_pct_decimal
-            operacoes.append({'Data': index, 'Abertura': dia['Abertura'], 'Maxima': dia['Máxima'], 'Minima': dia['Mínima'], 'Fechamento': dia['Fechamento'], '% Abertura': abertura_pct_decimal, '% Máxima': maxima_pct_decimal, '% Mínima': minima_pct_decimal, '% Fechamento': fechamento_pct_decimal, 'Resultado %': resultado_decimal, 'Preco_Entrada_Pct': ponto_zero_decimal})
-    if not operacoes: return None
-    return pd.DataFrame(operacoes).set_index('Data')
-
-def calcular_metricas_de_resumo(resumo_periodo, tipo_operacao):
-    if resumo_periodo is None or len(resumo_periodo) < 1: return None
-    total_trades = len(resumo_periodo)
-    if 'Resultado %' not in resumo_periodo.columns:
-        if tipo_operacao == 'Compra':
-            resumo_periodo['Resultado %'] = (resumo_periodo['Fechamento'] - resumo_periodo['Abertura']) / resumo_periodo['Abertura']
-        else:
-            resumo_periodo['Resultado %'] = (resumo_periodo['Abertura'] - resumo_periodo['Fechamento']) / resumo_periodo['Abertura']
-    resultado_op_decimal = resumo_periodo['Resultado %']
-    acertos = (resultado_op_decimal > 0).sum()
-    erros = total_trades - acertos
-    taxa_acerto = (acertos / total_trades) * 100 if total_trades > 0 else 0
-    taxa_erro = (erros / total_trades) * 100 if total_trades > 0 else 0
-    melhor_momento, pior_momento = 0.0, 0.0
-    if 'Preco_Entrada_Pct' in resumo_periodo.columns:
-        if tipo_operacao == 'Compra':
-            melhor_momento = (resumo_periodo['% Máxima'] - resumo_periodo['Preco_Entrada_Pct']).max() * 100
-            pior_momento = (resumo_periodo['% Mínima'] - resumo_periodo['Preco_Entrada_Pct']).min() * 100
-        else:
-            melhor_momento = (resumo_periodo['Preco_Entrada_Pct'] - resumo_periodo['% Mínima']).max() * 100
-            pior_momento = (resumo_periodo['Preco_Entrada_Pct'] - resumo_periodo['% Máxima']).min() * 100
-    else:
-        if tipo_operacao == 'Compra':
-            melhor_momento = ((resumo_periodo['Maxima'] - resumo_periodo['Abertura']) / resumo_periodo['Abertura']).max() * 100
-            pior_momento = ((resumo_periodo['Minima'] - resumo_periodo['Abertura']) / resumo_periodo['Abertura']).min() * 100
-        else:
-            melhor_momento = ((resumo_periodo['Abertura'] - resumo_periodo['Minima']) / resumo_periodo['Abertura']).max() * 100
-            pior_momento = ((resumo_periodo['Abertura'] - resumo_periodo['Maxima']) / resumo_periodo['Abertura']).min() * 100
-    metricas = {"Total de Trades": total_trades, "Nº de Acertos": acertos, "Nº de Erros": erros, "Taxa de Acerto (%)": taxa_acerto, "Taxa de Erro (%)": taxa_erro, "Resultado Final Acumulado (%)": resultado_op_decimal.sum() * 100, "Ganho Médio (% por Trade)": resultado_op_decimal.mean() * 100, "Ganho Máximo (1 Trade %)": resultado_op_decimal.max() * 100, "Perda Máxima (1 Trade %)": resultado_op_decimal.min() * 100, "Melhor Momento (Excursão Favorável %)": melhor_momento, "Pior Momento (Excursão Adversa %)": pior_momento}
-    return metricas
-
-def calcular_metricas_recentes(resumo_periodo):
-    if resumo_periodo is None or len(resumo_periodo) < 5: return None
-    resultados = []
-    periodos = [5, 10, 15, 20, 25]
-    for p in periodos:
-        if len(resumo_periodo) >= p:
-            ultimos_trades = resumo_periodo.tail(p)
-            resultado_op_decimal = ultimos_trades['Resultado %']
-            ganho_medio = resultado_op_decimal.mean() * 100
-            acertos = (resultado_op_decimal > 0).sum()
-            taxa_acerto = (acertos / p) * 100
-            resultados.append({"Período (Últimos Trades)": f"{p}", "Ganho Médio (%)": ganho_medio, "% Acertos": taxa_acerto})
-    if not resultados: return None
-    return pd.DataFrame(resultados).set_index("Período (Últimos Trades)")
-
-def calcular_metricas_recentes_por_dia_semana(resumo_periodo):
-    if resumo_periodo is None or resumo_periodo.empty: return None
-    df = resumo_periodo.copy()
-    mapa_dias = {0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira', 4: 'Sexta-feira'}
-    df['Dia da Semana'] = df.index.dayofweek.map(mapa_dias)
-    df.dropna(subset=['Dia da Semana'], inplace=True)
-    resultados_lista = []
-    periodos = [5, 10, 15, 20, 25]
-    dias_semana_ordenados = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira']
-    for dia in dias_semana_ordenados:
-        trades_do_dia = df[df['Dia da Semana'] == dia]
-        for p in periodos:
-            if len(trades_do_dia) >= p:
-                ultimos_trades = trades_do_dia.tail(p)
-                resultado_op_decimal = ultimos_trades['Resultado %']
-                ganho_medio = resultado_op_decimal.mean() * 100
-                acertos = (resultado_op_decimal > 0).sum()
-                taxa_acerto = (acertos / p) * 100
-                resultados_lista.append({"Dia da Semana": dia, "Período (Trades)": p, "Ganho Médio (%)": ganho_medio, "% Acertos": taxa_acerto})
-    if not resultados_lista: return None
-    df_resultados = pd.DataFrame(resultados_lista)
-    try:
-        pivot = df_resultados.pivot_table(index="Período (Trades)", columns="Dia da Semana", values=["Ganho Médio (%)", "% Acertos"])
-        dias_presentes = df_resultados['Dia da Semana'].unique()
-        dias_ordenados_presentes = [dia for dia in dias_semana_ordenados if dia in dias_presentes]
-        pivot = pivot.swaplevel(0, 1, axis=1)[dias_ordenados_presentes]
-        pivot.index = pd.to_numeric(pivot.index)
-        pivot = pivot.sort_index()
-        pivot.index = pivot.index.astype(str)
-        return pivot
-    except Exception:
-        return None
+def buscar_universo_online(tarefa, cache_ohlcv, tickers, data_inicio, data_fim, tipo_ativo):
+    # Roda em segundo plano: todos os tickers em paralelo pelo cache em disco. Devolve (universo, {ticker: erro});
+    # os que falham ficam de fora do universo.
+    tickers_formatados = {formatar_ticker(ticker, tipo_ativo): ticker for ticker in tickers}
+    dados, falhas = baixar_universo(cache_ohlcv.obter, list(tickers_formatados), data_inicio, data_fim, progresso=lambda feitos, total: tarefa.informar(feitos, total, f"Ativos baixados: {feitos}/{total}"))
+    universo = alinhar_universo({tickers_formatados[ticker]: preparar_dados_day_trade(frame) for ticker, frame in dados.items()})
+    return universo, {tickers_formatados[ticker]: erro for ticker, erro in falhas.items()}
+
+def definir_dados_intraday(dados, chave=None):
+    # A pirâmide de tempos gráficos (níveis, índices por dia e candles diários) é montada uma única vez por
+    # dataset, no armazém, e reaproveitada por todas as sessões. Os níveis derivados também são publicados no
+    # armazém (mapeados em memória) e, como a própria pirâmide, saem dele quando nenhuma sessão os usa mais.
+    st.session_state.intraday_data = dados
+    st.session_state.piramide_intraday = None
+    if dados is not None:
+        armazem = obter_armazem()
+        publicar_nivel = lambda nome, nivel: armazem.publicar(chave + ('nivel', nome), nivel)
+        with st.session_state.instrumentacao.etapa("construir_piramide", len(dados), cache=True):
+            st.session_state.piramide_intraday = armazem.anexo(chave, 'piramide', contado(construir_piramide), dados, publicar_nivel)
 
-def criar_tabela_dia_semana(resumo_periodo, tipo_operacao):
-    if resumo_periodo is None or resumo_periodo.empty: return None
-    df = resumo_periodo.copy()
-    mapa_dias = {0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'}
-    df['Dia da Semana Num'] = df.index.dayofweek
-    df['Resultado Op'] = df['Resultado %'] * 100
-    df['Acerto'] = df['Resultado Op'] > 0
-    tabela = df.groupby('Dia da Semana Num').agg(Total=('Resultado Op', 'count'), Acertos=('Acerto', 'sum'), Lucro_Medio_Pct=('Resultado Op', 'mean'))
-    tabela.index = tabela.index.map(mapa_dias); tabela.index.name = "Dia da Semana"
-    tabela['Erros'] = tabela['Total'] - tabela['Acertos']
-    tabela['% Acertos'] = (tabela['Acertos'] / tabela['Total']) * 100
-    tabela['% Erros'] = (tabela['Erros'] / tabela['Total']) * 100
-    if not tabela.empty:
-        somas = tabela[['Acertos', 'Erros', 'Total']].sum()
-        medias = tabela[['% Acertos', '% Erros', 'Lucro_Medio_Pct']].mean()
-        total_row = pd.concat([somas, medias]); total_row.name = 'Total / Média'
-        tabela = pd.concat([tabela, pd.DataFrame(total_row).T])
-    ordem_dias = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
-    tabela_ordenada = tabela.reindex(index=ordem_dias).dropna(how='all')
-    if 'Total / Média' in tabela.index: tabela_ordenada = pd.concat([tabela_ordenada, tabela.loc[['Total / Média']]])
-    tabela_ordenada.rename(columns={'Acertos': 'Nº de Acertos', 'Erros': 'Nº de Erros', 'Total': 'Total de Eventos', 'Lucro_Medio_Pct': '% Lucro Médio'}, inplace=True)
-    return tabela_ordenada[['Nº de Acertos', 'Nº de Erros', 'Total de Eventos', '% Acertos', '% Erros', '% Lucro Médio']]
+def calcular_resumo_e_metricas(funcao_resumo, argumentos, tipo_operacao):
+    # calcular_metricas_de_resumo grava 'Resultado %' no resumo, então os dois são calculados e guardados juntos.
+    instrumentacao = st.session_state.instrumentacao
+    with instrumentacao.etapa(funcao_resumo.__name__, len(argumentos[0])):
+        resumo = funcao_resumo(*argumentos)
+    with instrumentacao.etapa("calcular_metricas_de_resumo", len(resumo) if resumo is not None else 0):
+        return resumo, calcular_metricas_de_resumo(resumo, tipo_operacao)
+
+TAMANHOS_PAGINA = [50, 100, 250, 1000]
+FORMATOS_TRADES = {'Abertura': '{:,.2f}', 'Maxima': '{:,.2f}', 'Minima': '{:,.2f}', 'Fechamento': '{:,.2f}', '% Abertura': '{:,.2f}', '% Máxima': '{:,.2f}', '% Mínima': '{:,.2f}', '% Fechamento': '{:,.2f}', 'Resultado %': '{:,.2f}'}
+COLUNAS_PCT_TRADES = ['% Abertura', '% Máxima', '% Mínima', '% Fechamento', 'Resultado %']
+
+def preparar_pagina_trades(pagina):
+    # Formatação do índice e colunas percentuais, só nas linhas visíveis
+    pagina = pagina.copy()
+    if isinstance(pagina.index, pd.DatetimeIndex):
+        pagina.index = pagina.index.strftime('%d/%m/%Y')
+    for col in COLUNAS_PCT_TRADES:
+        if col in pagina.columns:
+            pagina[col] = pagina[col] * 100
+    return pagina
+
+def exibir_tabela_paginada(tabela, chave, formatos=None, preparar_pagina=None):
+    # O Styler só formata a página visível: o custo de cada rerun depende do tamanho da página, não da tabela.
+    total = len(tabela)
+    col_tamanho, col_pagina, col_info = st.columns([1, 1, 2])
+    tamanho_pagina = col_tamanho.selectbox("Linhas por página", TAMANHOS_PAGINA, key=f"{chave}_tamanho_pagina")
+    paginas = max(1, -(-total // tamanho_pagina))
+    pagina = col_pagina.number_input(f"Página (de {paginas:,})", min_value=1, max_value=paginas, value=1, step=1, key=f"{chave}_pagina_{total}_{tamanho_pagina}")
+    inicio = (pagina - 1) * tamanho_pagina
+    col_info.caption(f"Linhas {inicio + 1:,} a {min(inicio + tamanho_pagina, total):,} de {total:,}")
+    fatia = tabela.iloc[inicio:inicio + tamanho_pagina]
+    if preparar_pagina is not None: fatia = preparar_pagina(fatia)
+    st.dataframe(fatia.style.format(formatter=formatos, decimal=',', thousands='.'))
+    oferecer_download(tabela, chave)
+
+def oferecer_download(tabela, chave):
+    # Os arquivos da tabela inteira só são gerados quando pedidos, e não ficam guardados na sessão.
+    col_csv, col_parquet = st.columns(2)
+    if col_csv.button("Gerar CSV", key=f"{chave}_gerar_csv"):
+        col_csv.download_button("⬇️ Baixar CSV", tabela.to_csv(sep=';', decimal=',').encode('latin1', errors='replace'), file_name=f"{chave}.csv", mime="text/csv", key=f"{chave}_baixar_csv")
+    if col_parquet.button("Gerar Parquet", key=f"{chave}_gerar_parquet"):
+        buffer = io.BytesIO()
+        tabela.to_parquet(buffer)
+        col_parquet.download_button("⬇️ Baixar Parquet", buffer.getvalue(), file_name=f"{chave}.parquet", mime="application/octet-stream", key=f"{chave}_baixar_parquet")
 
 # --- Interface Principal ---
 st.title("📈 Analisador de Backtest")
 
+iniciar_log_etapas()
+if 'instrumentacao' not in st.session_state: st.session_state.instrumentacao = Instrumentacao()
+instrumentacao = st.session_state.instrumentacao
+instrumentacao.nova_execucao()
 if 'day_trade_data' not in st.session_state: st.session_state.day_trade_data = None
-if 'intraday_data' not in st.session_state: st.session_state.intraday_data = None
+if 'universo_data' not in st.session_state: st.session_state.universo_data = None
+if 'intraday_data' not in st.session_state: definir_dados_intraday(None)
+if 'cache_resultados' not in st.session_state: st.session_state.cache_resultados = CacheResultados()
+if 'chaves_avisadas' not in st.session_state: st.session_state.chaves_avisadas = set()
+cache_resultados = st.session_state.cache_resultados
 
-modo_analise = st.selectbox("Selecione o Modo de Análise", ("Análise Intraday", "Análise Day Trade"))
+modo_analise = st.selectbox("Selecione o Modo de Análise", ("Análise Intraday", "Análise Day Trade", "Análise de Universo"))
 
 df_processado = None
 
 if modo_analise == "Análise Intraday":
     st.session_state.day_trade_data = None
-    st.write("Escolha a fonte dos dados para a análise Intraday (gráfico de 15 min).")
+    st.session_state.universo_data = None
+    st.write("Escolha a fonte dos dados para a análise Intraday. Os tempos gráficos mais longos e os candles diários são derivados dos candles carregados.")
     fonte_dados_intraday = st.radio("Fonte dos Dados Intraday", ("Fazer Upload de Arquivo", "Buscar Online (Yahoo Finance)"), horizontal=True, key="fonte_intraday")
     if fonte_dados_intraday == "Fazer Upload de Arquivo":
         arquivo_csv = st.file_uploader("Selecione o arquivo CSV ou XLSX", type=["csv", "xlsx"], key="intraday_uploader")
-        if arquivo_csv:
-            df_bruto = carregar_dados(arquivo_csv)
-            if df_bruto is not None:
-                st.session_state.intraday_data = processar_dados(df_bruto, modo_analise)
+        salvar_versao_colunar = st.checkbox("Guardar uma versão colunar do arquivo para reabri-lo instantaneamente em sessões futuras", value=True, key="salvar_colunar")
+        if arquivo_csv and (st.session_state.intraday_data is None or st.session_state.get('arquivo_intraday') != (arquivo_csv.name, arquivo_csv.size)):
+            impressao_arquivo = impressao_do_arquivo(arquivo_csv.getvalue())
+            chave_upload = ('upload', impressao_arquivo)
+            dados_upload = obter_armazem().obter(chave_upload)
+            if dados_upload is None:
+                with instrumentacao.etapa("Leitura do arquivo") as etapa_leitura:
+                    df_bruto = carregar_dados(arquivo_csv, impressao_arquivo, salvar_versao_colunar)
+                    if df_bruto is not None: etapa_leitura.linhas = len(df_bruto)
+                if df_bruto is not None:
+                    try:
+                        with instrumentacao.etapa("processar_dados", len(df_bruto)):
+                            df_upload = processar_dados(df_bruto, modo_analise)
+                        with instrumentacao.etapa("Publicação no armazém", len(df_upload)):
+                            dados_upload = obter_armazem().publicar(chave_upload, df_upload)
+                    except ValueError as e:
+                        st.error(str(e))
+            else:
+                st.success("Arquivo já carregado por outra sessão; reaproveitando os dados compartilhados.")
+            definir_dados_intraday(dados_upload, chave_upload)
+            if dados_upload is not None: st.session_state.arquivo_intraday = (arquivo_csv.name, arquivo_csv.size)
     elif fonte_dados_intraday == "Buscar Online (Yahoo Finance)":
-        st.info("A busca online para dados intraday está limitada aos últimos 60 dias.")
+        st.info("Períodos longos são divididos em janelas de até 59 dias e baixados em paralelo. O Yahoo Finance só mantém o histórico recente de candles de 15 minutos, então janelas antigas podem vir vazias.")
         col1, col2 = st.columns([1, 2])
         with col1:
             tipo_ativo_intraday = st.selectbox("Tipo de Ativo", ["Ação (Brasil)", "Forex", "Criptomoeda"], key="tipo_ativo_intraday")
@@ -325,61 +298,145 @@ if modo_analise == "Análise Intraday":
             st.write("")
             if st.button("Buscar Dados Intraday", use_container_width=True):
                 if ticker_intraday and data_inicio_intraday and data_fim_intraday:
-                    with st.spinner(f"Buscando dados para {ticker_intraday}..."):
-                        dados_online = buscar_dados_intraday_online(ticker_intraday, data_inicio_intraday, data_fim_intraday, tipo_ativo_intraday)
-                        if dados_online is not None:
-                            st.session_state.intraday_data = dados_online
-                            st.success(f"Dados de {ticker_intraday} carregados!")
+                    chave_online = ('yahoo', formatar_ticker(ticker_intraday, tipo_ativo_intraday), '15m', data_inicio_intraday, data_fim_intraday)
+                    if enviar_tarefa(chave_online, f"Busca de {chave_online[1]} (15 min)", buscar_dados_intraday_online, obter_cache_ohlcv(), obter_armazem(), chave_online) is not None:
+                        acompanhar_tarefa('tarefa_intraday', chave_online)
+        chave_online = tarefa_concluida('tarefa_intraday')
+        if chave_online is not None:
+            dados_online = obter_armazem().obter(chave_online)
+            if dados_online is None:
+                obter_executor_tarefas().descartar(chave_online)
+                st.warning("Os dados baixados já saíram do armazém compartilhado. Busque novamente: o cache em disco torna a nova busca rápida.")
+            else:
+                definir_dados_intraday(dados_online, chave_online)
+                st.success(f"Dados de {chave_online[1]} carregados!")
     if st.session_state.intraday_data is not None:
-        df_processado = st.session_state.intraday_data
+        piramide = st.session_state.piramide_intraday
+        nivel_intraday = st.sidebar.selectbox("Tempo Gráfico", list(piramide.intraday), key="nivel_intraday")
+        df_processado = piramide.intraday[nivel_intraday]
         if st.sidebar.button("Limpar Dados Intraday"):
-            st.session_state.intraday_data = None
+            definir_dados_intraday(None)
+            st.session_state.arquivo_intraday = None
             st.rerun()
 
 elif modo_analise == "Análise Day Trade":
-    st.session_state.intraday_data = None
-    st.write("Busque por um ativo para iniciar a análise Day Trade.")
+    # Os dados intraday carregados continuam disponíveis: seus candles diários já estão prontos na pirâmide.
+    st.session_state.universo_data = None
+    fontes_day_trade = ["Buscar Online (Yahoo Finance)"]
+    if st.session_state.piramide_intraday is not None: fontes_day_trade.append("Candles Diários do Intraday Carregado")
+    fonte_day_trade = st.radio("Fonte dos Dados Day Trade", fontes_day_trade, horizontal=True, key="fonte_day_trade")
+    if fonte_day_trade == "Candles Diários do Intraday Carregado":
+        st.session_state.day_trade_data = st.session_state.piramide_intraday.day_trade
+        st.info(f"Usando {len(st.session_state.day_trade_data)} candles diários derivados dos dados intraday carregados.")
+    else:
+        if st.session_state.piramide_intraday is not None and st.session_state.day_trade_data is st.session_state.piramide_intraday.day_trade:
+            st.session_state.day_trade_data = None
+        st.write("Busque por um ativo para iniciar a análise Day Trade.")
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            tipo_ativo = st.selectbox("Tipo de Ativo", ["Ação (Brasil)", "Forex", "Criptomoeda"])
+        with col2:
+            placeholder_text = "Ex: PETR4"
+            if tipo_ativo == "Forex": placeholder_text = "Ex: EURUSD, EURBRL"
+            elif tipo_ativo == "Criptomoeda": placeholder_text = "Ex: BTC-USD, ETH-BRL"
+            ticker = st.text_input("Código do Ativo", placeholder=placeholder_text)
+        col_data1, col_data2, col_btn = st.columns([2, 2, 1])
+        with col_data1:
+            hoje = datetime.date.today()
+            data_inicio = st.date_input("Data de Início", hoje - datetime.timedelta(days=365*2))
+        with col_data2:
+            data_fim = st.date_input("Data de Fim", hoje)
+        with col_btn:
+            st.write("")
+            if st.button("Buscar Dados", use_container_width=True):
+                if ticker and data_inicio and data_fim:
+                    if data_inicio >= data_fim:
+                        st.error("A data de início deve ser anterior à data de fim.")
+                    else:
+                        with st.spinner(f"Buscando dados para {ticker}..."):
+                            with instrumentacao.etapa("Busca Yahoo (diário)", cache=True) as etapa_busca:
+                                dados_day_trade = buscar_dados_online_daytrade(ticker, data_inicio, data_fim, tipo_ativo)
+                                if dados_day_trade is not None: etapa_busca.linhas = len(dados_day_trade)
+                            if dados_day_trade is not None:
+                                st.session_state.day_trade_data = dados_day_trade
+                                st.success(f"Dados de {ticker} carregados!")
+                else:
+                    st.warning("Por favor, preencha o código do ativo.")
+    if st.session_state.day_trade_data is not None:
+        df_processado = st.session_state.day_trade_data
+        if st.sidebar.button("Limpar Dados e Nova Busca"):
+            st.session_state.day_trade_data = None
+            st.rerun()
+
+elif modo_analise == "Análise de Universo":
+    definir_dados_intraday(None)
+    st.session_state.day_trade_data = None
+    st.write("Simule a estratégia Day Trade em vários ativos de uma vez e compare-os num ranking.")
     col1, col2 = st.columns([1, 2])
     with col1:
-        tipo_ativo = st.selectbox("Tipo de Ativo", ["Ação (Brasil)", "Forex", "Criptomoeda"])
+        tipo_ativo_universo = st.selectbox("Tipo de Ativo", ["Ação (Brasil)", "Forex", "Criptomoeda"], key="tipo_ativo_universo")
     with col2:
-        placeholder_text = "Ex: PETR4"
-        if tipo_ativo == "Forex": placeholder_text = "Ex: EURUSD, EURBRL"
-        elif tipo_ativo == "Criptomoeda": placeholder_text = "Ex: BTC-USD, ETH-BRL"
-        ticker = st.text_input("Código do Ativo", placeholder=placeholder_text)
+        texto_tickers = st.text_area("Códigos dos Ativos (separados por vírgula, espaço ou linha)", "PETR4, VALE3, ITUB4, BBDC4, ABEV3, BBAS3, WEGE3, B3SA3", key="tickers_universo")
     col_data1, col_data2, col_btn = st.columns([2, 2, 1])
     with col_data1:
         hoje = datetime.date.today()
-        data_inicio = st.date_input("Data de Início", hoje - datetime.timedelta(days=365*2))
+        data_inicio_universo = st.date_input("Data de Início", hoje - datetime.timedelta(days=365*2), key="data_inicio_universo")
     with col_data2:
-        data_fim = st.date_input("Data de Fim", hoje)
+        data_fim_universo = st.date_input("Data de Fim", hoje, key="data_fim_universo")
     with col_btn:
         st.write("")
-        if st.button("Buscar Dados", use_container_width=True):
-            if ticker and data_inicio and data_fim:
-                if data_inicio >= data_fim:
-                    st.error("A data de início deve ser anterior à data de fim.")
-                else:
-                    with st.spinner(f"Buscando dados para {ticker}..."):
-                        dados_brutos_online = buscar_dados_online_daytrade(ticker, data_inicio, data_fim, tipo_ativo)
-                        if dados_brutos_online is not None:
-                            st.session_state.day_trade_data = preparar_dados_day_trade(dados_brutos_online)
-                            st.success(f"Dados de {ticker} carregados!")
+        if st.button("Buscar Universo", use_container_width=True):
+            tickers_universo = list(dict.fromkeys(ticker for ticker in texto_tickers.replace(',', ' ').split() if ticker))
+            if not tickers_universo:
+                st.warning("Por favor, informe ao menos um código de ativo.")
+            elif data_inicio_universo >= data_fim_universo:
+                st.error("A data de início deve ser anterior à data de fim.")
             else:
-                st.warning("Por favor, preencha o código do ativo.")
-    if st.session_state.day_trade_data is not None:
-        df_processado = st.session_state.day_trade_data
-        if st.sidebar.button("Limpar Dados e Nova Busca"):
-            st.session_state.day_trade_data = None
+                chave_busca_universo = ('universo', tuple(tickers_universo), data_inicio_universo, data_fim_universo, tipo_ativo_universo)
+                if enviar_tarefa(chave_busca_universo, f"Busca do universo ({len(tickers_universo)} ativos)", buscar_universo_online, obter_cache_ohlcv(), tickers_universo, data_inicio_universo, data_fim_universo, tipo_ativo_universo) is not None:
+                    acompanhar_tarefa('tarefa_universo', chave_busca_universo)
+    chave_busca_universo = st.session_state.get('tarefa_universo')
+    busca_universo = tarefa_concluida('tarefa_universo')
+    if busca_universo is not None:
+        universo, falhas_universo = busca_universo
+        if falhas_universo: st.warning("Sem dados para: " + ", ".join(f"{ticker} ({erro})" for ticker, erro in falhas_universo.items()))
+        if universo is None:
+            st.error("Nenhum ticker do universo retornou dados. Verifique os códigos, o tipo de ativo ou o período.")
+        else:
+            st.session_state.universo_data = (chave_busca_universo, universo)
+            st.success(f"{len(universo.tickers)} ativos carregados!")
+    if st.session_state.universo_data is not None:
+        chave_universo, universo = st.session_state.universo_data
+        if st.sidebar.button("Limpar Universo"):
+            st.session_state.universo_data = None
             st.rerun()
+        st.sidebar.header(f"⚙️ Parâmetros - {modo_analise}")
+        variacao_universo = st.sidebar.number_input("Variação Teste (%)", min_value=-100.00, max_value=100.00, value=2.0, step=0.1, format="%.2f", key="variacao_universo")
+        tipo_operacao_universo = st.sidebar.radio("Tipo de Operação", ('Compra', 'Venda'), horizontal=True, key="tipo_operacao_universo")
+        criterio_universo = st.sidebar.selectbox("Ordenar ranking por", (CRITERIO_PADRAO, "Ganho Médio (% por Trade)", "Taxa de Acerto (%)", "Total de Trades"), key="criterio_universo")
+        with instrumentacao.etapa("Backtest do universo (cache de resultados)", universo.abertura.size, cache=True):
+            ranking_universo, curva_universo = cache_resultados.obter_ou_calcular(chave_universo + (variacao_universo, tipo_operacao_universo, criterio_universo), contado(simular_day_trade_universo), universo, variacao_universo, tipo_operacao_universo, criterio_universo)
+        st.header("🏆 Ranking do Universo")
+        st.write(f"{len(universo.tickers)} ativos · {len(universo.datas)} pregões · {int(ranking_universo['Total de Trades'].sum())} trades")
+        st.dataframe(ranking_universo.style.format({"Total de Trades": "{:.0f}", "Nº de Acertos": "{:.0f}", "Nº de Erros": "{:.0f}"} | {coluna: "{:,.2f}%" for coluna in ranking_universo.columns if "%" in coluna}, decimal=',', thousands='.', na_rep="-"))
+        st.header("📈 Curva Combinada (Peso Igual)")
+        st.caption("Em cada pregão, o resultado é a média dos trades abertos no dia; a curva acumula esses resultados.")
+        st.line_chart(curva_universo['Resultado Acumulado (%)'])
+        with st.expander("Visualizar Curva por Pregão"):
+            if st.toggle("Exibir curva", key="exibir_curva_universo"):
+                exibir_tabela_paginada(curva_universo, "curva_universo", {"Trades": "{:.0f}", "Resultado Médio (%)": "{:,.2f}%", "Resultado Acumulado (%)": "{:,.2f}%"})
 
 if df_processado is not None:
     st.sidebar.header(f"⚙️ Parâmetros - {modo_analise}")
     resumo_base = None
     tipo_operacao = 'Compra'
     dias_selecionados_num = []
+    ativar_varredura = False
+    ativar_otimizador = False
+    impressao_dados = impressao_digital(df_processado)
 
     if modo_analise == "Análise Intraday":
+        indice_intraday = piramide.indices[nivel_intraday]
         st.sidebar.subheader("Modo de Análise")
         ativar_gatilho = st.sidebar.checkbox("Ativar Gatilho por Variação")
         variacao_teste = 0.0
@@ -390,34 +447,73 @@ if df_processado is not None:
         tipo_operacao = st.sidebar.radio("Tipo de Operação", ('Compra', 'Venda'), horizontal=True)
         st.sidebar.subheader("Janela de Tempo")
         if not ativar_gatilho:
-            hora_inicial = st.sidebar.time_input("Hora Inicial", value=df_processado.index.time.min() if len(df_processado.index.time) > 0 else datetime.time(9, 0))
+            hora_inicial = st.sidebar.time_input("Hora Inicial", value=horario_do_segundo(indice_intraday.segundos_do_dia.min()) if len(df_processado) > 0 else datetime.time(9, 0))
             tempo_grafico = "Diário (por Horário Fixo)"
+            ativar_otimizador = st.sidebar.checkbox("Otimizar Janela (Hora Inicial × Hora Final)")
         else:
             tempo_grafico = "Diário (por Gatilho)"
-        hora_final = st.sidebar.time_input("Hora Final", value=df_processado.index.time.max() if len(df_processado.index.time) > 0 else datetime.time(18, 0))
+        hora_final = st.sidebar.time_input("Hora Final", value=horario_do_segundo(indice_intraday.segundos_do_dia.max()) if len(df_processado) > 0 else datetime.time(18, 0))
         st.sidebar.markdown("---")
         st.sidebar.subheader("Filtros da Tabela Semanal")
         dias_semana_map = {"Segunda-feira": 0, "Terça-feira": 1, "Quarta-feira": 2, "Quinta-feira": 3, "Sexta-feira": 4, "Sábado": 5, "Domingo": 6}
         dias_selecionados_num = [num for dia, num in dias_semana_map.items() if st.sidebar.checkbox(dia, value=True, key=f"day_intraday_{num}")]
         
-        if ativar_gatilho:
-            resumo_base = aplicar_gatilho_e_criar_resumo(df_processado, variacao_teste, hora_final)
-        else:
-            resumo_base = criar_resumo_por_horario_fixo(df_processado, hora_inicial, hora_final)
+        with instrumentacao.etapa("Backtest (cache de resultados)", len(df_processado), cache=True):
+            if ativar_gatilho:
+                resumo_base, resultados_gerais = cache_resultados.obter_ou_calcular(('gatilho', impressao_dados, variacao_teste, hora_final, tipo_operacao), contado(calcular_resumo_e_metricas), aplicar_gatilho_e_criar_resumo, (df_processado, variacao_teste, hora_final, indice_intraday), tipo_operacao)
+            else:
+                resumo_base, resultados_gerais = cache_resultados.obter_ou_calcular(('horario_fixo', impressao_dados, hora_inicial, hora_final, tipo_operacao), contado(calcular_resumo_e_metricas), criar_resumo_por_horario_fixo, (df_processado, hora_inicial, hora_final, indice_intraday), tipo_operacao)
         st.header(f"📊 Painel de Resultados - {tempo_grafico}")
         
     elif modo_analise == "Análise Day Trade":
         st.sidebar.subheader("Estratégia de Gatilho")
         valor_input_dt = st.sidebar.number_input("Variação Teste (%)", min_value=-100.00, max_value=100.00, value=2.0, step=0.1, format="%.2f")
         tipo_operacao = st.sidebar.radio("Tipo de Operação", ('Compra', 'Venda'), horizontal=True)
+        ativar_varredura = st.sidebar.checkbox("Ativar Varredura de Variações (Compra e Venda)")
+        if ativar_varredura:
+            variacao_minima = st.sidebar.number_input("Variação Mínima (%)", min_value=-100.00, max_value=100.00, value=-5.0, step=0.1, format="%.2f")
+            variacao_maxima = st.sidebar.number_input("Variação Máxima (%)", min_value=-100.00, max_value=100.00, value=5.0, step=0.1, format="%.2f")
+            passo_variacao = st.sidebar.number_input("Passo da Varredura (%)", min_value=0.01, max_value=10.00, value=0.05, step=0.01, format="%.2f")
         st.sidebar.markdown("---")
         st.sidebar.subheader("Filtros da Tabela Semanal")
         dias_semana_map = {"Segunda-feira": 0, "Terça-feira": 1, "Quarta-feira": 2, "Quinta-feira": 3, "Sexta-feira": 4}
         dias_selecionados_num = [num for dia, num in dias_semana_map.items() if st.sidebar.checkbox(dia, value=True, key=f"day_daytrade_{num}")]
-        resumo_base = simular_day_trade_com_percentagens(df_processado, valor_input_dt, tipo_operacao)
+        with instrumentacao.etapa("Backtest (cache de resultados)", len(df_processado), cache=True):
+            resumo_base, resultados_gerais = cache_resultados.obter_ou_calcular(('day_trade', impressao_dados, valor_input_dt, tipo_operacao), contado(calcular_resumo_e_metricas), simular_day_trade_com_percentagens, (df_processado, valor_input_dt, tipo_operacao), tipo_operacao)
         st.header("📊 Painel de Resultados")
 
-    resultados_gerais = calcular_metricas_de_resumo(resumo_base, tipo_operacao)
+    with st.sidebar.expander("🎲 Reamostragem (Intervalos de Confiança)"):
+        reamostragens = st.number_input("Sequências reamostradas", min_value=1_000, max_value=200_000, value=10_000, step=1_000)
+        metodo_reamostragem = st.radio("Método", METODOS_REAMOSTRAGEM, horizontal=True, help="Bootstrap sorteia os trades com reposição; embaralhamento só muda a ordem e afeta apenas o drawdown.")
+        confianca_reamostragem = st.slider("Nível de confiança (%)", min_value=80, max_value=99, value=95)
+        semente_reamostragem = st.number_input("Semente", min_value=0, max_value=2 ** 31 - 1, value=0, step=1)
+
+    st.sidebar.markdown("---")
+    ativar_walk_forward = st.sidebar.checkbox("Ativar Walk-Forward (Fora da Amostra)")
+    if ativar_walk_forward:
+        dias_treino_wf = st.sidebar.number_input("Dias de Treino", min_value=5, max_value=5000, value=252 if modo_analise == "Análise Day Trade" else 40, step=1)
+        dias_teste_wf = st.sidebar.number_input("Dias de Teste", min_value=1, max_value=1000, value=21 if modo_analise == "Análise Day Trade" else 10, step=1)
+        criterio_wf = st.sidebar.selectbox("Critério de Escolha no Treino", [CRITERIO_PADRAO, "Taxa de Acerto (%)", "Ganho Médio (% por Trade)"])
+        minimo_trades_wf = st.sidebar.number_input("Mínimo de Trades no Treino", min_value=1, max_value=1000, value=5, step=1)
+        variacoes_wf, horas_finais_wf = (), ()
+        if modo_analise == "Análise Day Trade" or ativar_gatilho:
+            variacao_minima_wf = st.sidebar.number_input("Variação Mínima do Treino (%)", min_value=-100.00, max_value=100.00, value=-3.0, step=0.1, format="%.2f")
+            variacao_maxima_wf = st.sidebar.number_input("Variação Máxima do Treino (%)", min_value=-100.00, max_value=100.00, value=3.0, step=0.1, format="%.2f")
+            passo_variacao_wf = st.sidebar.number_input("Passo das Variações do Treino (%)", min_value=0.01, max_value=10.00, value=0.25, step=0.01, format="%.2f")
+            variacoes_wf = tuple(v for v in np.round(np.arange(variacao_minima_wf, variacao_maxima_wf + passo_variacao_wf / 2, passo_variacao_wf), 4) if v != 0)
+            if modo_analise == "Análise Intraday": horas_finais_wf = (hora_final,)
+
+    with st.sidebar.expander("🗄️ Cache de Resultados"):
+        limite_cache_mb = st.number_input("Limite de memória por sessão (MB)", min_value=16, max_value=4096, value=256, step=16)
+        cache_resultados.ajustar_limites(max_bytes=limite_cache_mb * 1024 ** 2)
+        estatisticas_cache = cache_resultados.estatisticas()
+        st.write(f"Acertos: {estatisticas_cache['Acertos']} · Falhas: {estatisticas_cache['Falhas']} · Taxa de acerto: {estatisticas_cache['Taxa de Acerto (%)']:.1f}%")
+        st.write(f"Itens: {estatisticas_cache['Itens']} · Memória: {estatisticas_cache['Memória (MB)']:.1f} MB")
+        estatisticas_armazem = obter_armazem().estatisticas()
+        st.write(f"Datasets compartilhados entre sessões: {estatisticas_armazem['Datasets']} · {estatisticas_armazem['Linhas']:,} linhas · {estatisticas_armazem['Mapeado (MB)']:.1f} MB mapeados ({estatisticas_armazem['Fixados']} retidos pelo armazém)")
+        if st.button("Limpar Cache de Resultados"):
+            cache_resultados.limpar()
+            st.rerun()
     
     if resultados_gerais:
         st.subheader("📄 Métricas de Desempenho")
@@ -441,39 +537,148 @@ if df_processado is not None:
     else:
         st.warning("Nenhum trade foi gerado para os parâmetros definidos.")
 
+    if resultados_gerais and len(resumo_base) > 1:
+        with instrumentacao.etapa("reamostrar_trades", len(resumo_base), cache=True):
+            intervalos_confianca, distribuicao_drawdown = cache_resultados.obter_ou_calcular(('reamostragem', impressao_digital(resumo_base), tipo_operacao, reamostragens, metodo_reamostragem, confianca_reamostragem, semente_reamostragem), contado(reamostrar_trades), resumo_base, tipo_operacao, reamostragens, metodo_reamostragem, confianca_reamostragem / 100, semente_reamostragem)
+        st.markdown("---")
+        st.subheader(f"🎲 Intervalos de Confiança ({confianca_reamostragem}%, {reamostragens:,} sequências por {metodo_reamostragem})")
+        col_ic, col_dd = st.columns([3, 2])
+        with col_ic:
+            st.dataframe(intervalos_confianca.style.format("{:,.2f}", na_rep="-"))
+        with col_dd:
+            st.markdown("<h6>Distribuição do Drawdown Máximo (%)</h6>", unsafe_allow_html=True)
+            contagens, bordas = np.histogram(distribuicao_drawdown, bins=40)
+            st.bar_chart(pd.Series(contagens, index=[f"{borda:.1f}" for borda in bordas[:-1]], name="Sequências"))
+            quantis_drawdown = np.quantile(distribuicao_drawdown, [0.5, 0.95, 0.99])
+            st.write(f"Mediana: {quantis_drawdown[0]:.2f}% · P95: {quantis_drawdown[1]:.2f}% · P99: {quantis_drawdown[2]:.2f}%")
+
+    if ativar_varredura:
+        st.markdown("---")
+        st.subheader("🔎 Varredura de Variações")
+        variacoes_varredura = np.round(np.arange(variacao_minima, variacao_maxima + passo_variacao / 2, passo_variacao), 4)
+        if len(variacoes_varredura) == 0:
+            st.warning("A variação mínima deve ser menor ou igual à variação máxima.")
+        else:
+            with instrumentacao.etapa("varrer_variacoes_day_trade", len(df_processado), cache=True):
+                grade_varredura = cache_resultados.obter_ou_calcular(('varredura', impressao_dados, tuple(variacoes_varredura)), contado(varrer_variacoes_day_trade), df_processado, variacoes_varredura)
+            metrica_varredura = st.selectbox("Métrica", list(grade_varredura.columns), index=list(grade_varredura.columns).index("Resultado Final Acumulado (%)"))
+            mapa_varredura = grade_varredura[metrica_varredura].unstack("Tipo de Operação")
+            mapa_varredura.index = [f"{v:.2f}%" for v in mapa_varredura.index]
+            st.dataframe(mapa_varredura.style.format("{:.2f}", na_rep="-").background_gradient(cmap='RdYlGn', axis=None))
+
+    if ativar_otimizador:
+        st.markdown("---")
+        st.subheader("🧭 Otimização da Janela de Horários")
+        with instrumentacao.etapa("otimizar_janelas_intraday", len(df_processado), cache=True):
+            grade_janelas = cache_resultados.obter_ou_calcular(('otimizador', impressao_dados), contado(otimizar_janelas_intraday), df_processado, ('Compra', 'Venda'), indice_intraday)
+        if grade_janelas is None:
+            st.info("São necessários ao menos dois horários de candle distintos para otimizar a janela.")
+        else:
+            grade_tipo = grade_janelas.loc[tipo_operacao]
+            for metrica_janela in ("Resultado Final Acumulado (%)", "Taxa de Acerto (%)"):
+                st.markdown(f"<h6>{metrica_janela} - {tipo_operacao}</h6>", unsafe_allow_html=True)
+                mapa_janelas = grade_tipo[metrica_janela].unstack("Hora Final")
+                mapa_janelas.index = [h.strftime('%H:%M') for h in mapa_janelas.index]
+                mapa_janelas.columns = [h.strftime('%H:%M') for h in mapa_janelas.columns]
+                st.dataframe(mapa_janelas.style.format("{:.2f}", na_rep="-").background_gradient(cmap='RdYlGn', axis=None))
+
+    if ativar_walk_forward:
+        st.markdown("---")
+        st.subheader("🔁 Walk-Forward (Fora da Amostra)")
+        modo_wf = 'daytrade' if modo_analise == "Análise Day Trade" else 'intraday'
+        if modo_wf == 'daytrade' and not variacoes_wf:
+            st.warning("Defina ao menos uma variação diferente de zero para o treino.")
+        else:
+            # Roda em segundo plano: a página continua respondendo e o resultado fica guardado pelos parâmetros.
+            executor_tarefas = obter_executor_tarefas()
+            # A chave vale para todas as sessões, então identifica os dados pelo conteúdo inteiro, não por uma amostra.
+            chave_wf = ('walk_forward', impressao_completa(df_processado), modo_wf, dias_treino_wf, dias_teste_wf, tipo_operacao, variacoes_wf, horas_finais_wf, criterio_wf, minimo_trades_wf)
+            resultado_wf = executor_tarefas.resultado(chave_wf)
+            tarefa_wf = executor_tarefas.obter(chave_wf)
+            if resultado_wf is None:
+                if tarefa_wf is not None and tarefa_wf.ativa:
+                    acompanhar_tarefa('tarefa_walk_forward', chave_wf)
+                    st.info("Walk-forward em andamento em segundo plano. Acompanhe ou cancele pela barra lateral.")
+                else:
+                    st.session_state.tarefa_walk_forward = None
+                    if tarefa_wf is not None and tarefa_wf.estado == 'Erro': st.error(f"O walk-forward anterior falhou. Erro: {tarefa_wf.erro}")
+                    if st.button("Executar Walk-Forward"):
+                        tarefa_wf = enviar_tarefa(chave_wf, f"Walk-forward ({dias_treino_wf}/{dias_teste_wf} dias)", executar_walk_forward_em_segundo_plano, df_processado, modo_wf, dias_treino_wf, dias_teste_wf,
+                                                  tipo_operacao, variacoes_wf, horas_finais_wf, criterio=criterio_wf, minimo_trades=minimo_trades_wf, pool=obter_pool_walk_forward())
+                        if tarefa_wf is not None:
+                            acompanhar_tarefa('tarefa_walk_forward', chave_wf)
+                            st.info("Walk-forward enviado para execução em segundo plano. Acompanhe ou cancele pela barra lateral.")
+            elif resultado_wf[0] is None:
+                st.session_state.tarefa_walk_forward = None
+                st.info("O período carregado é curto demais para uma dobra de treino + teste.")
+            else:
+                st.session_state.tarefa_walk_forward = None
+                tabela_wf, metricas_wf, resumo_wf = resultado_wf
+                st.write(f"{len(tabela_wf)} dobras: o parâmetro é escolhido em {dias_treino_wf} dias de treino e aplicado nos {dias_teste_wf} dias seguintes.")
+                if metricas_wf:
+                    cols_wf = st.columns(4)
+                    cols_wf[0].metric("Trades (Teste)", f"{metricas_wf['Total de Trades']:.0f}")
+                    cols_wf[1].metric("% Acertos (Teste)", f"{metricas_wf['Taxa de Acerto (%)']:.2f}%")
+                    cols_wf[2].metric("Resultado Final (Teste)", f"{metricas_wf['Resultado Final Acumulado (%)']:.2f}%")
+                    cols_wf[3].metric("Ganho Médio (Teste)", f"{metricas_wf['Ganho Médio (% por Trade)']:.2f}%")
+                    st.line_chart(resumo_wf['Resultado %'].cumsum() * 100)
+                st.dataframe(tabela_wf.style.format(precision=2, na_rep="-"))
+
     st.markdown("---")
-    df_recentes = calcular_metricas_recentes(resumo_base)
+    periodos_recentes = st.multiselect("Janelas de Performance Recente (últimos trades)", [5, 10, 15, 20, 25, 50, 100, 250], default=list(PERIODOS_RECENTES)) or list(PERIODOS_RECENTES)
+    linhas_resumo = len(resumo_base) if resumo_base is not None else 0
+    with instrumentacao.etapa("calcular_metricas_recentes", linhas_resumo):
+        df_recentes = calcular_metricas_recentes(resumo_base, periodos_recentes)
     if df_recentes is not None:
         st.subheader("📈 Performance Recente (Geral)")
         st.dataframe(df_recentes.style.format("{:.2f}%"))
-    
-    df_recentes_dia = calcular_metricas_recentes_por_dia_semana(resumo_base)
+        with st.expander("Evolução Rolante (Taxa de Acerto e Ganho Médio)"):
+            janela_rolante = st.number_input("Janela (trades)", min_value=2, max_value=max(2, len(resumo_base)), value=min(20, max(2, len(resumo_base))), step=1)
+            with instrumentacao.etapa("calcular_series_rolantes", linhas_resumo):
+                series_rolantes = calcular_series_rolantes(resumo_base, janela_rolante)
+            if series_rolantes is not None:
+                st.line_chart(series_rolantes["% Acertos"])
+                st.line_chart(series_rolantes["Ganho Médio (%)"])
+
+    with instrumentacao.etapa("calcular_metricas_recentes_por_dia_semana", linhas_resumo):
+        df_recentes_dia = calcular_metricas_recentes_por_dia_semana(resumo_base, periodos_recentes)
     if df_recentes_dia is not None:
         st.subheader("📊 Performance Recente por Dia da Semana")
         st.dataframe(df_recentes_dia.style.format("{:.2f}%").background_gradient(cmap='RdYlGn', axis=None, subset=[(d, '% Acertos') for d in df_recentes_dia.columns.get_level_values(0).unique() if (d, '% Acertos') in df_recentes_dia.columns]))
     else:
-        st.info("A tabela de 'Performance Recente por Dia da Semana' não foi gerada pois não há dados suficientes (mínimo de 5 trades para pelo menos um dia da semana). Tente um período de análise mais longo.")
+        st.info(f"A tabela de 'Performance Recente por Dia da Semana' não foi gerada pois não há dados suficientes (mínimo de {min(periodos_recentes)} trades para pelo menos um dia da semana). Tente um período de análise mais longo.")
     
     with st.expander("Visualizar Trades Contabilizados"):
-        if resumo_base is not None and not resumo_base.empty:
-            tabela_trades = resumo_base.copy()
-            # Formatação do índice e colunas percentuais
-            if isinstance(resumo_base.index, pd.DatetimeIndex):
-                tabela_trades.index = tabela_trades.index.strftime('%d/%m/%Y')
-            colunas_pct = ['% Abertura', '% Máxima', '% Mínima', '% Fechamento', 'Resultado %']
-            for col in colunas_pct:
-                if col in tabela_trades.columns:
-                    tabela_trades[col] = tabela_trades[col] * 100
-            st.dataframe(tabela_trades.style.format(formatter={'Abertura': '{:,.2f}', 'Maxima': '{:,.2f}', 'Minima': '{:,.2f}', 'Fechamento': '{:,.2f}', '% Abertura': '{:,.2f}', '% Máxima': '{:,.2f}', '% Mínima': '{:,.2f}', '% Fechamento': '{:,.2f}', 'Resultado %': '{:,.2f}'}, decimal=',', thousands='.'))
+        if resumo_base is not None and not resumo_base.empty and st.toggle("Exibir trades", key="exibir_trades"):
+            with instrumentacao.etapa("Renderização: Trades Contabilizados", len(resumo_base)):
+                exibir_tabela_paginada(resumo_base, "trades", FORMATOS_TRADES, preparar_pagina_trades)
     
     st.header("🗓️ Análise por Dia da Semana")
     resumo_filtrado_semana = resumo_base
     if resumo_base is not None and dias_selecionados_num:
         resumo_filtrado_semana = resumo_base[resumo_base.index.dayofweek.isin(dias_selecionados_num)]
     
-    tabela_semanal = criar_tabela_dia_semana(resumo_filtrado_semana, tipo_operacao)
+    with instrumentacao.etapa("criar_tabela_dia_semana", len(resumo_filtrado_semana) if resumo_filtrado_semana is not None else 0):
+        tabela_semanal = criar_tabela_dia_semana(resumo_filtrado_semana, tipo_operacao)
     if tabela_semanal is not None:
         st.dataframe(tabela_semanal.style.format({'Nº de Acertos': '{:.0f}', 'Nº de Erros': '{:.0f}', 'Total de Eventos': '{:.0f}', '% Acertos': '{:,.2f}%', '% Erros': '{:,.2f}%', '% Lucro Médio': '{:,.2f}%'}, decimal=',', thousands='.'))
 
     with st.expander("Visualizar Tabela de Dados Processados"):
-        st.dataframe(df_processado.style.format(decimal=',', thousands='.'))
\ No newline at end of file
+        if st.toggle("Exibir dados processados", key="exibir_dados_processados"):
+            with instrumentacao.etapa("Renderização: Dados Processados", len(df_processado)):
+                exibir_tabela_paginada(df_processado, "dados_processados")
+
+if any(tarefa.ativa for tarefa in obter_executor_tarefas().tarefas(instrumentacao.sessao)) or chaves_acompanhadas() - st.session_state.chaves_avisadas:
+    with st.sidebar:
+        painel_tarefas()
+
+if st.sidebar.checkbox("🩺 Mostrar Diagnóstico de Desempenho"):
+    with st.sidebar.expander("🩺 Diagnóstico de Desempenho", expanded=True):
+        tabela_etapas = instrumentacao.tabela()
+        if tabela_etapas.empty:
+            st.write("Nenhuma etapa medida nesta execução.")
+        else:
+            resumo_cache_etapas = instrumentacao.resumo_cache()
+            st.write(f"Execução {instrumentacao.execucao} · Total medido: {instrumentacao.duracao_total() * 1000:,.1f} ms · Cache: {resumo_cache_etapas['Acertos']} acerto(s), {resumo_cache_etapas['Falhas']} falha(s)")
+            st.dataframe(tabela_etapas.style.format({"Duração (ms)": "{:,.1f}", "Linhas": "{:,.0f}", "Δ RSS do Processo (MB)": "{:+.1f}"}, na_rep="-"), hide_index=True)
+            st.caption("Δ RSS do Processo: variação da memória do processo inteiro durante a etapa. Outras sessões e tarefas em segundo plano rodam no mesmo processo, então o valor não é o consumo da etapa sozinha.")
\ No newline at end of file
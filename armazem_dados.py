@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import weakref
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import impressao_digital
+from fontes_dados import DIRETORIO_CACHE_PADRAO
+
+def gravar_colunas(dados, diretorio):
+    # Um .npy por coluna (categorias viram códigos) e um JSON com nomes, tipos e categorias.
+    # Grava num diretório temporário e renomeia no fim, para que ninguém mapeie arquivos pela metade.
+    temporario = f"{diretorio}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(temporario, exist_ok=True)
+    colunas = []
+    for posicao, (nome, coluna) in enumerate(dados.items()):
+        if pd.api.types.is_object_dtype(coluna) or pd.api.types.is_string_dtype(coluna): coluna = coluna.astype(str).astype('category')
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(temporario, f"{posicao}.npy"), coluna.cat.codes.to_numpy())
+            colunas.append({'nome': nome, 'categorias': [str(categoria) for categoria in coluna.cat.categories]})
+        else:
+            np.save(os.path.join(temporario, f"{posicao}.npy"), coluna.to_numpy())
+            colunas.append({'nome': nome})
+    np.save(os.path.join(temporario, 'indice.npy'), dados.index.to_numpy())
+    with open(os.path.join(temporario, 'colunas.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump({'colunas': colunas, 'nome_indice': dados.index.name}, arquivo)
+    try:
+        os.replace(temporario, diretorio)
+    except OSError:
+        # Outro processo publicou o mesmo conteúdo primeiro.
+        shutil.rmtree(temporario, ignore_errors=True)
+
+def mapear_colunas(diretorio):
+    # Reabre o que gravar_colunas salvou como um DataFrame somente leitura apoiado em memmaps:
+    # as páginas vêm do cache do sistema operacional e são compartilhadas por todo leitor.
+    with open(os.path.join(diretorio, 'colunas.json'), encoding='utf-8') as arquivo:
+        descricao = json.load(arquivo)
+    # np.asarray tira a subclasse memmap sem copiar, para que reduções devolvam arrays e escalares comuns.
+    indice_valores = np.asarray(np.load(os.path.join(diretorio, 'indice.npy'), mmap_mode='r'))
+    if np.issubdtype(indice_valores.dtype, np.datetime64): indice = pd.DatetimeIndex(indice_valores, name=descricao['nome_indice'], copy=False)
+    else: indice = pd.Index(indice_valores, name=descricao['nome_indice'], copy=False)
+    colunas = {}
+    for posicao, coluna in enumerate(descricao['colunas']):
+        valores = np.asarray(np.load(os.path.join(diretorio, f"{posicao}.npy"), mmap_mode='r'))
+        colunas[coluna['nome']] = pd.Categorical.from_codes(valores, categories=coluna['categorias']) if 'categorias' in coluna else valores
+    return pd.DataFrame(colunas, index=indice, copy=False)
+
+def _tamanho_do_diretorio(diretorio):
+    return sum(os.path.getsize(os.path.join(diretorio, nome)) for nome in os.listdir(diretorio))
+
+class ArmazemDados:
+    # Datasets somente leitura compartilhados por todas as sessões do processo, chaveados pela origem
+    # (ex.: ('yahoo', ticker, intervalo, inicio, fim) ou ('upload', impressão do arquivo)). Cada dataset é
+    # gravado uma vez em colunas .npy e mapeado em memória; as sessões guardam só referências ao mesmo frame.
+    # O armazém só segura os datasets usados mais recentemente (limitados em quantidade e em bytes no disco);
+    # dos demais guarda uma referência fraca, que vale enquanto alguma sessão ainda usar o frame. Quando
+    # nenhuma sessão usa mais um dataset, ele sai do registro e o seu diretório é apagado.
+    def __init__(self, diretorio=os.path.join(DIRETORIO_CACHE_PADRAO, 'armazem'), max_datasets=32, max_bytes=4 * 1024 ** 3):
+        self.diretorio = diretorio
+        self.max_datasets = max_datasets
+        self.max_bytes = max_bytes
+        self._entradas = {}
+        self._fixados = OrderedDict()
+        self._bytes_fixados = 0
+        self._soltas = []
+        self._registro = threading.RLock()
+        self._travas = defaultdict(threading.RLock)
+        self._trava_travas = threading.Lock()
+
+    def _trava(self, chave):
+        with self._trava_travas:
+            return self._travas[chave]
+
+    def _caminho(self, chave, impressao):
+        return os.path.join(self.diretorio, f"{hashlib.blake2b(repr(chave).encode(), digest_size=16).hexdigest()}-{impressao}")
+
+    def _viva(self, chave):
+        # (entrada, frame) marcando a entrada como usada agora, ou (None, None) se ninguém mais usa o frame.
+        with self._registro:
+            entrada = self._entradas.get(chave)
+            dados = entrada['ref']() if entrada is not None else None
+            if dados is None: return None, None
+            self._fixar(chave, dados)
+            return entrada, dados
+
+    def _fixar(self, chave, dados):
+        if chave in self._fixados:
+            self._fixados.move_to_end(chave)
+            return
+        self._fixados[chave] = dados
+        self._bytes_fixados += self._entradas[chave]['bytes']
+        self._despejar()
+
+    def _despejar(self):
+        # Solta os menos usados recentemente além dos limites (o último fixado fica, mesmo sozinho acima do limite).
+        while len(self._fixados) > 1 and (len(self._fixados) > self.max_datasets or self._bytes_fixados > self.max_bytes):
+            self._soltar(next(iter(self._fixados)))
+        self._coletar()
+
+    def _soltar(self, chave):
+        # Deixa de segurar o frame; as estruturas derivadas também saem, porque podem segurá-lo.
+        if chave not in self._fixados: return
+        del self._fixados[chave]
+        entrada = self._entradas[chave]
+        self._bytes_fixados -= entrada['bytes']
+        entrada['anexos'] = {}
+
+    def _coletar(self):
+        # Esquece os datasets que nenhuma sessão usa mais e apaga os seus diretórios.
+        mortas = [self._entradas.pop(chave) for chave, entrada in list(self._entradas.items()) if entrada['ref']() is None]
+        mortas += [entrada for entrada in self._soltas if entrada['ref']() is None]
+        self._soltas = [entrada for entrada in self._soltas if entrada['ref']() is not None]
+        em_uso = {entrada['caminho'] for entrada in list(self._entradas.values()) + self._soltas}
+        for entrada in mortas:
+            if entrada['caminho'] not in em_uso: shutil.rmtree(entrada['caminho'], ignore_errors=True)
+
+    def _retirar(self, chave):
+        # Tira a chave do registro; o frame que sessões ainda usam continua mapeado até ser solto.
+        self._soltar(chave)
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None: self._soltas.append(entrada)
+
+    def __contains__(self, chave):
+        entrada = self._entradas.get(chave)
+        return entrada is not None and entrada['ref']() is not None
+
+    def obter(self, chave, padrao=None):
+        dados = self._viva(chave)[1]
+        return dados if dados is not None else padrao
+
+    def publicar(self, chave, dados):
+        if dados is None: return None
+        with self._trava(chave):
+            caminho = self._caminho(chave, impressao_digital(dados))
+            entrada, mapeado = self._viva(chave)
+            if entrada is not None and entrada['caminho'] == caminho: return mapeado
+            if not os.path.exists(caminho):
+                os.makedirs(self.diretorio, exist_ok=True)
+                gravar_colunas(dados, caminho)
+            mapeado = mapear_colunas(caminho)
+            with self._registro:
+                self._retirar(chave)
+                self._entradas[chave] = {'ref': weakref.ref(mapeado), 'caminho': caminho, 'anexos': {}, 'bytes': _tamanho_do_diretorio(caminho)}
+                self._fixar(chave, mapeado)
+            return mapeado
+
+    def obter_ou_publicar(self, chave, funcao, *args, **kwargs):
+        with self._trava(chave):
+            dados = self.obter(chave)
+            if dados is not None: return dados
+            return self.publicar(chave, funcao(*args, **kwargs))
+
+    def anexo(self, chave, nome, funcao, *args, **kwargs):
+        # Estruturas derivadas de um dataset (ex.: o índice por dia) calculadas uma vez e compartilhadas como ele,
+        # enquanto o armazém segurar o dataset.
+        with self._trava(chave):
+            entrada, dados = self._viva(chave)
+            if entrada is None: return funcao(*args, **kwargs)
+            anexos = entrada['anexos']
+            if nome not in anexos: anexos[nome] = funcao(*args, **kwargs)
+            return anexos[nome]
+
+    def descartar(self, chave):
+        # Só tira o dataset do registro: sessões que ainda o usam mantêm o mapeamento até soltá-lo.
+        with self._trava(chave), self._registro:
+            self._retirar(chave)
+            self._coletar()
+
+    def ajustar_limites(self, max_datasets=None, max_bytes=None):
+        with self._registro:
+            if max_datasets is not None: self.max_datasets = max_datasets
+            if max_bytes is not None: self.max_bytes = max_bytes
+            self._despejar()
+
+    def limpar_disco(self):
+        # Apaga do disco os datasets que não estão mais registrados (inclusive os de execuções anteriores).
+        if not os.path.isdir(self.diretorio): return
+        with self._registro:
+            self._coletar()
+            em_uso = {entrada['caminho'] for entrada in list(self._entradas.values()) + self._soltas}
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            if caminho not in em_uso and '.tmp-' not in nome: shutil.rmtree(caminho, ignore_errors=True)
+
+    def estatisticas(self):
+        with self._registro:
+            self._coletar()
+            vivas = [(entrada, entrada['ref']()) for entrada in self._entradas.values()]
+            fixados, bytes_fixados = len(self._fixados), self._bytes_fixados
+        vivas = [(entrada, dados) for entrada, dados in vivas if dados is not None]
+        return {"Datasets": len(vivas), "Fixados": fixados, "Linhas": sum(len(dados) for _, dados in vivas),
+                "Mapeado (MB)": sum(entrada['bytes'] for entrada, _ in vivas) / 1024 ** 2, "Fixado (MB)": bytes_fixados / 1024 ** 2}
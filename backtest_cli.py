@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import sys
+
+# Execução em lote dos backtests, sem Streamlit. Ex.:
+#   python backtest_cli.py daytrade --tickers PETR4 VALE3 --variacoes -2 -1 1 2 --saida metricas.csv
+#   python backtest_cli.py intraday --arquivos win_1min.csv --horas-iniciais 09:00 10:00 --horas-finais 12:00 17:00
+#   python backtest_cli.py daytrade --tickers PETR4 --inicio 2015-01-01 --variacoes -3 -2 -1 1 2 3 --walk-forward 252 21
+#   python backtest_cli.py daytrade --universo --tickers PETR4 VALE3 ITUB4 BBDC4 --variacoes 1 --curva curva.csv
+# pandas, yfinance e openpyxl só são importados depois da leitura dos argumentos, e apenas quando usados.
+
+MODOS = {'daytrade': "Análise Day Trade", 'intraday': "Análise Intraday"}
+
+def _data(texto):
+    return datetime.date.fromisoformat(texto)
+
+def _horario(texto):
+    return datetime.time.fromisoformat(texto)
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='backtest_cli', description="Executa os backtests do Analisador em lote e grava uma tabela de métricas.")
+    parser.add_argument('modo', choices=MODOS)
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--tickers', nargs='+', help="Códigos dos ativos (buscados no Yahoo Finance ou em --diretorio-local).")
+    origem.add_argument('--arquivos', nargs='+', help="Arquivos CSV/XLSX no mesmo formato aceito pelo upload da interface.")
+    parser.add_argument('--tipo-ativo', default="Ação (Brasil)", choices=["Ação (Brasil)", "Forex", "Criptomoeda"])
+    parser.add_argument('--inicio', type=_data, help="Data inicial (AAAA-MM-DD). Padrão: 2 anos (daytrade) ou 59 dias (intraday) antes do fim.")
+    parser.add_argument('--fim', type=_data, default=datetime.date.today(), help="Data final (AAAA-MM-DD). Padrão: hoje.")
+    parser.add_argument('--variacoes', type=float, nargs='+', default=[], help="Variações de teste (%%). No modo intraday ativam o gatilho por variação.")
+    parser.add_argument('--tipos', nargs='+', choices=['Compra', 'Venda'], default=['Compra', 'Venda'])
+    parser.add_argument('--horas-iniciais', type=_horario, nargs='+', help="Horas iniciais da janela fixa (intraday sem gatilho). Padrão: primeiro candle.")
+    parser.add_argument('--horas-finais', type=_horario, nargs='+', help="Horas finais (intraday). Padrão: último candle.")
+    parser.add_argument('--diretorio-local', help="Lê <ticker>_<intervalo>.parquet/.csv deste diretório em vez do Yahoo Finance.")
+    parser.add_argument('--diretorio-cache', help="Diretório do cache em disco dos dados do Yahoo.")
+    parser.add_argument('--walk-forward', type=int, nargs=2, metavar=('DIAS_TREINO', 'DIAS_TESTE'),
+                        help="Avaliação fora da amostra: escolhe a variação (ou a janela, no intraday sem --variacoes) em cada treino e pontua no teste seguinte.")
+    parser.add_argument('--processos', type=int, help="Processos do walk-forward. Padrão: número de núcleos, até 4.")
+    parser.add_argument('--universo', action='store_true',
+                        help="Day Trade: busca os --tickers em paralelo e simula todos juntos, gravando o ranking por ticker de cada variação x tipo.")
+    parser.add_argument('--curva', help="Com --universo: grava a curva combinada (carteira com peso igual) neste .csv ou .parquet.")
+    parser.add_argument('--saida', help="Arquivo .csv ou .parquet. Sem este argumento a tabela vai para a saída padrão.")
+    return parser
+
+def carregar_origem(args, origem):
+    import pandas as pd
+    from fontes_dados import COLUNAS_YAHOO, DIRETORIO_CACHE_PADRAO, CacheOHLCV, FonteArquivosLocais, formatar_ticker, ler_intraday_em_blocos
+    from motor_backtest import preparar_dados_day_trade, processar_dados
+    modo_analise = MODOS[args.modo]
+    if args.arquivos:
+        if args.modo == 'intraday': return ler_intraday_em_blocos(origem, origem)
+        if origem.endswith('.xlsx'): dados = pd.read_excel(origem, engine='openpyxl')
+        else: dados = pd.read_csv(origem, sep=';', encoding='latin1', header=0, decimal=',')
+        return preparar_dados_day_trade(processar_dados(dados, modo_analise))
+    intervalo = '1d' if args.modo == 'daytrade' else '15m'
+    inicio = args.inicio or args.fim - datetime.timedelta(days=365 * 2 if args.modo == 'daytrade' else 59)
+    ticker = formatar_ticker(origem, args.tipo_ativo)
+    if args.diretorio_local: dados = FonteArquivosLocais(args.diretorio_local)(ticker, inicio, args.fim, intervalo)
+    else: dados = CacheOHLCV(args.diretorio_cache or DIRETORIO_CACHE_PADRAO).obter(ticker, inicio, args.fim, intervalo)
+    if dados.empty: raise ValueError(f"Nenhum dado encontrado para '{ticker}'.")
+    return preparar_dados_day_trade(dados) if args.modo == 'daytrade' else dados.rename(columns=COLUNAS_YAHOO)
+
+def executar_universo(args):
+    from fontes_dados import DIRETORIO_CACHE_PADRAO, CacheOHLCV, FonteArquivosLocais, baixar_universo, formatar_ticker
+    from motor_backtest import alinhar_universo, preparar_dados_day_trade, simular_day_trade_universo
+    inicio = args.inicio or args.fim - datetime.timedelta(days=365 * 2)
+    tickers = {formatar_ticker(ticker, args.tipo_ativo): ticker for ticker in args.tickers}
+    if args.diretorio_local: fonte = FonteArquivosLocais(args.diretorio_local)
+    else: fonte = CacheOHLCV(args.diretorio_cache or DIRETORIO_CACHE_PADRAO).obter
+    dados, falhas = baixar_universo(fonte, list(tickers), inicio, args.fim)
+    for ticker, erro in falhas.items(): print(f"Falha em '{tickers[ticker]}': {erro}", file=sys.stderr)
+    universo = alinhar_universo({tickers[ticker]: preparar_dados_day_trade(frame) for ticker, frame in dados.items()})
+    if universo is None: raise ValueError("Nenhum ticker do universo retornou dados.")
+    linhas, curvas = [], []
+    for variacao in args.variacoes:
+        for tipo_operacao in args.tipos:
+            ranking, curva = simular_day_trade_universo(universo, variacao, tipo_operacao)
+            ranking.insert(0, 'Posição', range(1, len(ranking) + 1))
+            chaves = {'Tipo de Operação': tipo_operacao, 'Variação Teste (%)': variacao}
+            linhas.extend({**chaves, **linha} for linha in ranking.reset_index().to_dict('records'))
+            curvas.append(curva.assign(**chaves))
+    return linhas, curvas, len(falhas)
+
+def executar_walk_forward_origem(args, origem, dados, horas_finais=None):
+    from walk_forward import executar_walk_forward
+    dias_treino, dias_teste = args.walk_forward
+    linhas = []
+    for tipo_operacao in args.tipos:
+        tabela, agregadas, _ = executar_walk_forward(dados, args.modo, dias_treino, dias_teste, tipo_operacao, args.variacoes, horas_finais if args.variacoes else None, max_workers=args.processos)
+        if tabela is None: raise ValueError(f"Histórico curto demais para {dias_treino} dias de treino + {dias_teste} de teste.")
+        tabela = tabela.reset_index()
+        tabela.insert(0, 'Fonte', origem)
+        tabela.insert(1, 'Tipo de Operação', tipo_operacao)
+        linhas.extend(tabela.to_dict('records'))
+        linhas.append({'Fonte': origem, 'Tipo de Operação': tipo_operacao, 'Dobra': 'Agregado', **{f"Teste: {nome}": valor for nome, valor in (agregadas or {}).items()}})
+    return linhas
+
+def executar_origem(args, origem, dados):
+    from motor_backtest import (aplicar_gatilho_e_criar_resumo, calcular_metricas_de_resumo, construir_indice_diario, criar_resumo_por_horario_fixo,
+                                horario_do_segundo, varrer_variacoes_day_trade)
+    if args.walk_forward and args.modo == 'daytrade': return executar_walk_forward_origem(args, origem, dados)
+    if args.modo == 'daytrade':
+        grade = varrer_variacoes_day_trade(dados, args.variacoes, args.tipos).reset_index()
+        grade.insert(0, 'Fonte', origem)
+        return grade.to_dict('records')
+    if not dados.index.is_monotonic_increasing: dados = dados.sort_index()
+    indice = construir_indice_diario(dados)
+    horas_finais = args.horas_finais or [horario_do_segundo(indice.segundos_do_dia.max())]
+    if args.walk_forward: return executar_walk_forward_origem(args, origem, dados, horas_finais)
+    linhas = []
+    if args.variacoes:
+        configuracoes = [(variacao, None, hora_final) for variacao in args.variacoes for hora_final in horas_finais]
+    else:
+        configuracoes = [(None, hora_inicial, hora_final) for hora_inicial in (args.horas_iniciais or [horario_do_segundo(indice.segundos_do_dia.min())]) for hora_final in horas_finais]
+    for variacao, hora_inicial, hora_final in configuracoes:
+        if variacao is not None: resumo = aplicar_gatilho_e_criar_resumo(dados, variacao, hora_final, indice)
+        else: resumo = criar_resumo_por_horario_fixo(dados, hora_inicial, hora_final, indice)
+        for tipo_operacao in args.tipos:
+            # calcular_metricas_de_resumo grava 'Resultado %' no resumo conforme o tipo de operação.
+            metricas = calcular_metricas_de_resumo(resumo.copy() if resumo is not None else None, tipo_operacao) or {"Total de Trades": 0}
+            linhas.append({'Fonte': origem, 'Tipo de Operação': tipo_operacao, 'Variação Teste (%)': variacao,
+                           'Hora Inicial': hora_inicial.isoformat() if hora_inicial else None, 'Hora Final': hora_final.isoformat(), **metricas})
+    return linhas
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.modo == 'daytrade' and not args.variacoes:
+        parser.error("o modo daytrade exige --variacoes")
+    if args.universo and (args.modo != 'daytrade' or not args.tickers or args.walk_forward):
+        parser.error("--universo só vale no modo daytrade com --tickers e sem --walk-forward")
+    import pandas as pd
+    linhas, falhas = [], 0
+    if args.universo:
+        try:
+            linhas, curvas, falhas = executar_universo(args)
+        except Exception as e:
+            print(f"Falha no universo: {e}", file=sys.stderr)
+            return 1
+        if args.curva: _gravar(pd.concat(curvas).reset_index(), args.curva)
+    else:
+        for origem in args.tickers or args.arquivos:
+            try:
+                linhas.extend(executar_origem(args, origem, carregar_origem(args, origem)))
+            except Exception as e:
+                falhas += 1
+                print(f"Falha em '{origem}': {e}", file=sys.stderr)
+    tabela = pd.DataFrame(linhas)
+    if args.saida: _gravar(tabela, args.saida)
+    else: print(tabela.to_string(index=False))
+    return 1 if falhas else 0
+
+def _gravar(tabela, caminho):
+    if caminho.endswith('.parquet'): tabela.to_parquet(caminho, index=False)
+    else: tabela.to_csv(caminho, index=False)
+
+if __name__ == '__main__':
+    sys.exit(main())
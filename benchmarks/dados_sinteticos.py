@@ -0,0 +1,65 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from fontes_dados import COLUNAS_YAHOO
+
+# Gerador determinístico de candles OHLCV para benchmarks e experimentos offline. A mesma semente
+# sempre gera os mesmos dados, em qualquer máquina.
+
+# Tamanhos realistas usados pela suíte: (dias úteis, minutos por candle; None = diário)
+TAMANHOS = {
+    '2a_diario': (504, None),
+    '60d_15min': (42, 15),
+    '5a_15min': (1260, 15),
+    '5a_1min': (1260, 1),
+}
+ABERTURA_PREGAO = datetime.time(10, 0)
+FECHAMENTO_PREGAO = datetime.time(18, 0)
+
+def gerar_ohlcv(dias_uteis, minutos_por_candle=None, semente=0, inicio='2019-01-02', preco_inicial=30.0, volatilidade_diaria=0.02):
+    # Passeio aleatório geométrico minuto a minuto dentro do pregão, com um salto na abertura de cada dia.
+    # Cada candle agrega os minutos do seu intervalo; no diário, o pregão inteiro vira um candle.
+    rng = np.random.default_rng(semente)
+    dias = pd.bdate_range(inicio, periods=dias_uteis)
+    minutos_pregao = (FECHAMENTO_PREGAO.hour - ABERTURA_PREGAO.hour) * 60 + FECHAMENTO_PREGAO.minute - ABERTURA_PREGAO.minute
+    passo = minutos_pregao if minutos_por_candle is None else minutos_por_candle
+    candles_por_dia = minutos_pregao // passo
+    retornos = rng.normal(0.0, volatilidade_diaria / np.sqrt(minutos_pregao), size=(dias_uteis, candles_por_dia * passo))
+    retornos[:, 0] += rng.normal(0.0, volatilidade_diaria / 2, size=dias_uteis)
+    precos = preco_inicial * np.exp(np.cumsum(retornos.ravel())).reshape(dias_uteis, candles_por_dia, passo)
+    abertura = np.concatenate(([preco_inicial], precos.reshape(-1)[:-1])).reshape(precos.shape)[:, :, 0]
+    abertura[:, 0] = precos[:, 0, 0]  # o salto da abertura aparece no preço de abertura do dia
+    dados = pd.DataFrame({
+        'Abertura': abertura.ravel(),
+        'Máxima': np.maximum(precos.max(axis=2), abertura).ravel(),
+        'Mínima': np.minimum(precos.min(axis=2), abertura).ravel(),
+        'Fechamento': precos[:, :, -1].ravel(),
+        'Volume': rng.integers(100, 100_000, size=dias_uteis * candles_por_dia),
+    })
+    deslocamentos = pd.to_timedelta(ABERTURA_PREGAO.hour * 60 + ABERTURA_PREGAO.minute + np.arange(candles_por_dia) * passo, unit='min')
+    if minutos_por_candle is None: dados.index = pd.DatetimeIndex(dias, name='Data')
+    else: dados.index = pd.DatetimeIndex((dias.values[:, None] + deslocamentos.values[None, :]).ravel(), name='Timestamp')
+    return dados
+
+def como_arquivo(dados):
+    # O mesmo frame no formato bruto de um upload (colunas Data e Hora em texto), entrada de processar_dados.
+    bruto = dados.reset_index(drop=True)
+    bruto.insert(0, 'Data', dados.index.strftime('%d/%m/%Y'))
+    if dados.index.name == 'Timestamp': bruto.insert(1, 'Hora', dados.index.strftime('%H:%M:%S'))
+    return bruto
+
+def gerar_tamanho(nome, semente=0):
+    dias_uteis, minutos_por_candle = TAMANHOS[nome]
+    return gerar_ohlcv(dias_uteis, minutos_por_candle, semente=semente)
+
+def gravar_universo(diretorio, tickers, dias_uteis=504, semente=0):
+    # Fixtures para FonteArquivosLocais: um <ticker>_1d.parquet por ticker, com as colunas do Yahoo e
+    # históricos de tamanhos diferentes (cada ticker começa um pouco depois do anterior).
+    os.makedirs(diretorio, exist_ok=True)
+    nomes_yahoo = {portugues: ingles for ingles, portugues in COLUNAS_YAHOO.items()}
+    for posicao, ticker in enumerate(tickers):
+        dados = gerar_ohlcv(dias_uteis - posicao, semente=semente + posicao, inicio=pd.Timestamp('2019-01-02') + pd.offsets.BDay(posicao))
+        dados.rename(columns=nomes_yahoo).to_parquet(os.path.join(diretorio, f"{ticker}_1d.parquet"))
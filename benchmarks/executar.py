@@ -0,0 +1,162 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import TAMANHOS, como_arquivo, gerar_ohlcv, gerar_tamanho
+import motor_backtest as motor
+
+# Mede tempo e pico de memória de cada função do motor em cada tamanho de dataset sintético e compara com
+# uma linha de base gravada antes. Roda offline, sem Streamlit e sem yfinance. A partir da raiz do repositório:
+#   python -m benchmarks.executar --salvar-base          # grava benchmarks/linha_de_base.json
+#   python -m benchmarks.executar                        # compara com a base e sai com código 1 se houver regressão
+#                                                        # (2 se não houver base)
+#   python -m benchmarks.executar --tamanhos 2a_diario 60d_15min --repeticoes 5
+
+CAMINHO_BASE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linha_de_base.json')
+HORA_INICIAL = datetime.time(10, 0)
+HORA_FINAL = datetime.time(17, 0)
+VARIACOES_VARREDURA = [round(v * 0.05, 2) for v in range(-100, 101) if v]
+TICKERS_UNIVERSO = 50
+
+def _casos_intraday(dados, completo=True):
+    bruto = como_arquivo(dados)
+    indice = motor.construir_indice_diario(dados)
+    resumo = motor.criar_resumo_por_horario_fixo(dados, HORA_INICIAL, HORA_FINAL, indice)
+    motor.calcular_metricas_de_resumo(resumo, 'Compra')
+    casos = {
+        'processar_dados': lambda: motor.processar_dados(bruto, "Análise Intraday"),
+        'construir_indice_diario': lambda: motor.construir_indice_diario(dados),
+        'construir_piramide': lambda: motor.construir_piramide(dados),
+        'aplicar_gatilho_e_criar_resumo': lambda: motor.aplicar_gatilho_e_criar_resumo(dados, 0.5, HORA_FINAL, indice),
+        'criar_resumo_por_horario_fixo': lambda: motor.criar_resumo_por_horario_fixo(dados, HORA_INICIAL, HORA_FINAL, indice),
+    }
+    # Com candles de 1 minuto a grade de janelas tem ~115 mil pares por tipo: fica fora por padrão.
+    if completo: casos['otimizar_janelas_intraday'] = lambda: motor.otimizar_janelas_intraday(dados, indice=indice)
+    return casos, resumo
+
+def _casos_day_trade(dados):
+    bruto = como_arquivo(dados)
+    preparados = motor.preparar_dados_day_trade(dados)
+    resumo = motor.simular_day_trade_com_percentagens(preparados, 0.5, 'Compra')
+    universo = {f"T{posicao}": motor.preparar_dados_day_trade(gerar_ohlcv(len(dados), semente=posicao)) for posicao in range(TICKERS_UNIVERSO)}
+    alinhado = motor.alinhar_universo(universo)
+    casos = {
+        'processar_dados': lambda: motor.processar_dados(bruto, "Análise Day Trade"),
+        'preparar_dados_day_trade': lambda: motor.preparar_dados_day_trade(dados),
+        'simular_day_trade_com_percentagens': lambda: motor.simular_day_trade_com_percentagens(preparados, 0.5, 'Compra'),
+        'varrer_variacoes_day_trade': lambda: motor.varrer_variacoes_day_trade(preparados, VARIACOES_VARREDURA),
+        'alinhar_universo': lambda: motor.alinhar_universo(universo),
+        'simular_day_trade_universo': lambda: motor.simular_day_trade_universo(alinhado, 0.5, 'Compra'),
+    }
+    return casos, resumo
+
+def _casos_metricas(resumo):
+    return {
+        'calcular_metricas_de_resumo': lambda: motor.calcular_metricas_de_resumo(resumo.copy(), 'Compra'),
+        'calcular_metricas_recentes': lambda: motor.calcular_metricas_recentes(resumo),
+        'calcular_metricas_recentes_por_dia_semana': lambda: motor.calcular_metricas_recentes_por_dia_semana(resumo),
+        'calcular_series_rolantes': lambda: motor.calcular_series_rolantes(resumo, 20),
+        'criar_tabela_dia_semana': lambda: motor.criar_tabela_dia_semana(resumo, 'Compra'),
+        'reamostrar_trades': lambda: motor.reamostrar_trades(resumo, 'Compra', 10_000),
+    }
+
+def medir(funcao, repeticoes):
+    # Tempo: melhor de `repeticoes` execuções. Memória: pico do tracemalloc numa execução à parte
+    # (o rastreamento deixa o código mais lento, então não entra na medida de tempo).
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'tempo_s': min(tempos), 'pico_mb': pico / 1024 ** 2}
+
+def executar(tamanhos, repeticoes=3, incluir_otimizador_1min=False, semente=0):
+    resultados = {}
+    for tamanho in tamanhos:
+        dados = gerar_tamanho(tamanho, semente=semente)
+        if TAMANHOS[tamanho][1] is None: casos, resumo = _casos_day_trade(dados)
+        else: casos, resumo = _casos_intraday(dados, completo=TAMANHOS[tamanho][1] >= 15 or incluir_otimizador_1min)
+        casos.update(_casos_metricas(resumo))
+        for nome, funcao in casos.items():
+            resultados[f"{tamanho}/{nome}"] = {'linhas': len(dados), **medir(funcao, repeticoes)}
+            print(f"{tamanho}/{nome}: {resultados[f'{tamanho}/{nome}']['tempo_s'] * 1000:.1f} ms", file=sys.stderr)
+    return resultados
+
+def comparar(resultados, base, tolerancia_tempo=0.25, tolerancia_memoria=0.10):
+    # Regressão: mais lento que a base além da tolerância relativa (ignorando diferenças abaixo de 2 ms)
+    # ou com pico de memória maior além da tolerância.
+    linhas = []
+    for caso, atual in resultados.items():
+        anterior = base.get(caso)
+        linha = {'Caso': caso, 'Linhas': atual['linhas'], 'Tempo (ms)': atual['tempo_s'] * 1000, 'Pico (MB)': atual['pico_mb']}
+        if anterior is not None:
+            linha['Tempo Base (ms)'] = anterior['tempo_s'] * 1000
+            linha['Pico Base (MB)'] = anterior['pico_mb']
+            mais_lento = atual['tempo_s'] > anterior['tempo_s'] * (1 + tolerancia_tempo) and atual['tempo_s'] - anterior['tempo_s'] > 2e-3
+            mais_memoria = atual['pico_mb'] > anterior['pico_mb'] * (1 + tolerancia_memoria) and atual['pico_mb'] - anterior['pico_mb'] > 1
+            linha['Regressão'] = ', '.join(motivo for motivo, houve in (('tempo', mais_lento), ('memória', mais_memoria)) if houve)
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='benchmarks.executar', description="Mede tempo e memória das funções do motor com dados sintéticos.")
+    parser.add_argument('--tamanhos', nargs='+', choices=TAMANHOS, default=list(TAMANHOS))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--base', default=CAMINHO_BASE_PADRAO, help="Arquivo JSON da linha de base.")
+    parser.add_argument('--salvar-base', action='store_true', help="Grava as medidas como nova linha de base em vez de comparar.")
+    parser.add_argument('--tolerancia-tempo', type=float, default=0.25, help="Aumento relativo de tempo tolerado (padrão: 0.25).")
+    parser.add_argument('--tolerancia-memoria', type=float, default=0.10, help="Aumento relativo do pico de memória tolerado (padrão: 0.10).")
+    parser.add_argument('--incluir-otimizador-1min', action='store_true', help="Também mede otimizar_janelas_intraday com candles de 1 minuto.")
+    return parser
+
+def descrever_maquina():
+    return {'maquina': platform.platform(), 'processador': platform.processor() or platform.machine(), 'nucleos': os.cpu_count(),
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__}
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    if not args.salvar_base and not os.path.exists(args.base):
+        # Sem base não há o que comparar: sair com 0 faria a checagem passar sem medir nada.
+        print(f"Sem linha de base em {args.base}; rode com --salvar-base para criar uma.", file=sys.stderr)
+        return 2
+    resultados = executar(args.tamanhos, args.repeticoes, args.incluir_otimizador_1min, args.semente)
+    if args.salvar_base:
+        base = {}
+        if os.path.exists(args.base):
+            with open(args.base, encoding='utf-8') as arquivo: base = json.load(arquivo)['casos']
+        base.update(resultados)
+        with open(args.base, 'w', encoding='utf-8') as arquivo:
+            json.dump({**descrever_maquina(), 'casos': base}, arquivo, indent=1, ensure_ascii=False)
+            arquivo.write('\n')
+        print(f"Linha de base gravada em {args.base}.")
+        return 0
+    with open(args.base, encoding='utf-8') as arquivo: gravada = json.load(arquivo)
+    diferencas = [f"{chave}: {gravada.get(chave)} → {valor}" for chave, valor in descrever_maquina().items() if gravada.get(chave) != valor]
+    if diferencas:
+        print("A linha de base foi gravada em outro ambiente; os tempos podem não ser comparáveis (" + "; ".join(diferencas) + ").", file=sys.stderr)
+    tabela = comparar(resultados, gravada['casos'], args.tolerancia_tempo, args.tolerancia_memoria)
+    print(tabela.to_string(index=False, float_format=lambda valor: f"{valor:.2f}"))
+    regressoes = tabela['Regressão'].fillna('').astype(bool).sum() if 'Regressão' in tabela else 0
+    if regressoes: print(f"{regressoes} regressão(ões) acima da tolerância.", file=sys.stderr)
+    return 1 if regressoes else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
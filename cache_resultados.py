@@ -0,0 +1,121 @@
+import hashlib
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+LINHAS_AMOSTRA_IMPRESSAO = 4096
+
+def impressao_digital(df):
+    # Impressão barata de um dataset: formato, colunas, tipos, extremos do índice e o hash de uma amostra
+    # espaçada de linhas. Custa o mesmo para 10 mil ou 10 milhões de linhas.
+    if df is None: return None
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update(repr((df.shape, list(df.columns), [str(tipo) for tipo in df.dtypes])).encode())
+    if len(df):
+        amostra = df.iloc[::max(1, len(df) // LINHAS_AMOSTRA_IMPRESSAO)]
+        resumo.update(repr((df.index[0], df.index[-1])).encode())
+        resumo.update(pd.util.hash_pandas_object(amostra, index=True).to_numpy().tobytes())
+        resumo.update(pd.util.hash_pandas_object(df.iloc[-1:], index=True).to_numpy().tobytes())
+    return resumo.hexdigest()
+
+_impressoes_completas = {}
+
+def _valores_para_hash(valores):
+    if isinstance(valores.dtype, pd.CategoricalDtype):
+        return [np.ascontiguousarray(valores.cat.codes.to_numpy() if isinstance(valores, pd.Series) else valores.codes), repr(list(valores.dtype.categories)).encode()]
+    matriz = valores.to_numpy() if isinstance(valores, pd.Series) else np.asarray(valores)
+    if matriz.dtype.kind in 'biufcmM': return [np.ascontiguousarray(matriz).view(np.uint8)]
+    return [pd.util.hash_pandas_object(pd.Series(matriz), index=False).to_numpy()]
+
+def impressao_completa(df):
+    # Hash de todo o conteúdo (índice e cada coluna), para chaves compartilhadas entre sessões: duas bases
+    # diferentes com a mesma amostra não podem colidir. Memorizado por frame enquanto ele existir, então o
+    # frame não pode ser alterado depois (os do armazém são somente leitura).
+    if df is None: return None
+    guardada = _impressoes_completas.get(id(df))
+    if guardada is not None and guardada[0]() is df: return guardada[1]
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update(repr((df.shape, list(df.columns), [str(tipo) for tipo in df.dtypes], df.index.name, str(df.index.dtype))).encode())
+    for valores in [df.index] + [df.iloc[:, posicao] for posicao in range(df.shape[1])]:
+        for parte in _valores_para_hash(valores): resumo.update(parte)
+    impressao = resumo.hexdigest()
+    identificador = id(df)
+    _impressoes_completas[identificador] = (weakref.ref(df, lambda _: _impressoes_completas.pop(identificador, None)), impressao)
+    return impressao
+
+def tamanho_em_bytes(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series)): return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, (tuple, list)): return sys.getsizeof(valor) + sum(tamanho_em_bytes(item) for item in valor)
+    if isinstance(valor, dict): return sys.getsizeof(valor) + sum(tamanho_em_bytes(item) for item in valor.values())
+    return sys.getsizeof(valor)
+
+class CacheResultados:
+    # Cache LRU de resultados chaveado por (impressão do dataset, parâmetros da estratégia),
+    # limitado por número de itens e por memória.
+    def __init__(self, max_itens=64, max_bytes=256 * 1024 ** 2):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.RLock()
+
+    def __contains__(self, chave):
+        with self._trava:
+            return chave in self._itens
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            if chave not in self._itens: return padrao
+            self._itens.move_to_end(chave)
+            return self._itens[chave][0]
+
+    def guardar(self, chave, valor):
+        tamanho = tamanho_em_bytes(valor)
+        with self._trava:
+            if chave in self._itens: self._bytes -= self._itens.pop(chave)[1]
+            if tamanho > self.max_bytes: return
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            self._despejar()
+
+    def obter_ou_calcular(self, chave, funcao, *args, **kwargs):
+        with self._trava:
+            if chave in self._itens:
+                self.acertos += 1
+                return self.obter(chave)
+            self.falhas += 1
+        valor = funcao(*args, **kwargs)
+        self.guardar(chave, valor)
+        return valor
+
+    def descartar(self, chave):
+        with self._trava:
+            if chave in self._itens: self._bytes -= self._itens.pop(chave)[1]
+
+    def ajustar_limites(self, max_itens=None, max_bytes=None):
+        with self._trava:
+            if max_itens is not None: self.max_itens = max_itens
+            if max_bytes is not None: self.max_bytes = max_bytes
+            self._despejar()
+
+    def _despejar(self):
+        while self._itens and (len(self._itens) > self.max_itens or self._bytes > self.max_bytes):
+            self._bytes -= self._itens.popitem(last=False)[1][1]
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._bytes = 0
+            self.acertos = self.falhas = 0
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {"Acertos": self.acertos, "Falhas": self.falhas, "Taxa de Acerto (%)": self.acertos / consultas * 100 if consultas else 0.0,
+                    "Itens": len(self._itens), "Memória (MB)": self._bytes / 1024 ** 2}
@@ -0,0 +1,334 @@
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+DIRETORIO_CACHE_PADRAO = os.environ.get('ANALISADOR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'analisador_backtest'))
+FUSO_HORARIO_PADRAO = 'America/Sao_Paulo'
+COLUNAS_YAHOO = {'Open': 'Abertura', 'High': 'Máxima', 'Low': 'Mínima', 'Close': 'Fechamento', 'Volume': 'Volume'}
+# Maior período (em dias) que o Yahoo aceita numa única requisição para cada intervalo.
+DIAS_POR_REQUISICAO = {'1m': 7, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 729, '90m': 59, '1h': 729}
+
+# --- Fonte Yahoo Finance ---
+
+def _como_data(valor):
+    if isinstance(valor, datetime.datetime): return valor.date()
+    if isinstance(valor, datetime.date): return valor
+    return pd.Timestamp(valor).date()
+
+def formatar_ticker(ticker, tipo_ativo):
+    ticker_formatado = ticker.upper()
+    if tipo_ativo == "Ação (Brasil)":
+        if not ticker_formatado.endswith('.SA'): ticker_formatado = f"{ticker_formatado}.SA"
+    elif tipo_ativo == "Forex":
+        ticker_formatado = f"{ticker_formatado}=X"
+    return ticker_formatado
+
+def baixar_yahoo(ticker_formatado, data_inicio, data_fim, intervalo='1d'):
+    # Toda fonte de dados segue esta assinatura e devolve um frame com índice sem fuso horário.
+    import yfinance as yf
+    dados = yf.Ticker(ticker_formatado).history(start=data_inicio, end=data_fim, interval=intervalo, auto_adjust=False)
+    if dados.empty: return dados
+    if intervalo == '1d':
+        dados.index = dados.index.tz_localize(None)
+    else:
+        dados.index = dados.index.tz_convert(FUSO_HORARIO_PADRAO).tz_localize(None)
+    return dados
+
+class FonteArquivosLocais:
+    # Fonte local com a mesma assinatura de baixar_yahoo: lê <ticker>_<intervalo>.parquet (ou .csv) de um diretório.
+    # Serve para testes e execuções sem rede.
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+
+    def __call__(self, ticker, data_inicio, data_fim, intervalo='1d'):
+        base = os.path.join(self.diretorio, f"{ticker}_{intervalo}")
+        if os.path.exists(base + '.parquet'):
+            dados = pd.read_parquet(base + '.parquet')
+        elif os.path.exists(base + '.csv'):
+            dados = pd.read_csv(base + '.csv', index_col=0, parse_dates=True)
+        else:
+            return pd.DataFrame()
+        if dados.index.tz is not None: dados.index = dados.index.tz_convert(FUSO_HORARIO_PADRAO).tz_localize(None)
+        return dados[(dados.index >= pd.Timestamp(data_inicio)) & (dados.index < pd.Timestamp(data_fim))]
+
+# --- Download em Janelas ---
+
+def planejar_janelas(data_inicio, data_fim, dias_por_janela):
+    data_inicio, data_fim = _como_data(data_inicio), _como_data(data_fim)
+    if not dias_por_janela: return [(data_inicio, data_fim)] if data_inicio < data_fim else []
+    janelas, cursor = [], data_inicio
+    while cursor < data_fim:
+        fim = min(cursor + datetime.timedelta(days=dias_por_janela), data_fim)
+        janelas.append((cursor, fim))
+        cursor = fim
+    return janelas
+
+def _baixar_com_retentativas(fonte, ticker, data_inicio, data_fim, intervalo, tentativas, espera_inicial):
+    for tentativa in range(tentativas):
+        try:
+            return fonte(ticker, data_inicio, data_fim, intervalo)
+        except Exception:
+            if tentativa == tentativas - 1: raise
+            time.sleep(espera_inicial * 2 ** tentativa * (1 + random.random()))
+
+def costurar_janelas(partes):
+    # Junta as janelas num único frame sem fuso horário, ordenado e sem candles duplicados nas bordas.
+    partes = [parte for parte in partes if parte is not None and not parte.empty]
+    if not partes: return pd.DataFrame()
+    normalizadas = []
+    for parte in partes:
+        if isinstance(parte.index, pd.DatetimeIndex) and parte.index.tz is not None:
+            parte = parte.copy()
+            parte.index = parte.index.tz_convert(FUSO_HORARIO_PADRAO).tz_localize(None)
+        normalizadas.append(parte)
+    dados = pd.concat(normalizadas)
+    return dados[~dados.index.duplicated(keep='last')].sort_index()
+
+def baixar_em_janelas(fonte, ticker, data_inicio, data_fim, intervalo='15m', max_workers=4, tentativas=3, espera_inicial=1.0, progresso=None):
+    janelas = planejar_janelas(data_inicio, data_fim, DIAS_POR_REQUISICAO.get(intervalo))
+    if not janelas: return pd.DataFrame()
+    partes = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(janelas))) as executor:
+        futuros = [executor.submit(_baixar_com_retentativas, fonte, ticker, inicio, fim, intervalo, tentativas, espera_inicial) for inicio, fim in janelas]
+        try:
+            for concluidas, futuro in enumerate(as_completed(futuros), 1):
+                partes.append(futuro.result())
+                if progresso: progresso(concluidas, len(janelas))
+        except BaseException:
+            # Falha ou cancelamento (o callback de progresso pode interromper): as janelas que nem começaram são abandonadas.
+            for futuro in futuros: futuro.cancel()
+            raise
+    return costurar_janelas(partes)
+
+class FonteEmJanelas:
+    # Envolve uma fonte para que períodos maiores que o limite por requisição sejam baixados em janelas paralelas.
+    def __init__(self, fonte=baixar_yahoo, max_workers=4, tentativas=3, espera_inicial=1.0):
+        self.fonte = fonte
+        self.max_workers = max_workers
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+
+    def __call__(self, ticker, data_inicio, data_fim, intervalo='1d', progresso=None):
+        return baixar_em_janelas(self.fonte, ticker, data_inicio, data_fim, intervalo, self.max_workers, self.tentativas, self.espera_inicial, progresso)
+
+# --- Cache Persistente em Disco ---
+
+def _unir_intervalos(intervalos):
+    unidos = []
+    for inicio, fim in sorted(intervalos):
+        if unidos and inicio <= unidos[-1][1]:
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], fim))
+        else:
+            unidos.append((inicio, fim))
+    return unidos
+
+def _lacunas(inicio, fim, cobertura):
+    # Partes de [inicio, fim) que ainda não estão em nenhum intervalo coberto.
+    lacunas, cursor = [], inicio
+    for coberto_inicio, coberto_fim in cobertura:
+        if coberto_fim <= cursor: continue
+        if coberto_inicio >= fim: break
+        if coberto_inicio > cursor: lacunas.append((cursor, coberto_inicio))
+        cursor = max(cursor, coberto_fim)
+    if cursor < fim: lacunas.append((cursor, fim))
+    return lacunas
+
+class CacheOHLCV:
+    # Guarda um Parquet por ticker/intervalo e, ao lado, um JSON com os intervalos de datas [inicio, fim) já baixados.
+    # Pedidos novos buscam na fonte apenas as lacunas e as mesclam ao arquivo existente.
+    def __init__(self, diretorio=DIRETORIO_CACHE_PADRAO, fonte=None):
+        self.diretorio = diretorio
+        self.fonte = fonte if fonte is not None else FonteEmJanelas()
+        self._travas = defaultdict(threading.Lock)
+        self._trava_travas = threading.Lock()
+
+    def _caminhos(self, ticker, intervalo):
+        nome = re.sub(r'[^0-9A-Za-z._-]', '_', f"{ticker}_{intervalo}")
+        base = os.path.join(self.diretorio, nome)
+        return base + '.parquet', base + '.json'
+
+    def _trava(self, caminho):
+        with self._trava_travas:
+            return self._travas[caminho]
+
+    def cobertura(self, ticker, intervalo='1d'):
+        _, caminho_cobertura = self._caminhos(ticker, intervalo)
+        if not os.path.exists(caminho_cobertura): return []
+        with open(caminho_cobertura, encoding='utf-8') as arquivo:
+            return [(datetime.date.fromisoformat(inicio), datetime.date.fromisoformat(fim)) for inicio, fim in json.load(arquivo)['intervalos']]
+
+    def _salvar(self, caminho_dados, caminho_cobertura, dados, cobertura):
+        os.makedirs(self.diretorio, exist_ok=True)
+        if dados is not None:
+            temporario = caminho_dados + '.tmp'
+            dados.to_parquet(temporario)
+            os.replace(temporario, caminho_dados)
+        temporario = caminho_cobertura + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({'intervalos': [[inicio.isoformat(), fim.isoformat()] for inicio, fim in cobertura]}, arquivo)
+        os.replace(temporario, caminho_cobertura)
+
+    def obter(self, ticker, data_inicio, data_fim, intervalo='1d', **opcoes_fonte):
+        data_inicio, data_fim = _como_data(data_inicio), _como_data(data_fim)
+        caminho_dados, caminho_cobertura = self._caminhos(ticker, intervalo)
+        with self._trava(caminho_dados):
+            cobertura = self.cobertura(ticker, intervalo)
+            dados = pd.read_parquet(caminho_dados) if os.path.exists(caminho_dados) else None
+            lacunas = _lacunas(data_inicio, data_fim, cobertura)
+            if lacunas:
+                baixados, cobertos = [], []
+                for inicio, fim in lacunas:
+                    novos = self.fonte(ticker, inicio, fim, intervalo, **opcoes_fonte)
+                    if novos is None or novos.empty: continue
+                    baixados.append(novos)
+                    # O dia de hoje ainda pode receber candles, então nunca é marcado como coberto.
+                    fim_coberto = min(fim, datetime.date.today())
+                    if fim_coberto > inicio: cobertos.append((inicio, fim_coberto))
+                if baixados:
+                    dados = pd.concat(([dados] if dados is not None else []) + baixados)
+                    dados = dados[~dados.index.duplicated(keep='last')].sort_index()
+                    self._salvar(caminho_dados, caminho_cobertura, dados, _unir_intervalos(cobertura + cobertos))
+        if dados is None: return pd.DataFrame()
+        return dados[(dados.index >= pd.Timestamp(data_inicio)) & (dados.index < pd.Timestamp(data_fim))]
+
+def baixar_universo(fonte, tickers, data_inicio, data_fim, intervalo='1d', max_workers=8, progresso=None):
+    # Busca vários tickers em paralelo. `fonte` tem a assinatura de baixar_yahoo; com CacheOHLCV(...).obter só as
+    # lacunas vão à rede. Retorna ({ticker: frame}, {ticker: erro}): um ticker que falha ou volta vazio não derruba os demais.
+    dados, falhas = {}, {}
+    if not tickers: return dados, falhas
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as executor:
+        futuros = {executor.submit(fonte, ticker, data_inicio, data_fim, intervalo): ticker for ticker in tickers}
+        try:
+            for concluidos, futuro in enumerate(as_completed(futuros), 1):
+                ticker = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                    if resultado.empty: falhas[ticker] = "Nenhum dado encontrado."
+                    else: dados[ticker] = resultado
+                except Exception as e:
+                    falhas[ticker] = str(e)
+                if progresso: progresso(concluidos, len(futuros))
+        except BaseException:
+            for futuro in futuros: futuro.cancel()
+            raise
+    return {ticker: dados[ticker] for ticker in tickers if ticker in dados}, falhas
+
+# --- Ingestão de Arquivos ---
+
+COLUNAS_PRECO = ('Abertura', 'Máxima', 'Mínima', 'Fechamento')
+LINHAS_POR_BLOCO = 250_000
+MAX_BYTES_COLUNARES = 2 * 1024 ** 3
+MAX_DIAS_COLUNARES = 30
+
+def impressao_do_arquivo(conteudo):
+    return hashlib.blake2b(conteudo, digest_size=16).hexdigest()
+
+def caminho_colunar(impressao, diretorio=DIRETORIO_CACHE_PADRAO):
+    return os.path.join(diretorio, 'uploads', f"{impressao}.parquet")
+
+def salvar_colunar(dados, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + '.tmp'
+    dados.to_parquet(temporario)
+    os.replace(temporario, caminho)
+
+def abrir_colunar(caminho):
+    # Renova a data de modificação, que é a data de último uso para podar_colunares.
+    os.utime(caminho)
+    return pd.read_parquet(caminho)
+
+def podar_colunares(diretorio=DIRETORIO_CACHE_PADRAO, max_bytes=MAX_BYTES_COLUNARES, max_dias=MAX_DIAS_COLUNARES):
+    # Apaga as versões colunares de uploads sem uso há mais de `max_dias` e, das restantes, as usadas há mais
+    # tempo até o total caber em `max_bytes`.
+    pasta = os.path.join(diretorio, 'uploads')
+    if not os.path.isdir(pasta): return
+    arquivos = []
+    for nome in os.listdir(pasta):
+        try: info = os.stat(os.path.join(pasta, nome))
+        except OSError: continue
+        arquivos.append((info.st_mtime, info.st_size, os.path.join(pasta, nome)))
+    limite_idade, total = time.time() - max_dias * 86400, 0
+    for modificado, tamanho, caminho in sorted(arquivos, reverse=True):
+        total += tamanho
+        if modificado < limite_idade or total > max_bytes:
+            try: os.remove(caminho)
+            except OSError: pass
+
+def _hora_em_segundos(hora):
+    if isinstance(hora, datetime.datetime): hora = hora.time()
+    if isinstance(hora, datetime.time): return hora.hour * 3600 + hora.minute * 60 + hora.second + hora.microsecond / 1e6
+    if isinstance(hora, (datetime.timedelta, pd.Timedelta)): return hora.total_seconds()
+    partes = str(hora).strip().split(':')
+    if len(partes) < 2: raise ValueError(f"Hora inválida: '{hora}'")
+    return int(partes[0]) * 3600 + int(partes[1]) * 60 + (float(partes[2]) if len(partes) > 2 else 0)
+
+def montar_timestamps(datas, horas):
+    # Soma a data (normalizada) à hora do dia sem passar por strings. As duas colunas têm poucos valores
+    # distintos, então só os valores únicos são convertidos e o resultado é espalhado pelos códigos.
+    codigos, unicos = pd.factorize(datas, use_na_sentinel=True)
+    datas_unicas = pd.to_datetime(pd.Index(unicos), dayfirst=True, errors='coerce').normalize()
+    dias = np.where(codigos >= 0, datas_unicas.values.astype('datetime64[ns]')[codigos], np.datetime64('NaT', 'ns'))
+    codigos, unicos = pd.factorize(horas, use_na_sentinel=False)
+    segundos = np.array([_hora_em_segundos(hora) for hora in unicos], dtype=float)
+    deslocamentos = np.round(segundos * 1e9).astype('int64').astype('timedelta64[ns]')
+    return pd.DatetimeIndex(dias + deslocamentos[codigos], name='Timestamp')
+
+def _compactar_bloco(bloco):
+    if 'Hora' not in bloco.columns:
+        raise ValueError("Para a Análise Intraday com arquivo, a coluna 'Hora' é necessária.")
+    timestamps = montar_timestamps(bloco['Data'], bloco['Hora'])
+    bloco = bloco.drop(columns=['Data', 'Hora'])
+    bloco.index = timestamps
+    for coluna in bloco.columns:
+        if coluna in COLUNAS_PRECO:
+            bloco[coluna] = pd.to_numeric(bloco[coluna]).astype('float32')
+        elif pd.api.types.is_integer_dtype(bloco[coluna]):
+            bloco[coluna] = pd.to_numeric(bloco[coluna], downcast='integer')
+        elif pd.api.types.is_object_dtype(bloco[coluna]) or pd.api.types.is_string_dtype(bloco[coluna]):
+            bloco[coluna] = bloco[coluna].astype('category')
+    return bloco[timestamps.notna()]
+
+def _blocos_csv(arquivo, linhas_por_bloco):
+    return pd.read_csv(arquivo, sep=';', encoding='latin1', header=0, decimal=',', chunksize=linhas_por_bloco, dtype={coluna: 'float32' for coluna in COLUNAS_PRECO})
+
+def _blocos_xlsx(arquivo, linhas_por_bloco):
+    from openpyxl import load_workbook
+    pasta = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = pasta.active.iter_rows(values_only=True)
+        cabecalho = [str(coluna) for coluna in next(linhas)]
+        while True:
+            registros = list(itertools.islice(linhas, linhas_por_bloco))
+            if not registros: break
+            yield pd.DataFrame.from_records(registros, columns=cabecalho)
+    finally:
+        pasta.close()
+
+def ler_intraday_em_blocos(arquivo, nome_arquivo, linhas_por_bloco=LINHAS_POR_BLOCO):
+    # Lê CSV/XLSX em blocos, montando o índice de tempo e compactando os tipos bloco a bloco,
+    # para que o pico de memória não dependa do tamanho do arquivo inteiro em strings.
+    if nome_arquivo.endswith('.csv'): blocos = _blocos_csv(arquivo, linhas_por_bloco)
+    elif nome_arquivo.endswith('.xlsx'): blocos = _blocos_xlsx(arquivo, linhas_por_bloco)
+    else: raise ValueError(f"Formato de arquivo não suportado: '{nome_arquivo}'")
+    compactados = [_compactar_bloco(bloco) for bloco in blocos]
+    if not compactados: return pd.DataFrame(index=pd.DatetimeIndex([], name='Timestamp'))
+    # Categorias diferentes entre blocos fariam o concat voltar para object. Ordenadas, como num bloco só,
+    # para que o resultado não dependa de onde caem as bordas dos blocos.
+    for coluna in compactados[0].columns:
+        if isinstance(compactados[0][coluna].dtype, pd.CategoricalDtype):
+            categorias = pd.api.types.union_categoricals([bloco[coluna] for bloco in compactados], sort_categories=True).categories
+            for bloco in compactados: bloco[coluna] = bloco[coluna].cat.set_categories(categorias)
+    dados = pd.concat(compactados)
+    if not dados.index.is_monotonic_increasing: dados = dados.sort_index()
+    return dados
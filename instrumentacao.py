@@ -0,0 +1,111 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Medição das etapas do pipeline (busca, preparação, backtest, métricas, renderização) a cada rerun:
+# duração, linhas, variação do RSS do processo e, para etapas servidas por cache, se houve acerto.
+# Cada etapa também sai como uma linha JSON no logger 'analisador.etapas', para agregar entre usuários.
+# O RSS é do processo inteiro: outras sessões e as tarefas em segundo plano rodam no mesmo processo, então
+# a variação medida durante uma etapa não é só dela (é exata apenas com o processo ocioso no resto).
+
+CAMINHO_LOG_ETAPAS = os.environ.get('ANALISADOR_LOG_ETAPAS')
+registro_log = logging.getLogger('analisador.etapas')
+_local = threading.local()
+_TAMANHO_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def configurar_log(caminho=CAMINHO_LOG_ETAPAS):
+    # Sem caminho (variável ANALISADOR_LOG_ETAPAS vazia) as linhas JSON vão para a saída de erro.
+    manipulador = logging.FileHandler(caminho, encoding='utf-8') if caminho else logging.StreamHandler()
+    manipulador.setFormatter(logging.Formatter('%(message)s'))
+    registro_log.addHandler(manipulador)
+    registro_log.setLevel(logging.INFO)
+    registro_log.propagate = False
+    return manipulador
+
+def memoria_residente():
+    # RSS do processo em bytes, lido de /proc/self/statm. Fora do Linux devolve None.
+    try:
+        with open('/proc/self/statm', encoding='ascii') as arquivo:
+            return int(arquivo.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _execucoes():
+    return getattr(_local, 'execucoes', 0)
+
+def contado(funcao):
+    # Embrulha a função que um cache chama só quando não tem o valor: cada execução real incrementa um
+    # contador da thread, e a etapa compara o contador antes e depois para saber se foi acerto ou falha.
+    @functools.wraps(funcao)
+    def embrulhada(*args, **kwargs):
+        _local.execucoes = _execucoes() + 1
+        return funcao(*args, **kwargs)
+    return embrulhada
+
+class Etapa:
+    def __init__(self, nome, linhas=None, nivel=0):
+        self.nome = nome
+        self.nivel = nivel
+        self.linhas = linhas
+        self.duracao_s = None
+        self.rss_processo_mb = None
+        self.cache = None
+        self.erro = None
+
+class Instrumentacao:
+    # Uma por sessão. nova_execucao() no início de cada rerun zera a lista de etapas.
+    def __init__(self, sessao=None):
+        self.sessao = sessao or uuid.uuid4().hex[:12]
+        self.execucao = 0
+        self.etapas = []
+
+    def nova_execucao(self):
+        self.execucao += 1
+        self.etapas = []
+
+    @contextmanager
+    def etapa(self, nome, linhas=None, cache=False):
+        # `linhas` pode ser preenchido dentro do bloco (registro.linhas = len(resultado)) quando só se sabe no fim.
+        # Etapas abertas dentro de outra ganham nível maior e não entram no total (já contadas na de fora).
+        registro = Etapa(nome, linhas, getattr(_local, 'nivel', 0))
+        _local.nivel = registro.nivel + 1
+        execucoes_antes = _execucoes()
+        rss_antes = memoria_residente()
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except Exception as e:
+            registro.erro = type(e).__name__
+            raise
+        finally:
+            _local.nivel = registro.nivel
+            registro.duracao_s = time.perf_counter() - inicio
+            rss_depois = memoria_residente()
+            if rss_antes is not None and rss_depois is not None: registro.rss_processo_mb = (rss_depois - rss_antes) / 1024 ** 2
+            if cache: registro.cache = 'falha' if _execucoes() > execucoes_antes else 'acerto'
+            self.etapas.append(registro)
+            registro_log.info(json.dumps({
+                'sessao': self.sessao, 'execucao': self.execucao, 'etapa': registro.nome, 'nivel': registro.nivel, 'duracao_s': round(registro.duracao_s, 6),
+                'linhas': registro.linhas, 'delta_rss_processo_mb': registro.rss_processo_mb, 'cache': registro.cache, 'erro': registro.erro,
+            }, ensure_ascii=False))
+
+    def tabela(self):
+        return pd.DataFrame([{
+            "Etapa": "  " * etapa.nivel + etapa.nome, "Duração (ms)": etapa.duracao_s * 1000, "Linhas": etapa.linhas,
+            "Δ RSS do Processo (MB)": etapa.rss_processo_mb, "Cache": etapa.cache or "-", "Erro": etapa.erro or "",
+        } for etapa in self.etapas])
+
+    def duracao_total(self):
+        return sum(etapa.duracao_s for etapa in self.etapas if etapa.nivel == 0)
+
+    def resumo_cache(self):
+        acertos = sum(etapa.cache == 'acerto' for etapa in self.etapas)
+        falhas = sum(etapa.cache == 'falha' for etapa in self.etapas)
+        return {"Acertos": acertos, "Falhas": falhas}
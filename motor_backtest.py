@@ -0,0 +1,527 @@
+import pandas as pd
+import numpy as np
+import datetime
+from collections import namedtuple
+
+from fontes_dados import COLUNAS_YAHOO, montar_timestamps
+
+# --- Preparação dos Dados ---
+
+def processar_dados(dados, modo_analise):
+    if modo_analise == "Análise Intraday" and not isinstance(dados.index, pd.DatetimeIndex) and 'Hora' not in dados.columns:
+        raise ValueError("Para a Análise Intraday com arquivo, a coluna 'Hora' é necessária.")
+    if isinstance(dados.index, pd.DatetimeIndex): return dados
+    # A entrada pode ser somente leitura (memmaps do armazém): nada é alterado no lugar, só as linhas válidas são selecionadas.
+    dados_processados = dados
+    try:
+        datas = pd.to_datetime(dados['Data'], dayfirst=True, errors='coerce')
+        if modo_analise == "Análise Intraday":
+            validas = datas.notna().to_numpy()
+            dados_processados = dados[validas].assign(Data=datas[validas])
+            timestamps = montar_timestamps(dados_processados['Data'], dados_processados['Hora'])
+            dados_processados = dados_processados.set_index(timestamps).sort_index()
+        elif modo_analise == "Análise Day Trade":
+            datas = datas.dt.normalize()
+            validas = (datas.notna() & ~datas.duplicated(keep='first')).to_numpy()
+            dados_processados = dados[validas].drop(columns=['Data']).set_index(pd.DatetimeIndex(datas[validas], name='Data'))
+    except Exception as e:
+        raise ValueError(f"Erro ao processar a coluna 'Data'. Verifique o formato. Erro: {e}") from e
+    return dados_processados
+
+def preparar_dados_day_trade(df):
+    df_prep = df.rename(columns=COLUNAS_YAHOO)
+    df_prep['Fechamento_Anterior'] = df_prep['Fechamento'].shift(1)
+    df_prep.dropna(inplace=True)
+    df_prep['% Abertura'] = (df_prep['Abertura'] / df_prep['Fechamento_Anterior'] - 1)
+    df_prep['% Máxima'] = (df_prep['Máxima'] / df_prep['Fechamento_Anterior'] - 1)
+    df_prep['% Mínima'] = (df_prep['Mínima'] / df_prep['Fechamento_Anterior'] - 1)
+    df_prep['% Fechamento'] = (df_prep['Fechamento'] / df_prep['Fechamento_Anterior'] - 1)
+    df_prep.index.name = 'Data'
+    colunas_necessarias = ['Abertura', 'Máxima', 'Mínima', 'Fechamento', 'Volume', '% Abertura', '% Máxima', '% Mínima', '% Fechamento']
+    return df_prep[colunas_necessarias]
+# --- Intraday ---
+
+IndiceDiario = namedtuple('IndiceDiario', ['instantes', 'dias', 'inicios', 'fins', 'segundos_do_dia', 'fechamento_anterior', 'linhas_completas'])
+
+def _segmentos(rotulos):
+    # Posições [inicio, fim) de cada sequência de rótulos iguais num array ordenado.
+    if len(rotulos) == 0: return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    mudancas = np.flatnonzero(rotulos[1:] != rotulos[:-1]) + 1
+    return np.concatenate(([0], mudancas)), np.concatenate((mudancas, [len(rotulos)]))
+
+def _valido_por_segmento(valores, inicios, fins, ultimo=True):
+    # Último (ou primeiro) valor não-NaN de cada segmento [inicio, fim); NaN se o segmento não tiver nenhum.
+    validos = np.flatnonzero(~np.isnan(valores))
+    if len(validos) == 0: return np.full(len(inicios), np.nan, dtype=valores.dtype)
+    if ultimo: posicoes = validos[np.maximum(np.searchsorted(validos, fins) - 1, 0)]
+    else: posicoes = validos[np.minimum(np.searchsorted(validos, inicios), len(validos) - 1)]
+    return np.where((posicoes >= inicios) & (posicoes < fins), valores[posicoes], np.nan)
+
+def construir_indice_diario(df, diario=None):
+    # Índice compacto de um dataset intraday ordenado, montado uma vez no carregamento: posições [inicio, fim)
+    # de cada dia, segundo do dia de cada candle e o fechamento do dia corrido anterior
+    # (como em resample('D')['Fechamento'].last().shift(1)). Fatias por dia/horário viram buscas em arrays.
+    # Com `diario` (o nível diário da pirâmide) o fechamento de cada dia vem dele em vez de ser recalculado.
+    instantes = df.index.values
+    dias_por_candle = instantes.astype('datetime64[D]')
+    inicios, fins = _segmentos(dias_por_candle)
+    dias = dias_por_candle[inicios]
+    segundos_do_dia = ((instantes - dias_por_candle) // np.timedelta64(1, 's')).astype(np.int32)
+    if diario is not None:
+        posicoes = diario.index.get_indexer(pd.DatetimeIndex(dias.astype(instantes.dtype)))
+        fechamento_dia = np.where(posicoes >= 0, diario['Fechamento'].to_numpy()[posicoes], np.nan)
+    else:
+        fechamento_dia = _valido_por_segmento(df['Fechamento'].to_numpy(), inicios, fins)
+    dia_anterior_consecutivo = np.concatenate(([False], np.diff(dias) == np.timedelta64(1, 'D')))[:len(dias)]
+    fechamento_anterior = np.where(dia_anterior_consecutivo, np.roll(fechamento_dia, 1), np.nan)
+    linhas_completas = np.flatnonzero(df.notna().all(axis=1).to_numpy())
+    return IndiceDiario(instantes, dias, inicios, fins, segundos_do_dia, fechamento_anterior, linhas_completas)
+
+# --- Pirâmide de Tempos Gráficos ---
+
+# Níveis intraday derivados dos candles carregados (só os mais grossos que a base e múltiplos dela).
+MINUTOS_PIRAMIDE = (15, 30, 60)
+PiramideTempos = namedtuple('PiramideTempos', ['intraday', 'indices', 'diario', 'day_trade'])
+
+def agregar_candles(df, rotulos):
+    # Junta os candles consecutivos de mesmo rótulo num só, como resample().agg(first/max/min/last/sum)
+    # ignorando NaN. Rótulos sem nenhum fechamento válido ficam de fora. `df` precisa estar ordenado.
+    inicios, fins = _segmentos(rotulos)
+    if len(inicios) == 0: return pd.DataFrame(columns=['Abertura', 'Máxima', 'Mínima', 'Fechamento'], index=pd.DatetimeIndex([], name=df.index.name))
+    colunas = {
+        'Abertura': _valido_por_segmento(df['Abertura'].to_numpy(), inicios, fins, ultimo=False),
+        'Máxima': np.fmax.reduceat(df['Máxima'].to_numpy(), inicios),
+        'Mínima': np.fmin.reduceat(df['Mínima'].to_numpy(), inicios),
+        'Fechamento': _valido_por_segmento(df['Fechamento'].to_numpy(), inicios, fins),
+    }
+    if 'Volume' in df.columns:
+        volume = df['Volume'].to_numpy()
+        colunas['Volume'] = np.add.reduceat(np.nan_to_num(volume) if volume.dtype.kind == 'f' else volume.astype(np.int64), inicios)
+    agregado = pd.DataFrame(colunas, index=pd.DatetimeIndex(rotulos[inicios], name=df.index.name))
+    return agregado[~np.isnan(colunas['Fechamento'])]
+
+def _rotulos_por_minutos(instantes, minutos):
+    # Início do intervalo de `minutos` de cada candle, contado a partir da meia-noite (como resample(f'{minutos}min')).
+    meia_noite = instantes.astype('datetime64[D]').astype(instantes.dtype)
+    return instantes - (instantes - meia_noite) % np.timedelta64(minutos, 'm')
+
+def minutos_por_candle(instantes):
+    # Tempo gráfico da base: o menor intervalo entre dois candles do mesmo dia, em minutos (None se não houver).
+    dias = instantes.astype('datetime64[D]')
+    intervalos = np.diff(instantes)[dias[1:] == dias[:-1]]
+    intervalos = intervalos[intervalos > np.timedelta64(0)]
+    return intervalos.min() / np.timedelta64(1, 'm') if len(intervalos) else None
+
+def construir_piramide(df, publicar=None):
+    # Todos os tempos gráficos derivados uma vez dos candles mais finos carregados: os níveis intraday de
+    # MINUTOS_PIRAMIDE, o índice por dia de cada nível (com o fechamento anterior do nível diário), os candles
+    # diários e as colunas % do Day Trade sobre eles. Trocar de tempo gráfico ou de modo só escolhe um nível pronto.
+    # `publicar(nome, frame)`, se dado, tira cada frame derivado do heap (ex.: grava no armazém e o mapeia em
+    # memória) e devolve o frame a usar; os índices são montados já sobre os frames publicados.
+    if publicar is None: publicar = lambda nome, dados: dados
+    if not df.index.is_monotonic_increasing: df = df.sort_index()
+    instantes = df.index.values
+    diario = agregar_candles(df, instantes.astype('datetime64[D]').astype(instantes.dtype))
+    diario.index.name = 'Data'
+    diario = publicar('diario', diario)
+    base = minutos_por_candle(instantes)
+    niveis = {f"{base:g} min" if base else "Original": df}
+    for minutos in MINUTOS_PIRAMIDE:
+        if base and minutos > base and (minutos / base).is_integer(): niveis[f"{minutos} min"] = publicar(f"{minutos} min", agregar_candles(df, _rotulos_por_minutos(instantes, minutos)))
+    indices = {nivel: construir_indice_diario(dados, diario) for nivel, dados in niveis.items()}
+    day_trade = publicar('day_trade', preparar_dados_day_trade(diario if 'Volume' in diario.columns else diario.assign(Volume=0)))
+    return PiramideTempos(niveis, indices, diario, day_trade)
+
+def horario_do_segundo(segundo_do_dia):
+    return datetime.time(int(segundo_do_dia) // 3600, int(segundo_do_dia) % 3600 // 60, int(segundo_do_dia) % 60)
+
+def _indice_para(df, indice):
+    if indice is not None and len(indice.instantes) == len(df) and df.index.is_monotonic_increasing: return df, indice
+    if not df.index.is_monotonic_increasing: df = df.sort_index()
+    return df, construir_indice_diario(df)
+
+def _extremos_por_segmento(valores, inicios, fins, maximo=True):
+    # Máximo (ou mínimo) de cada segmento [inicio, fim) e a posição da sua primeira ocorrência,
+    # como faria idxmax/idxmin em cada fatia. Os segmentos não podem ser vazios.
+    preenchidos = np.where(np.isnan(valores), -np.inf if maximo else np.inf, valores)
+    reducao = np.maximum if maximo else np.minimum
+    pontos = np.column_stack((inicios, fins)).ravel()
+    extremos = reducao.reduceat(np.append(preenchidos, preenchidos[-1]), pontos)[::2]
+    tamanhos = fins - inicios
+    inicio_plano = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    posicoes = np.arange(tamanhos.sum()) + np.repeat(inicios - inicio_plano, tamanhos)
+    iguais = np.flatnonzero(preenchidos[posicoes] == np.repeat(extremos, tamanhos))
+    primeiras = posicoes[iguais[np.searchsorted(iguais, inicio_plano)]]
+    return valores[primeiras], primeiras
+
+def _deslocamento_do_horario(horario):
+    return np.timedelta64(((horario.hour * 60 + horario.minute) * 60 + horario.second) * 1_000_000 + horario.microsecond, 'us')
+
+def aplicar_gatilho_e_criar_resumo(df, variacao_teste, hora_final, indice=None):
+    if df.empty: return None
+    df, indice = _indice_para(df, indice)
+    instantes, dias, inicios, fins = indice.instantes, indice.dias, indice.inicios, indice.fins
+    preco_gatilho = indice.fechamento_anterior * (1 + variacao_teste / 100)
+    # Primeiro candle de cada dia que cruza o preço do gatilho
+    precos_por_candle = np.repeat(preco_gatilho, fins - inicios)
+    if variacao_teste > 0: cruzou = df['Máxima'].to_numpy() >= precos_por_candle
+    else: cruzou = df['Mínima'].to_numpy() <= precos_por_candle
+    cruzamentos = np.flatnonzero(cruzou)
+    if len(cruzamentos) == 0: return None
+    proximo = np.searchsorted(cruzamentos, inicios)
+    entrada = cruzamentos[np.minimum(proximo, len(cruzamentos) - 1)]
+    saida = (dias + _deslocamento_do_horario(hora_final)).astype(instantes.dtype)
+    com_gatilho = (proximo < len(cruzamentos)) & (entrada < fins) & (saida > instantes[entrada])
+    if not com_gatilho.any(): return None
+    dias, entrada, saida, preco_gatilho = dias[com_gatilho], entrada[com_gatilho], saida[com_gatilho], preco_gatilho[com_gatilho]
+    # Janela da operação: do candle de entrada até o último candle antes da hora final
+    inicio_operacao = np.searchsorted(instantes, instantes[entrada], side='left')
+    fim_operacao = np.searchsorted(instantes, saida, side='right')
+    maximas, pos_maximas = _extremos_por_segmento(df['Máxima'].to_numpy(), inicio_operacao, fim_operacao, maximo=True)
+    minimas, pos_minimas = _extremos_por_segmento(df['Mínima'].to_numpy(), inicio_operacao, fim_operacao, maximo=False)
+    # Candle de saída equivalente a df.asof(hora_saida): última linha completa até a hora final.
+    # Assim como no asof, a hora reportada é a própria hora final.
+    linhas_completas = indice.linhas_completas
+    pos_saida = np.searchsorted(instantes[linhas_completas], saida, side='right') - 1
+    encontrou_saida = pos_saida >= 0
+    linhas_saida = linhas_completas[np.maximum(pos_saida, 0)] if len(linhas_completas) else np.zeros_like(pos_saida)
+    fechamentos_saida = np.where(encontrou_saida, df['Fechamento'].to_numpy()[linhas_saida], np.nan)
+    return pd.DataFrame({
+        'Hora Abertura': pd.DatetimeIndex(instantes[entrada]).time, 'Abertura': preco_gatilho,
+        'Hora Máxima': pd.DatetimeIndex(instantes[pos_maximas]).time, 'Maxima': maximas,
+        'Hora Mínima': pd.DatetimeIndex(instantes[pos_minimas]).time, 'Minima': minimas,
+        'Hora Fechamento': pd.DatetimeIndex(saida).time, 'Fechamento': fechamentos_saida,
+    }, index=pd.DatetimeIndex(dias.astype(instantes.dtype), name='Timestamp'))
+
+def criar_resumo_por_horario_fixo(df, hora_inicial, hora_final, indice=None):
+    if df.empty or hora_inicial >= hora_final: return None
+    df, indice = _indice_para(df, indice)
+    instantes, dias = indice.instantes, indice.dias
+    # Equivalente a between_time(hora_inicial, hora_final) em cada dia, com as duas pontas inclusivas
+    inicio_operacao = np.searchsorted(instantes, (dias + _deslocamento_do_horario(hora_inicial)).astype(instantes.dtype), side='left')
+    fim_operacao = np.searchsorted(instantes, (dias + _deslocamento_do_horario(hora_final)).astype(instantes.dtype), side='right')
+    com_operacao = fim_operacao > inicio_operacao
+    if not com_operacao.any(): return None
+    dias, inicio_operacao, fim_operacao = dias[com_operacao], inicio_operacao[com_operacao], fim_operacao[com_operacao]
+    maximas, pos_maximas = _extremos_por_segmento(df['Máxima'].to_numpy(), inicio_operacao, fim_operacao, maximo=True)
+    minimas, pos_minimas = _extremos_por_segmento(df['Mínima'].to_numpy(), inicio_operacao, fim_operacao, maximo=False)
+    return pd.DataFrame({
+        'Hora Abertura': pd.DatetimeIndex(instantes[inicio_operacao]).time, 'Abertura': df['Abertura'].to_numpy()[inicio_operacao],
+        'Hora Máxima': pd.DatetimeIndex(instantes[pos_maximas]).time, 'Maxima': maximas,
+        'Hora Mínima': pd.DatetimeIndex(instantes[pos_minimas]).time, 'Minima': minimas,
+        'Hora Fechamento': pd.DatetimeIndex(instantes[fim_operacao - 1]).time, 'Fechamento': df['Fechamento'].to_numpy()[fim_operacao - 1],
+    }, index=pd.DatetimeIndex(dias.astype(instantes.dtype), name='Timestamp'))
+
+def _tabela_esparsa(valores, maximo=True):
+    # Sparse table: o nível k guarda o extremo de cada bloco de 2**k candles a partir de cada posição,
+    # então o extremo de qualquer intervalo [esquerda, direita] sai de dois blocos sobrepostos em O(1).
+    reducao = np.maximum if maximo else np.minimum
+    niveis = [np.where(np.isnan(valores), -np.inf if maximo else np.inf, valores)]
+    while 2 ** len(niveis) <= len(valores):
+        anterior, meio = niveis[-1], 2 ** (len(niveis) - 1)
+        niveis.append(np.concatenate((reducao(anterior[:-meio], anterior[meio:]), anterior[len(anterior) - meio:])))
+    return np.stack(niveis)
+
+def _consultar_tabela_esparsa(tabela, esquerda, direita, maximo=True):
+    nivel = np.log2(direita - esquerda + 1).astype(np.int64)
+    reducao = np.maximum if maximo else np.minimum
+    return reducao(tabela[nivel, esquerda], tabela[nivel, direita - (1 << nivel) + 1])
+
+def otimizar_janelas_intraday(df, tipos_operacao=('Compra', 'Venda'), indice=None):
+    # Avalia todos os pares (hora inicial, hora final) entre os horários de candle do dataset, como se
+    # criar_resumo_por_horario_fixo + calcular_metricas_de_resumo rodassem para cada par. Entrada, saída,
+    # máxima e mínima de cada dia/janela são buscas O(1) nas posições pré-calculadas e nas sparse tables.
+    if df.empty: return None
+    df, indice = _indice_para(df, indice)
+    instantes = indice.instantes
+    horarios = np.unique(indice.segundos_do_dia)
+    if len(horarios) < 2: return None
+    alvos = (indice.dias[:, None] + horarios[None, :].astype('timedelta64[s]')).astype(instantes.dtype)
+    # Primeiro candle a partir de cada horário e último candle até cada horário, para todo dia
+    entradas = np.searchsorted(instantes, alvos.ravel(), side='left').reshape(alvos.shape)
+    saidas = np.searchsorted(instantes, alvos.ravel(), side='right').reshape(alvos.shape) - 1
+    abertura = df['Abertura'].to_numpy(dtype=float)
+    fechamento = df['Fechamento'].to_numpy(dtype=float)
+    tabela_maximas = _tabela_esparsa(df['Máxima'].to_numpy(dtype=float), maximo=True)
+    tabela_minimas = _tabela_esparsa(df['Mínima'].to_numpy(dtype=float), maximo=False)
+    partes = {tipo_operacao: [] for tipo_operacao in tipos_operacao}
+    pares = []
+    for i in range(len(horarios) - 1):
+        entrada = np.broadcast_to(entradas[:, i:i + 1], saidas[:, i + 1:].shape)
+        saida = saidas[:, i + 1:]
+        # Janela vazia quando não há candle entre os dois horários naquele dia
+        acionado = saida >= entrada
+        entrada_segura = np.where(acionado, entrada, 0)
+        saida_segura = np.where(acionado, saida, 0)
+        preco_entrada = abertura[entrada_segura]
+        maxima = _consultar_tabela_esparsa(tabela_maximas, entrada_segura, saida_segura, maximo=True)
+        minima = _consultar_tabela_esparsa(tabela_minimas, entrada_segura, saida_segura, maximo=False)
+        variacao_final = (fechamento[saida_segura] - preco_entrada) / preco_entrada
+        for tipo_operacao in tipos_operacao:
+            if tipo_operacao == 'Compra':
+                resultado, favoravel, adversa = variacao_final, (maxima - preco_entrada) / preco_entrada, (minima - preco_entrada) / preco_entrada
+            else:
+                resultado, favoravel, adversa = -variacao_final, (preco_entrada - minima) / preco_entrada, (preco_entrada - maxima) / preco_entrada
+            partes[tipo_operacao].append(_metricas_em_grade(resultado, favoravel, adversa, acionado, eixo=0))
+        pares.extend((horarios[i], horario) for horario in horarios[i + 1:])
+    grades = []
+    for tipo_operacao, metricas in partes.items():
+        colunas = {nome: np.concatenate([parte[nome] for parte in metricas]) for nome in metricas[0]}
+        grades.append(pd.DataFrame(colunas, index=pd.MultiIndex.from_tuples(
+            [(tipo_operacao, horario_do_segundo(inicio), horario_do_segundo(fim)) for inicio, fim in pares], names=["Tipo de Operação", "Hora Inicial", "Hora Final"])))
+    return pd.concat(grades)
+
+# --- Day Trade ---
+
+def _gatilhos_day_trade(abertura, maxima, minima, variacoes_decimais):
+    # Avalia o gatilho para uma ou várias variações de uma vez (por broadcasting contra as colunas %).
+    # Retorna a máscara de dias acionados e o preço de entrada (% sobre o fechamento anterior).
+    # Dias sem dados (NaN) nunca acionam.
+    variacoes = np.asarray(variacoes_decimais, dtype=float)
+    positiva, negativa = variacoes > 0, variacoes < 0
+    abertura_acionou = (positiva & (abertura >= variacoes)) | (negativa & (abertura <= variacoes))
+    extremo_acionou = (positiva & (maxima >= variacoes)) | (negativa & (minima <= variacoes))
+    ponto_zero = np.where(abertura_acionou, abertura, variacoes)
+    return abertura_acionou | extremo_acionou, ponto_zero
+
+def simular_day_trade_com_percentagens(df, variacao_teste, tipo_operacao):
+    acionado, ponto_zero = _gatilhos_day_trade(df['% Abertura'].to_numpy(), df['% Máxima'].to_numpy(), df['% Mínima'].to_numpy(), variacao_teste / 100.0)
+    if not acionado.any(): return None
+    operacoes = df[acionado]
+    ponto_zero = ponto_zero[acionado]
+    fechamento_pct = operacoes['% Fechamento'].to_numpy()
+    if tipo_operacao == 'Compra': resultado = fechamento_pct - ponto_zero
+    else: resultado = ponto_zero - fechamento_pct
+    return pd.DataFrame({'Abertura': operacoes['Abertura'].to_numpy(), 'Maxima': operacoes['Máxima'].to_numpy(), 'Minima': operacoes['Mínima'].to_numpy(), 'Fechamento': operacoes['Fechamento'].to_numpy(), '% Abertura': operacoes['% Abertura'].to_numpy(), '% Máxima': operacoes['% Máxima'].to_numpy(), '% Mínima': operacoes['% Mínima'].to_numpy(), '% Fechamento': fechamento_pct, 'Resultado %': resultado, 'Preco_Entrada_Pct': ponto_zero}, index=pd.DatetimeIndex(operacoes.index, name='Data'))
+
+def _metricas_em_grade(resultado, favoravel, adversa, acionado, eixo):
+    # As métricas de calcular_metricas_de_resumo para várias configurações de uma vez: cada fatia ao longo
+    # de `eixo` é uma configuração e só as posições acionadas contam como trades (acionado=None: todas contam).
+    if acionado is not None:
+        resultado = np.where(acionado, resultado, np.nan)
+        favoravel = np.where(acionado, favoravel, np.nan)
+        adversa = np.where(acionado, adversa, np.nan)
+        total_trades = acionado.sum(axis=eixo)
+    else:
+        total_trades = np.full(np.delete(resultado.shape, eixo), resultado.shape[eixo])
+    acertos = (resultado > 0).sum(axis=eixo)
+    erros = total_trades - acertos
+    with np.errstate(invalid='ignore', divide='ignore'):
+        soma = np.where(total_trades > 0, np.nansum(resultado, axis=eixo), np.nan)
+        return {
+            "Total de Trades": total_trades, "Nº de Acertos": acertos, "Nº de Erros": erros,
+            "Taxa de Acerto (%)": acertos / total_trades * 100, "Taxa de Erro (%)": erros / total_trades * 100,
+            "Resultado Final Acumulado (%)": soma * 100, "Ganho Médio (% por Trade)": soma / (~np.isnan(resultado)).sum(axis=eixo) * 100,
+            "Ganho Máximo (1 Trade %)": np.fmax.reduce(resultado, axis=eixo) * 100, "Perda Máxima (1 Trade %)": np.fmin.reduce(resultado, axis=eixo) * 100,
+            "Melhor Momento (Excursão Favorável %)": np.fmax.reduce(favoravel, axis=eixo) * 100,
+            "Pior Momento (Excursão Adversa %)": np.fmin.reduce(adversa, axis=eixo) * 100,
+        }
+
+def varrer_variacoes_day_trade(df, variacoes_teste, tipos_operacao=('Compra', 'Venda')):
+    # Grade de métricas (as mesmas de calcular_metricas_de_resumo) para cada variação x tipo de operação.
+    variacoes = np.asarray(variacoes_teste, dtype=float)
+    maxima = df['% Máxima'].to_numpy()
+    minima = df['% Mínima'].to_numpy()
+    fechamento = df['% Fechamento'].to_numpy()
+    acionado, ponto_zero = _gatilhos_day_trade(df['% Abertura'].to_numpy(), maxima, minima, variacoes[:, None] / 100.0)
+    grades = []
+    for tipo_operacao in tipos_operacao:
+        if tipo_operacao == 'Compra':
+            resultado, favoravel, adversa = fechamento - ponto_zero, maxima - ponto_zero, minima - ponto_zero
+        else:
+            resultado, favoravel, adversa = ponto_zero - fechamento, ponto_zero - minima, ponto_zero - maxima
+        grades.append(pd.DataFrame(_metricas_em_grade(resultado, favoravel, adversa, acionado, eixo=1),
+                                   index=pd.MultiIndex.from_arrays([[tipo_operacao] * len(variacoes), variacoes], names=["Tipo de Operação", "Variação Teste (%)"])))
+    return pd.concat(grades)
+
+# --- Universo (vários tickers) ---
+
+# Um universo alinhado: as colunas % de preparar_dados_day_trade como matrizes (datas x tickers) sobre
+# as datas de todos os tickers, com NaN nos dias em que um ticker não tem candle.
+UniversoAlinhado = namedtuple('UniversoAlinhado', ['datas', 'tickers', 'abertura', 'maxima', 'minima', 'fechamento'])
+
+def alinhar_universo(dados_por_ticker):
+    # Recebe {ticker: frame de preparar_dados_day_trade}.
+    dados_por_ticker = {ticker: df for ticker, df in dados_por_ticker.items() if df is not None and not df.empty}
+    if not dados_por_ticker: return None
+    datas = pd.DatetimeIndex(np.unique(np.concatenate([df.index.to_numpy() for df in dados_por_ticker.values()])), name='Data')
+    matrizes = {coluna: np.full((len(datas), len(dados_por_ticker)), np.nan) for coluna in ('% Abertura', '% Máxima', '% Mínima', '% Fechamento')}
+    for j, df in enumerate(dados_por_ticker.values()):
+        linhas = datas.get_indexer(df.index)
+        for coluna, matriz in matrizes.items(): matriz[linhas, j] = df[coluna].to_numpy()
+    return UniversoAlinhado(datas, list(dados_por_ticker), *matrizes.values())
+
+def simular_day_trade_universo(universo, variacao_teste, tipo_operacao, criterio="Resultado Final Acumulado (%)"):
+    # A lógica de simular_day_trade_com_percentagens para todos os tickers numa passada só. Retorna
+    # (métricas por ticker ordenadas pelo critério, curva combinada por data). A curva é de uma carteira
+    # com peso igual: o resultado do dia é a média dos trades abertos nele, acumulada como nas métricas.
+    acionado, ponto_zero = _gatilhos_day_trade(universo.abertura, universo.maxima, universo.minima, variacao_teste / 100.0)
+    if tipo_operacao == 'Compra':
+        resultado, favoravel, adversa = universo.fechamento - ponto_zero, universo.maxima - ponto_zero, universo.minima - ponto_zero
+    else:
+        resultado, favoravel, adversa = ponto_zero - universo.fechamento, ponto_zero - universo.minima, ponto_zero - universo.maxima
+    ranking = pd.DataFrame(_metricas_em_grade(resultado, favoravel, adversa, acionado, eixo=0), index=pd.Index(universo.tickers, name='Ticker'))
+    ranking = ranking.sort_values(criterio, ascending=False, na_position='last')
+    trades_no_dia = acionado.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        resultado_medio = np.where(acionado, resultado, 0.0).sum(axis=1) / trades_no_dia
+    curva = pd.DataFrame({'Trades': trades_no_dia, 'Resultado Médio (%)': resultado_medio * 100,
+                          'Resultado Acumulado (%)': np.nancumsum(resultado_medio) * 100}, index=universo.datas)
+    return ranking, curva
+
+# --- Métricas e Tabelas ---
+
+def _excursoes_por_trade(resumo_periodo, tipo_operacao):
+    # Excursão favorável e adversa (em decimal) de cada trade em relação ao preço de entrada.
+    if 'Preco_Entrada_Pct' in resumo_periodo.columns:
+        if tipo_operacao == 'Compra':
+            return resumo_periodo['% Máxima'] - resumo_periodo['Preco_Entrada_Pct'], resumo_periodo['% Mínima'] - resumo_periodo['Preco_Entrada_Pct']
+        return resumo_periodo['Preco_Entrada_Pct'] - resumo_periodo['% Mínima'], resumo_periodo['Preco_Entrada_Pct'] - resumo_periodo['% Máxima']
+    abertura = resumo_periodo['Abertura']
+    if tipo_operacao == 'Compra':
+        return (resumo_periodo['Maxima'] - abertura) / abertura, (resumo_periodo['Minima'] - abertura) / abertura
+    return (abertura - resumo_periodo['Minima']) / abertura, (abertura - resumo_periodo['Maxima']) / abertura
+
+def calcular_metricas_de_resumo(resumo_periodo, tipo_operacao):
+    if resumo_periodo is None or len(resumo_periodo) < 1: return None
+    total_trades = len(resumo_periodo)
+    if 'Resultado %' not in resumo_periodo.columns:
+        if tipo_operacao == 'Compra':
+            resumo_periodo['Resultado %'] = (resumo_periodo['Fechamento'] - resumo_periodo['Abertura']) / resumo_periodo['Abertura']
+        else:
+            resumo_periodo['Resultado %'] = (resumo_periodo['Abertura'] - resumo_periodo['Fechamento']) / resumo_periodo['Abertura']
+    resultado_op_decimal = resumo_periodo['Resultado %']
+    acertos = (resultado_op_decimal > 0).sum()
+    erros = total_trades - acertos
+    taxa_acerto = (acertos / total_trades) * 100 if total_trades > 0 else 0
+    taxa_erro = (erros / total_trades) * 100 if total_trades > 0 else 0
+    favoravel, adversa = _excursoes_por_trade(resumo_periodo, tipo_operacao)
+    melhor_momento = favoravel.max() * 100
+    pior_momento = adversa.min() * 100
+    metricas = {"Total de Trades": total_trades, "Nº de Acertos": acertos, "Nº de Erros": erros, "Taxa de Acerto (%)": taxa_acerto, "Taxa de Erro (%)": taxa_erro, "Resultado Final Acumulado (%)": resultado_op_decimal.sum() * 100, "Ganho Médio (% por Trade)": resultado_op_decimal.mean() * 100, "Ganho Máximo (1 Trade %)": resultado_op_decimal.max() * 100, "Perda Máxima (1 Trade %)": resultado_op_decimal.min() * 100, "Melhor Momento (Excursão Favorável %)": melhor_momento, "Pior Momento (Excursão Adversa %)": pior_momento}
+    return metricas
+
+METODOS_REAMOSTRAGEM = ('bootstrap', 'embaralhamento')
+ELEMENTOS_POR_BLOCO = 250_000
+
+def _drawdowns_maximos(resultados):
+    # Maior queda da curva acumulada (soma dos resultados, partindo de zero) de cada sequência (coluna).
+    # Os resultados não podem ter NaN.
+    curva = np.cumsum(resultados, axis=0)
+    queda = np.maximum.accumulate(curva, axis=0)
+    np.maximum(queda, 0, out=queda)
+    queda -= curva
+    return queda.max(axis=0)
+
+def reamostrar_trades(resumo_periodo, tipo_operacao, reamostragens=10_000, metodo='bootstrap', confianca=0.95, semente=0):
+    # Intervalos de confiança das métricas de calcular_metricas_de_resumo e distribuição do drawdown máximo.
+    # 'bootstrap' sorteia os trades com reposição; 'embaralhamento' só muda a ordem (as métricas ficam iguais
+    # e apenas o drawdown varia). As sequências são colunas de blocos de ~ELEMENTOS_POR_BLOCO trades, o que
+    # limita a memória e mantém as reduções ao longo de linhas contíguas; a semente torna o resultado reproduzível.
+    if metodo not in METODOS_REAMOSTRAGEM: raise ValueError(f"Método de reamostragem desconhecido: {metodo}")
+    observadas = calcular_metricas_de_resumo(resumo_periodo, tipo_operacao)
+    if observadas is None: return None, None
+    resultados = resumo_periodo['Resultado %'].to_numpy(dtype=float)
+    tem_nan = np.isnan(resultados).any()
+    favoravel, adversa = (serie.to_numpy(dtype=float) for serie in _excursoes_por_trade(resumo_periodo, tipo_operacao))
+    total = len(resultados)
+    sequencias_por_bloco = max(1, ELEMENTOS_POR_BLOCO // total)
+    rng = np.random.default_rng(semente)
+    blocos, drawdowns = [], []
+    for inicio in range(0, reamostragens, sequencias_por_bloco):
+        sequencias = min(sequencias_por_bloco, reamostragens - inicio)
+        # Sorteia sequência por sequência (linhas) e só então transpõe: o fluxo da semente não depende do tamanho do bloco
+        if metodo == 'bootstrap': indices = rng.integers(0, total, size=(sequencias, total))
+        else: indices = rng.permuted(np.tile(np.arange(total), (sequencias, 1)), axis=1)
+        indices = np.ascontiguousarray(indices.T)
+        amostra = resultados[indices]
+        blocos.append(_metricas_em_grade(amostra, favoravel[indices], adversa[indices], None, eixo=0))
+        drawdowns.append(_drawdowns_maximos(np.nan_to_num(amostra) if tem_nan else amostra) * 100)
+    drawdowns = np.concatenate(drawdowns)
+    cauda = (1 - confianca) / 2
+    linhas_tabela = {}
+    with np.errstate(invalid='ignore'):
+        for nome, observado in observadas.items():
+            valores = np.concatenate([bloco[nome] for bloco in blocos]).astype(float)
+            linhas_tabela[nome] = (observado, np.nanmean(valores), *np.nanquantile(valores, [cauda, 1 - cauda]))
+    linhas_tabela["Drawdown Máximo (%)"] = (_drawdowns_maximos(np.nan_to_num(resultados)[:, None])[0] * 100, drawdowns.mean(), *np.quantile(drawdowns, [cauda, 1 - cauda]))
+    tabela = pd.DataFrame.from_dict(linhas_tabela, orient='index', columns=["Observado", "Média", "IC Inferior", "IC Superior"])
+    tabela.index.name = "Métrica"
+    return tabela, drawdowns
+
+PERIODOS_RECENTES = (5, 10, 15, 20, 25)
+DIAS_UTEIS = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira']
+
+def _somas_acumuladas(resultados):
+    # Somas prefixadas (com zero à frente) de resultado, de resultados válidos e de acertos: qualquer janela
+    # [i, j) sai como S[j] - S[i] em O(1). NaN não soma nem conta, como no mean() do pandas.
+    validos = ~np.isnan(resultados)
+    def prefixar(valores): return np.concatenate(([0], np.cumsum(valores)))
+    return prefixar(np.where(validos, resultados, 0.0)), prefixar(validos), prefixar(resultados > 0)
+
+def calcular_metricas_recentes(resumo_periodo, periodos=PERIODOS_RECENTES):
+    periodos = np.array(sorted(set(periodos)))
+    if resumo_periodo is None or len(resumo_periodo) < periodos[0]: return None
+    soma, contagem, acertos = _somas_acumuladas(resumo_periodo['Resultado %'].to_numpy(dtype=float))
+    total = len(resumo_periodo)
+    periodos = periodos[periodos <= total]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ganho_medio = (soma[total] - soma[total - periodos]) / (contagem[total] - contagem[total - periodos]) * 100
+    taxa_acerto = (acertos[total] - acertos[total - periodos]) / periodos * 100
+    return pd.DataFrame({"Ganho Médio (%)": ganho_medio, "% Acertos": taxa_acerto}, index=pd.Index([f"{p}" for p in periodos], name="Período (Últimos Trades)"))
+
+def calcular_metricas_recentes_por_dia_semana(resumo_periodo, periodos=PERIODOS_RECENTES):
+    if resumo_periodo is None or resumo_periodo.empty: return None
+    dias = resumo_periodo.index.dayofweek.to_numpy()
+    resultados = resumo_periodo['Resultado %'].to_numpy(dtype=float)[dias < 5]
+    dias = dias[dias < 5]
+    # Agrupa os trades por dia da semana mantendo a ordem cronológica: os últimos p trades de cada dia
+    # terminam em fins[d], então todas as janelas de todos os dias saem das mesmas somas prefixadas.
+    ordem = np.argsort(dias, kind='stable')
+    soma, contagem, acertos = _somas_acumuladas(resultados[ordem])
+    trades_por_dia = np.bincount(dias, minlength=5)
+    fins = np.cumsum(trades_por_dia)
+    periodos = np.array(sorted(set(periodos)))[:, None]
+    suficientes = periodos <= trades_por_dia
+    if not suficientes.any(): return None
+    inicios = np.where(suficientes, fins - periodos, fins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ganho_medio = np.where(suficientes, (soma[fins] - soma[inicios]) / (contagem[fins] - contagem[inicios]) * 100, np.nan)
+    taxa_acerto = np.where(suficientes, (acertos[fins] - acertos[inicios]) / periodos * 100, np.nan)
+    linhas = suficientes.any(axis=1)
+    dias_presentes = np.flatnonzero(suficientes.any(axis=0))
+    valores = np.stack((taxa_acerto[linhas][:, dias_presentes], ganho_medio[linhas][:, dias_presentes]), axis=2).reshape(linhas.sum(), -1)
+    colunas = pd.MultiIndex.from_product([[DIAS_UTEIS[d] for d in dias_presentes], ["% Acertos", "Ganho Médio (%)"]], names=["Dia da Semana", None])
+    return pd.DataFrame(valores, index=pd.Index(periodos[linhas, 0], name="Período (Trades)").astype(str), columns=colunas)
+
+def calcular_series_rolantes(resumo_periodo, janela):
+    # Taxa de acerto e ganho médio dos últimos `janela` trades ao longo de todo o histórico.
+    if resumo_periodo is None or len(resumo_periodo) < janela: return None
+    soma, contagem, acertos = _somas_acumuladas(resumo_periodo['Resultado %'].to_numpy(dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ganho_medio = (soma[janela:] - soma[:-janela]) / (contagem[janela:] - contagem[:-janela]) * 100
+    taxa_acerto = (acertos[janela:] - acertos[:-janela]) / janela * 100
+    series = pd.DataFrame({"Ganho Médio (%)": np.nan, "% Acertos": np.nan}, index=resumo_periodo.index)
+    series.iloc[janela - 1:] = np.column_stack((ganho_medio, taxa_acerto))
+    return series
+
+def criar_tabela_dia_semana(resumo_periodo, tipo_operacao):
+    if resumo_periodo is None or resumo_periodo.empty: return None
+    resultado_op = resumo_periodo['Resultado %'].to_numpy() * 100
+    df = pd.DataFrame({'Dia da Semana Num': resumo_periodo.index.dayofweek, 'Resultado Op': resultado_op, 'Acerto': resultado_op > 0})
+    mapa_dias = {0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'}
+    tabela = df.groupby('Dia da Semana Num').agg(Total=('Resultado Op', 'count'), Acertos=('Acerto', 'sum'), Lucro_Medio_Pct=('Resultado Op', 'mean'))
+    tabela.index = tabela.index.map(mapa_dias); tabela.index.name = "Dia da Semana"
+    tabela['Erros'] = tabela['Total'] - tabela['Acertos']
+    tabela['% Acertos'] = (tabela['Acertos'] / tabela['Total']) * 100
+    tabela['% Erros'] = (tabela['Erros'] / tabela['Total']) * 100
+    if not tabela.empty:
+        somas = tabela[['Acertos', 'Erros', 'Total']].sum()
+        medias = tabela[['% Acertos', '% Erros', 'Lucro_Medio_Pct']].mean()
+        total_row = pd.concat([somas, medias]); total_row.name = 'Total / Média'
+        tabela = pd.concat([tabela, pd.DataFrame(total_row).T])
+    ordem_dias = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
+    tabela_ordenada = tabela.reindex(index=ordem_dias).dropna(how='all')
+    if 'Total / Média' in tabela.index: tabela_ordenada = pd.concat([tabela_ordenada, tabela.loc[['Total / Média']]])
+    tabela_ordenada.rename(columns={'Acertos': 'Nº de Acertos', 'Erros': 'Nº de Erros', 'Total': 'Total de Eventos', 'Lucro_Medio_Pct': '% Lucro Médio'}, inplace=True)
+    return tabela_ordenada[['Nº de Acertos', 'Nº de Erros', 'Total de Eventos', '% Acertos', '% Erros', '% Lucro Médio']]
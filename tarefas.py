@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_resultados import CacheResultados
+
+# Execução em segundo plano das buscas e backtests longos, fora do caminho de renderização. Cada tarefa
+# informa o progresso e pode ser cancelada; o resultado fica guardado pela chave dos parâmetros, de modo que
+# qualquer rerun (ou outra sessão) com os mesmos parâmetros o encontra pronto. Cada usuário tem um limite de
+# tarefas simultâneas.
+
+ESTADOS_ATIVOS = ('Na fila', 'Executando')
+
+class TarefaCancelada(Exception):
+    pass
+
+class Tarefa:
+    def __init__(self, chave, descricao, usuario):
+        self.chave = chave
+        self.descricao = descricao
+        self.usuario = usuario
+        self.estado = 'Na fila'
+        self.progresso = 0.0
+        self.mensagem = ''
+        self.erro = None
+        self.inicio = None
+        self.fim = None
+        self._cancelamento = threading.Event()
+
+    def informar(self, feitos, total, mensagem=None):
+        # Mesma assinatura dos callbacks de progresso das fontes e do motor, e também o ponto de cancelamento:
+        # a função da tarefa para na próxima vez que informar o progresso depois de um pedido de cancelamento.
+        if self._cancelamento.is_set(): raise TarefaCancelada()
+        self.progresso = feitos / total if total else 0.0
+        self.mensagem = mensagem if mensagem is not None else f"{feitos}/{total}"
+
+    def cancelar(self):
+        self._cancelamento.set()
+
+    @property
+    def cancelada(self):
+        return self._cancelamento.is_set()
+
+    @property
+    def ativa(self):
+        return self.estado in ESTADOS_ATIVOS
+
+    def duracao(self):
+        if self.inicio is None: return 0.0
+        return (self.fim or time.time()) - self.inicio
+
+class ExecutorTarefas:
+    # Um por processo. As tarefas rodam num pool de threads (o motor passa a maior parte do tempo em numpy/pandas,
+    # que liberam o GIL, e o walk-forward ainda abre o próprio pool de processos).
+    def __init__(self, max_workers=4, max_por_usuario=2, resultados=None, max_historico=200):
+        self.max_por_usuario = max_por_usuario
+        self.max_historico = max_historico
+        self.resultados = resultados if resultados is not None else CacheResultados(max_itens=128, max_bytes=1024 ** 3)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tarefa')
+        self._tarefas = {}
+        self._trava = threading.Lock()
+
+    def enviar(self, usuario, chave, descricao, funcao, *args, **kwargs):
+        # `funcao` recebe a tarefa como primeiro argumento, para informar o progresso. Se a mesma chave já estiver
+        # rodando, ou já tiver terminado com o resultado ainda guardado, devolve a tarefa existente.
+        with self._trava:
+            existente = self._tarefas.get(chave)
+            if existente is not None and (existente.ativa or (existente.estado == 'Concluída' and chave in self.resultados)): return existente
+            if sum(tarefa.ativa for tarefa in self._tarefas.values() if tarefa.usuario == usuario) >= self.max_por_usuario:
+                raise ValueError(f"Limite de {self.max_por_usuario} tarefas simultâneas por usuário atingido. Aguarde ou cancele uma delas.")
+            tarefa = Tarefa(chave, descricao, usuario)
+            self._tarefas[chave] = tarefa
+            self._podar()
+        self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        if tarefa.cancelada:
+            tarefa.estado = 'Cancelada'
+            return
+        tarefa.estado = 'Executando'
+        tarefa.inicio = time.time()
+        try:
+            self.resultados.guardar(tarefa.chave, funcao(tarefa, *args, **kwargs))
+            tarefa.progresso = 1.0
+            tarefa.estado = 'Concluída'
+        except TarefaCancelada:
+            tarefa.estado = 'Cancelada'
+        except Exception as e:
+            tarefa.erro = str(e)
+            tarefa.estado = 'Erro'
+        finally:
+            tarefa.fim = time.time()
+
+    def _podar(self):
+        # Esquece as tarefas terminadas mais antigas além do histórico (os resultados continuam no cache).
+        terminadas = [chave for chave, tarefa in self._tarefas.items() if not tarefa.ativa]
+        for chave in terminadas[:max(0, len(terminadas) - self.max_historico)]: del self._tarefas[chave]
+
+    def obter(self, chave):
+        return self._tarefas.get(chave)
+
+    def resultado(self, chave, padrao=None):
+        return self.resultados.obter(chave, padrao)
+
+    def descartar(self, chave):
+        # Esquece uma tarefa terminada e o seu resultado, para que um novo envio da mesma chave rode de novo.
+        with self._trava:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and tarefa.ativa: return
+            self._tarefas.pop(chave, None)
+            self.resultados.descartar(chave)
+
+    def cancelar(self, chave):
+        tarefa = self._tarefas.get(chave)
+        if tarefa is not None: tarefa.cancelar()
+
+    def tarefas(self, usuario=None):
+        with self._trava:
+            return [tarefa for tarefa in self._tarefas.values() if usuario is None or tarefa.usuario == usuario]
+
+    def encerrar(self, cancelar=True):
+        if cancelar:
+            for tarefa in self.tarefas(): tarefa.cancelar()
+        self._executor.shutdown(wait=False, cancel_futures=True)
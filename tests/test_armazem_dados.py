@@ -0,0 +1,94 @@
+import gc
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from armazem_dados import ArmazemDados
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from fontes_dados import abrir_colunar, caminho_colunar, podar_colunares, salvar_colunar
+from motor_backtest import construir_piramide
+
+def test_publicar_e_mapear(tmp_path):
+    armazem = ArmazemDados(str(tmp_path))
+    original = gerar_ohlcv(10, 15, semente=1)
+    dados = armazem.publicar('a', original)
+    pd.testing.assert_frame_equal(dados, original, check_freq=False)
+    assert armazem.obter('a') is dados and armazem.publicar('a', original) is dados
+    assert armazem.obter_ou_publicar('a', lambda: 1 / 0) is dados
+    assert armazem.anexo('a', 'linhas', len, dados) == len(original)
+    assert armazem.anexo('a', 'linhas', lambda: 1 / 0) == len(original)
+
+def test_solta_os_menos_usados_e_apaga_os_que_ninguem_usa(tmp_path):
+    armazem = ArmazemDados(str(tmp_path), max_datasets=2)
+    a = armazem.publicar('a', gerar_ohlcv(10, 15, semente=1))
+    armazem.anexo('a', 'proprio', lambda: a)
+    armazem.publicar('b', gerar_ohlcv(10, 15, semente=2))
+    armazem.publicar('c', gerar_ohlcv(10, 15, semente=3))
+    # 'a' saiu dos retidos, mas a sessão que o usa ainda o encontra; o anexo foi junto
+    assert 'a' in armazem and armazem.estatisticas()['Fixados'] == 2 and len(os.listdir(tmp_path)) == 3
+    del a
+    gc.collect()
+    assert 'a' not in armazem and armazem.obter('a') is None
+    assert armazem.estatisticas()['Datasets'] == 2 and len(os.listdir(tmp_path)) == 2
+
+def test_republicar_e_descartar(tmp_path):
+    armazem = ArmazemDados(str(tmp_path))
+    antigo = armazem.publicar('a', gerar_ohlcv(10, 15, semente=1))
+    novo = armazem.publicar('a', gerar_ohlcv(11, 15, semente=1))
+    assert armazem.obter('a') is novo and len(os.listdir(tmp_path)) == 2
+    del antigo
+    gc.collect()
+    armazem.estatisticas()
+    assert len(os.listdir(tmp_path)) == 1
+    armazem.descartar('a')
+    assert 'a' not in armazem and len(os.listdir(tmp_path)) == 1
+    del novo
+    gc.collect()
+    armazem.limpar_disco()
+    assert os.listdir(tmp_path) == []
+
+def test_limpar_disco_apaga_sobras(tmp_path):
+    armazem = ArmazemDados(str(tmp_path))
+    dados = armazem.publicar('a', gerar_ohlcv(10, 15))
+    os.makedirs(tmp_path / 'de_outra_execucao')
+    armazem.limpar_disco()
+    assert os.listdir(tmp_path) == [os.path.basename(armazem._entradas['a']['caminho'])]
+    assert len(dados) > 0
+
+def test_podar_colunares(tmp_path):
+    caminhos = [caminho_colunar(f"arquivo{posicao}", str(tmp_path)) for posicao in range(4)]
+    for posicao, caminho in enumerate(caminhos):
+        salvar_colunar(gerar_ohlcv(5, 15, semente=posicao), caminho)
+        os.utime(caminho, (time.time() - 3600 * (4 - posicao),) * 2)
+    tamanho = os.path.getsize(caminhos[0])
+    abrir_colunar(caminhos[0])
+    podar_colunares(str(tmp_path), max_bytes=int(2.5 * tamanho))
+    # Reabrir conta como uso: ficam o reaberto e o mais recente
+    assert [os.path.exists(caminho) for caminho in caminhos] == [True, False, False, True]
+    os.utime(caminhos[3], (time.time() - 40 * 86400,) * 2)
+    podar_colunares(str(tmp_path), max_dias=30)
+    assert [os.path.exists(caminho) for caminho in caminhos] == [True, False, False, False]
+    podar_colunares(str(tmp_path / 'sem_uploads'))
+
+def test_piramide_publicada_no_armazem(tmp_path):
+    armazem = ArmazemDados(str(tmp_path))
+    dados = armazem.publicar(('upload', 'x'), gerar_ohlcv(30, 5, semente=4))
+    publicar_nivel = lambda nome, nivel: armazem.publicar(('upload', 'x', 'nivel', nome), nivel)
+    piramide = armazem.anexo(('upload', 'x'), 'piramide', construir_piramide, dados, publicar_nivel)
+    em_memoria = construir_piramide(dados)
+    assert list(piramide.intraday) == list(em_memoria.intraday)
+    for nome, nivel in piramide.intraday.items():
+        pd.testing.assert_frame_equal(nivel, em_memoria.intraday[nome], check_freq=False)
+        np.testing.assert_array_equal(piramide.indices[nome].fechamento_anterior, em_memoria.indices[nome].fechamento_anterior)
+    pd.testing.assert_frame_equal(piramide.diario, em_memoria.diario, check_freq=False)
+    pd.testing.assert_frame_equal(piramide.day_trade, em_memoria.day_trade, check_freq=False)
+    # Os níveis derivados são os frames mapeados do armazém
+    assert piramide.diario is armazem.obter(('upload', 'x', 'nivel', 'diario'))
+    assert piramide.intraday['60 min'] is armazem.obter(('upload', 'x', 'nivel', '60 min'))
+    assert armazem.estatisticas()['Datasets'] == 6
+    del dados, piramide, em_memoria
+    gc.collect()
+    armazem.ajustar_limites(max_datasets=1)
+    assert armazem.estatisticas()['Datasets'] <= 1
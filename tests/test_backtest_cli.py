@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_cli import main
+from benchmarks.dados_sinteticos import como_arquivo, gerar_ohlcv
+from fontes_dados import COLUNAS_YAHOO
+from motor_backtest import calcular_metricas_de_resumo, criar_resumo_por_horario_fixo, preparar_dados_day_trade, varrer_variacoes_day_trade
+
+# Execuções completas da linha de comando sobre arquivos locais pequenos, sem rede.
+
+PERIODO = ['--inicio', '2019-01-01', '--fim', '2019-12-31']
+NOMES_YAHOO = {portugues: ingles for ingles, portugues in COLUNAS_YAHOO.items()}
+
+@pytest.fixture
+def diretorio_local(tmp_path):
+    # <ticker>_<intervalo>.csv com as colunas do Yahoo, como FonteArquivosLocais espera
+    gerar_ohlcv(60, semente=1).rename(columns=NOMES_YAHOO).to_csv(tmp_path / "TESTE_1d.csv", encoding='latin1')
+    gerar_ohlcv(10, 15, semente=2).rename(columns=NOMES_YAHOO).to_csv(tmp_path / "TESTE_15m.csv", encoding='latin1')
+    return tmp_path
+
+def test_daytrade_com_diretorio_local(diretorio_local):
+    saida = diretorio_local / "metricas.csv"
+    codigo = main(['daytrade', '--tickers', 'TESTE', '--tipo-ativo', 'Criptomoeda', '--diretorio-local', str(diretorio_local), *PERIODO,
+                   '--variacoes', '-1', '0.5', '50', '--saida', str(saida)])
+    assert codigo == 0
+    tabela = pd.read_csv(saida)
+    assert list(tabela.columns[:3]) == ['Fonte', 'Tipo de Operação', 'Variação Teste (%)']
+    assert list(zip(tabela['Tipo de Operação'], tabela['Variação Teste (%)'])) == [(tipo, variacao) for tipo in ('Compra', 'Venda') for variacao in (-1.0, 0.5, 50.0)]
+    assert (tabela['Fonte'] == 'TESTE').all()
+    esperado = varrer_variacoes_day_trade(preparar_dados_day_trade(gerar_ohlcv(60, semente=1)), [-1, 0.5, 50])
+    np.testing.assert_array_equal(tabela['Total de Trades'], esperado['Total de Trades'])
+    assert tabela.loc[tabela['Variação Teste (%)'] == 50, 'Total de Trades'].eq(0).all()
+
+def test_intraday_com_diretorio_local(diretorio_local, capsys):
+    codigo = main(['intraday', '--tickers', 'TESTE', '--tipo-ativo', 'Criptomoeda', '--diretorio-local', str(diretorio_local), *PERIODO,
+                   '--horas-iniciais', '10:00', '--horas-finais', '12:00', '17:45', '--tipos', 'Compra'])
+    assert codigo == 0
+    # Sem --saida a tabela vai para a saída padrão
+    saida = capsys.readouterr().out
+    assert 'Total de Trades' in saida and '17:45:00' in saida and 'Venda' not in saida
+
+def test_intraday_com_arquivo_latin1(tmp_path):
+    # Upload no formato da interface: ';', vírgula decimal e cabeçalho com acentos em latin1
+    dados = gerar_ohlcv(10, 15, semente=3)
+    arquivo = tmp_path / "upload.csv"
+    como_arquivo(dados).to_csv(arquivo, sep=';', decimal=',', encoding='latin1', index=False)
+    saida = tmp_path / "metricas.parquet"
+    codigo = main(['intraday', '--arquivos', str(arquivo), '--horas-iniciais', '10:00', '--horas-finais', '13:00', '--saida', str(saida)])
+    assert codigo == 0
+    tabela = pd.read_parquet(saida)
+    assert list(tabela['Tipo de Operação']) == ['Compra', 'Venda']
+    assert list(tabela['Hora Final']) == ['13:00:00'] * 2
+    esperado = calcular_metricas_de_resumo(criar_resumo_por_horario_fixo(dados, datetime.time(10), datetime.time(13)), 'Compra')
+    assert tabela.loc[0, 'Total de Trades'] == esperado['Total de Trades'] == 10
+    assert tabela.loc[0, 'Resultado Final Acumulado (%)'] == pytest.approx(esperado['Resultado Final Acumulado (%)'], rel=1e-5)
+
+def test_origem_sem_dados_sai_com_erro(diretorio_local, capsys):
+    codigo = main(['daytrade', '--tickers', 'INEXISTENTE', '--tipo-ativo', 'Criptomoeda', '--diretorio-local', str(diretorio_local), *PERIODO, '--variacoes', '1'])
+    assert codigo == 1
+    assert "Falha em 'INEXISTENTE'" in capsys.readouterr().err
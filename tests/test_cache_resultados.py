@@ -0,0 +1,95 @@
+import gc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from cache_resultados import CacheResultados, _impressoes_completas, impressao_completa, impressao_digital, tamanho_em_bytes
+
+def test_impressao_completa_ve_qualquer_valor():
+    dados = gerar_ohlcv(400, 5, semente=1)
+    assert len(dados) // 4096 > 1
+    alterado = dados.copy()
+    # A linha 1 fica fora da amostra espaçada usada por impressao_digital
+    alterado.iloc[1, 0] += 0.01
+    assert impressao_digital(alterado) == impressao_digital(dados)
+    assert impressao_completa(alterado) != impressao_completa(dados)
+    assert impressao_completa(dados.copy()) == impressao_completa(dados)
+    reindexado = dados.copy()
+    reindexado.index = reindexado.index + pd.Timedelta(minutes=1)
+    assert impressao_completa(reindexado) != impressao_completa(dados)
+
+def test_impressao_completa_com_categorias_e_texto():
+    dados = pd.DataFrame({'Preço': np.arange(6, dtype='float32'), 'Ticker': ['A', 'B'] * 3})
+    categorico = dados.assign(Ticker=dados['Ticker'].astype('category'))
+    assert impressao_completa(dados) != impressao_completa(categorico)
+    assert impressao_completa(dados.assign(Ticker=['A', 'B'] * 2 + ['B', 'A'])) != impressao_completa(dados)
+    assert impressao_completa(categorico.assign(Ticker=pd.Categorical(['A', 'B'] * 3, categories=['B', 'A']))) != impressao_completa(categorico)
+
+def test_impressao_completa_esquece_frames_coletados():
+    dados = gerar_ohlcv(5, 15, semente=2)
+    impressao_completa(dados)
+    assert id(dados) in _impressoes_completas
+    identificador = id(dados)
+    del dados
+    gc.collect()
+    assert identificador not in _impressoes_completas
+
+
+def test_despejo_lru_por_numero_de_itens():
+    cache = CacheResultados(max_itens=3)
+    for chave in 'abc': cache.guardar(chave, chave.upper())
+    # Consultar 'a' o torna o mais recente: o próximo despejo leva 'b'
+    assert cache.obter('a') == 'A'
+    cache.guardar('d', 'D')
+    assert 'b' not in cache and all(chave in cache for chave in 'acd')
+    cache.ajustar_limites(max_itens=1)
+    assert 'd' in cache and 'a' not in cache and 'c' not in cache
+    assert cache.estatisticas()["Itens"] == 1
+
+def test_despejo_lru_por_tamanho():
+    quadros = {chave: pd.DataFrame({'x': np.full(1000, posicao, dtype=float)}) for posicao, chave in enumerate('abcd')}
+    tamanho = tamanho_em_bytes(quadros['a'])
+    cache = CacheResultados(max_itens=100, max_bytes=int(tamanho * 2.5))
+    cache.guardar('a', quadros['a'])
+    cache.guardar('b', quadros['b'])
+    cache.obter('a')
+    cache.guardar('c', quadros['c'])
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.estatisticas()["Memória (MB)"] == 2 * tamanho / 1024 ** 2
+    # Um valor maior que o limite inteiro nunca entra (nem despeja os demais)
+    cache.guardar('grande', pd.concat([quadros['d']] * 3))
+    assert 'grande' not in cache and 'a' in cache and 'c' in cache
+    cache.descartar('a')
+    assert cache.estatisticas()["Memória (MB)"] == tamanho / 1024 ** 2
+
+def test_estatisticas_de_acertos_e_falhas():
+    cache = CacheResultados()
+    chamadas = []
+    def calcular(valor):
+        chamadas.append(valor)
+        return valor * 2
+    assert cache.obter_ou_calcular(('dados', 1), calcular, 1) == 2
+    assert cache.obter_ou_calcular(('dados', 1), calcular, 1) == 2
+    assert cache.obter_ou_calcular(('dados', 2), calcular, 2) == 4
+    assert cache.obter_ou_calcular(('dados', 1), calcular, 1) == 2
+    assert chamadas == [1, 2]
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["Acertos"], estatisticas["Falhas"], estatisticas["Itens"]) == (2, 2, 2)
+    assert estatisticas["Taxa de Acerto (%)"] == 50.0
+    cache.limpar()
+    assert cache.estatisticas() == {"Acertos": 0, "Falhas": 0, "Taxa de Acerto (%)": 0.0, "Itens": 0, "Memória (MB)": 0.0}
+
+def test_impressao_digital_ve_valores_amostrados():
+    dados = gerar_ohlcv(400, 5, semente=1)
+    passo = len(dados) // 4096
+    original = impressao_digital(dados)
+    assert impressao_digital(dados.copy()) == original
+    # Uma linha da amostra espaçada, a primeira e a última linha: mudar um único valor muda a impressão
+    for linha, coluna in [(passo * 10, 2), (0, 0), (len(dados) - 1, 3)]:
+        alterado = dados.copy()
+        alterado.iloc[linha, coluna] += 0.01
+        assert impressao_digital(alterado) != original, (linha, coluna)
+    assert impressao_digital(dados.iloc[:-1]) != original
+    assert impressao_digital(dados.rename(columns={'Volume': 'Vol'})) != original
+    assert impressao_digital(None) is None
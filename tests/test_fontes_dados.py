@@ -0,0 +1,198 @@
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import como_arquivo, gerar_ohlcv, gravar_universo
+
+from fontes_dados import COLUNAS_PRECO, DIAS_POR_REQUISICAO, CacheOHLCV, FonteArquivosLocais, baixar_universo, _lacunas, _unir_intervalos, baixar_em_janelas, ler_intraday_em_blocos, planejar_janelas
+
+D = datetime.date
+
+class FonteFalsa:
+    # Fonte com a assinatura de baixar_yahoo que registra as chamadas e devolve um candle diário por dia útil.
+    # O valor de 'Fechamento' é o número da chamada, para saber qual download prevaleceu em datas repetidas.
+    def __init__(self):
+        self.chamadas = []
+
+    def __call__(self, ticker, data_inicio, data_fim, intervalo='1d'):
+        self.chamadas.append((ticker, data_inicio, data_fim, intervalo))
+        datas = pd.bdate_range(data_inicio, pd.Timestamp(data_fim) - pd.Timedelta(days=1))
+        valores = np.full(len(datas), float(len(self.chamadas)))
+        return pd.DataFrame({'Open': valores, 'High': valores, 'Low': valores, 'Close': valores, 'Volume': valores}, index=datas)
+
+def test_unir_intervalos():
+    assert _unir_intervalos([]) == []
+    assert _unir_intervalos([(D(2024, 3, 1), D(2024, 4, 1)), (D(2024, 1, 1), D(2024, 2, 1))]) == [(D(2024, 1, 1), D(2024, 2, 1)), (D(2024, 3, 1), D(2024, 4, 1))]
+    # Intervalos encostados ou sobrepostos viram um só
+    assert _unir_intervalos([(D(2024, 1, 1), D(2024, 2, 1)), (D(2024, 2, 1), D(2024, 3, 1)), (D(2024, 1, 15), D(2024, 1, 20))]) == [(D(2024, 1, 1), D(2024, 3, 1))]
+
+@pytest.mark.parametrize('inicio,fim,cobertura,esperado', [
+    (D(2024, 1, 1), D(2024, 2, 1), [], [(D(2024, 1, 1), D(2024, 2, 1))]),
+    (D(2024, 1, 1), D(2024, 2, 1), [(D(2023, 1, 1), D(2024, 6, 1))], []),
+    (D(2024, 1, 1), D(2024, 2, 1), [(D(2024, 1, 10), D(2024, 1, 20))], [(D(2024, 1, 1), D(2024, 1, 10)), (D(2024, 1, 20), D(2024, 2, 1))]),
+    (D(2024, 1, 1), D(2024, 2, 1), [(D(2023, 12, 1), D(2024, 1, 5)), (D(2024, 1, 25), D(2024, 3, 1))], [(D(2024, 1, 5), D(2024, 1, 25))]),
+    (D(2024, 1, 1), D(2024, 2, 1), [(D(2023, 1, 1), D(2023, 6, 1)), (D(2024, 5, 1), D(2024, 6, 1))], [(D(2024, 1, 1), D(2024, 2, 1))]),
+])
+def test_lacunas(inicio, fim, cobertura, esperado):
+    assert _lacunas(inicio, fim, cobertura) == esperado
+
+def test_cache_busca_so_as_lacunas(tmp_path):
+    fonte = FonteFalsa()
+    cache = CacheOHLCV(str(tmp_path), fonte)
+    primeiro = cache.obter('PETR4', D(2024, 1, 1), D(2024, 2, 1))
+    assert fonte.chamadas == [('PETR4', D(2024, 1, 1), D(2024, 2, 1), '1d')]
+    assert cache.cobertura('PETR4') == [(D(2024, 1, 1), D(2024, 2, 1))]
+    # Mesmo período: nada vai à fonte
+    pd.testing.assert_frame_equal(cache.obter('PETR4', D(2024, 1, 1), D(2024, 2, 1)), primeiro, check_freq=False)
+    assert len(fonte.chamadas) == 1
+    # Período maior: só as duas pontas que faltam
+    dados = cache.obter('PETR4', D(2023, 12, 15), D(2024, 2, 15))
+    assert fonte.chamadas[1:] == [('PETR4', D(2023, 12, 15), D(2024, 1, 1), '1d'), ('PETR4', D(2024, 2, 1), D(2024, 2, 15), '1d')]
+    assert cache.cobertura('PETR4') == [(D(2023, 12, 15), D(2024, 2, 15))]
+    assert dados.index.is_monotonic_increasing and dados.index.is_unique
+    pd.testing.assert_index_equal(dados.index, pd.bdate_range('2023-12-15', '2024-02-14'), check_names=False, exact=False)
+    # Outro intervalo tem cobertura própria
+    cache.obter('PETR4', D(2024, 1, 1), D(2024, 2, 1), '1h')
+    assert fonte.chamadas[-1] == ('PETR4', D(2024, 1, 1), D(2024, 2, 1), '1h')
+
+def test_cache_nao_marca_hoje_como_coberto(tmp_path):
+    fonte = FonteFalsa()
+    cache = CacheOHLCV(str(tmp_path), fonte)
+    hoje = datetime.date.today()
+    cache.obter('VALE3', hoje - datetime.timedelta(days=10), hoje + datetime.timedelta(days=1))
+    assert cache.cobertura('VALE3') == [(hoje - datetime.timedelta(days=10), hoje)]
+    # O dia de hoje volta à fonte no pedido seguinte
+    cache.obter('VALE3', hoje - datetime.timedelta(days=10), hoje + datetime.timedelta(days=1))
+    assert fonte.chamadas[-1][1:3] == (hoje, hoje + datetime.timedelta(days=1))
+
+def test_cache_remove_duplicados_mantendo_o_download_mais_recente(tmp_path):
+    fonte = FonteFalsa()
+    cache = CacheOHLCV(str(tmp_path), fonte)
+    hoje = datetime.date.today()
+    inicio = hoje - datetime.timedelta(days=7)
+    cache.obter('ITUB4', inicio, hoje + datetime.timedelta(days=1))
+    dados = cache.obter('ITUB4', inicio, hoje + datetime.timedelta(days=1))
+    assert dados.index.is_unique
+    # Se hoje for dia útil, o candle de hoje foi baixado duas vezes e fica o da segunda chamada
+    if pd.Timestamp(hoje) in dados.index: assert dados.loc[pd.Timestamp(hoje), 'Close'] == 2.0
+    assert (dados.loc[dados.index < pd.Timestamp(hoje), 'Close'] == 1.0).all()
+    # O Parquet em disco também fica sem duplicados
+    relido = CacheOHLCV(str(tmp_path), FonteFalsa()).obter('ITUB4', inicio, hoje)
+    assert relido.index.is_unique
+
+def test_cache_sem_dados_na_fonte(tmp_path):
+    cache = CacheOHLCV(str(tmp_path), lambda ticker, inicio, fim, intervalo='1d': pd.DataFrame())
+    assert cache.obter('XXXX3', D(2024, 1, 1), D(2024, 2, 1)).empty
+    # Nada baixado, nada marcado como coberto
+    assert cache.cobertura('XXXX3') == []
+
+class FonteIntradayFalsa:
+    # Candles de 15 min em horário UTC (como o Yahoo devolve), incluindo o dia final da janela, para que
+    # janelas vizinhas se sobreponham na borda. As `falhas` primeiras chamadas de cada janela levantam erro.
+    def __init__(self, falhas=0):
+        self.falhas = falhas
+        self.tentativas = {}
+
+    def __call__(self, ticker, data_inicio, data_fim, intervalo='15m'):
+        self.tentativas[data_inicio] = self.tentativas.get(data_inicio, 0) + 1
+        if self.tentativas[data_inicio] <= self.falhas: raise ConnectionError("instável")
+        dias = pd.bdate_range(data_inicio, data_fim)
+        instantes = (dias.values[:, None] + pd.timedelta_range('13:00:00', '19:45:00', freq='15min').values[None, :]).ravel()
+        indice = pd.DatetimeIndex(instantes).tz_localize('UTC')
+        return pd.DataFrame({'Close': np.arange(len(indice), dtype=float)}, index=indice)
+
+def test_planejar_janelas():
+    assert planejar_janelas(D(2024, 1, 1), D(2024, 1, 1), 59) == []
+    assert planejar_janelas(D(2024, 1, 1), D(2024, 3, 1), None) == [(D(2024, 1, 1), D(2024, 3, 1))]
+    janelas = planejar_janelas(D(2024, 1, 1), D(2024, 1, 20), 7)
+    assert janelas == [(D(2024, 1, 1), D(2024, 1, 8)), (D(2024, 1, 8), D(2024, 1, 15)), (D(2024, 1, 15), D(2024, 1, 20))]
+
+def test_baixar_em_janelas_costura_as_janelas():
+    progresso = []
+    dados = baixar_em_janelas(FonteIntradayFalsa(), 'PETR4.SA', D(2024, 1, 1), D(2024, 4, 1), '15m', max_workers=3, progresso=lambda feitos, total: progresso.append((feitos, total)))
+    janelas = planejar_janelas(D(2024, 1, 1), D(2024, 4, 1), DIAS_POR_REQUISICAO['15m'])
+    assert len(janelas) > 1 and progresso[-1] == (len(janelas), len(janelas))
+    # Sem fuso, ordenado, sem candles repetidos nas bordas e sem buracos entre as janelas
+    assert dados.index.tz is None and dados.index.is_monotonic_increasing and dados.index.is_unique
+    esperado = FonteIntradayFalsa()('PETR4.SA', D(2024, 1, 1), D(2024, 4, 1)).index.tz_convert('America/Sao_Paulo').tz_localize(None)
+    pd.testing.assert_index_equal(dados.index, esperado)
+
+def test_baixar_em_janelas_retenta_e_desiste():
+    fonte = FonteIntradayFalsa(falhas=1)
+    dados = baixar_em_janelas(fonte, 'PETR4.SA', D(2024, 1, 1), D(2024, 4, 1), '15m', tentativas=2, espera_inicial=0)
+    assert not dados.empty and set(fonte.tentativas.values()) == {2}
+    with pytest.raises(ConnectionError):
+        baixar_em_janelas(FonteIntradayFalsa(falhas=5), 'PETR4.SA', D(2024, 1, 1), D(2024, 4, 1), '15m', tentativas=2, espera_inicial=0)
+
+def test_baixar_universo_com_arquivos_locais(tmp_path):
+    tickers = ['AAAA3', 'BBBB4', 'CCCC3']
+    gravar_universo(str(tmp_path / 'arquivos'), tickers, dias_uteis=60)
+    cache = CacheOHLCV(str(tmp_path / 'cache'), FonteArquivosLocais(str(tmp_path / 'arquivos')))
+    progresso = []
+    dados, falhas = baixar_universo(cache.obter, ['SEM_ARQUIVO'] + tickers, D(2019, 1, 1), D(2019, 6, 1), max_workers=2, progresso=lambda feitos, total: progresso.append((feitos, total)))
+    # Ticker sem dados vira falha sem derrubar os outros; a ordem dos tickers pedidos é mantida
+    assert list(dados) == tickers and list(falhas) == ['SEM_ARQUIVO']
+    assert progresso[-1] == (4, 4)
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(dados[ticker], FonteArquivosLocais(str(tmp_path / 'arquivos'))(ticker, D(2019, 1, 1), D(2019, 6, 1)), check_freq=False)
+    def quebrada(ticker, inicio, fim, intervalo='1d'):
+        if ticker == 'BBBB4': raise ConnectionError("fora do ar")
+        return cache.obter(ticker, inicio, fim, intervalo)
+    dados, falhas = baixar_universo(quebrada, tickers, D(2019, 1, 1), D(2019, 6, 1))
+    assert list(dados) == ['AAAA3', 'CCCC3'] and falhas == {'BBBB4': "fora do ar"}
+    assert baixar_universo(cache.obter, [], D(2019, 1, 1), D(2019, 6, 1)) == ({}, {})
+
+# --- Leitura de Uploads em Blocos ---
+
+def leitura_original(caminho):
+    # carregar_dados + processar_dados (modo intraday) da versão anterior do Test.py
+    if caminho.endswith('.csv'): dados = pd.read_csv(caminho, sep=';', encoding='latin1', header=0, decimal=',')
+    else: dados = pd.read_excel(caminho, engine='openpyxl')
+    dados['Data'] = pd.to_datetime(dados['Data'], dayfirst=True, errors='coerce')
+    dados.dropna(subset=['Data'], inplace=True)
+    dados['Timestamp'] = pd.to_datetime(dados['Data'].dt.strftime('%Y-%m-%d') + ' ' + dados['Hora'].astype(str))
+    return dados.set_index('Timestamp').sort_index().drop(columns=['Data', 'Hora'])
+
+def upload_intraday(diretorio, extensao, linhas_por_bloco):
+    # Upload no formato do usuário, com um ticker que só aparece depois do primeiro bloco e acentos (latin1)
+    bruto = como_arquivo(gerar_ohlcv(6, 30, semente=3))
+    bruto[['Abertura', 'Máxima', 'Mínima', 'Fechamento']] = bruto[['Abertura', 'Máxima', 'Mínima', 'Fechamento']].round(2)
+    bruto['Ativo'] = 'PETR4'
+    bruto.loc[linhas_por_bloco + 3:, 'Ativo'] = 'AÇÚCAR'
+    caminho = str(diretorio / f"upload.{extensao}")
+    if extensao == 'csv': bruto.to_csv(caminho, sep=';', decimal=',', encoding='latin1', index=False)
+    else: bruto.to_excel(caminho, index=False, engine='openpyxl')
+    return caminho
+
+@pytest.mark.parametrize('extensao', ['csv', 'xlsx'])
+def test_leitura_em_blocos_igual_a_leitura_original(tmp_path, extensao):
+    linhas_por_bloco = 20
+    caminho = upload_intraday(tmp_path, extensao, linhas_por_bloco)
+    with open(caminho, 'rb') as arquivo:
+        dados = ler_intraday_em_blocos(arquivo, caminho, linhas_por_bloco=linhas_por_bloco)
+    esperado = leitura_original(caminho)
+    assert len(dados) > 3 * linhas_por_bloco
+    for coluna in COLUNAS_PRECO: assert dados[coluna].dtype == np.float32
+    assert isinstance(dados['Ativo'].dtype, pd.CategoricalDtype)
+    assert sorted(dados['Ativo'].cat.categories) == ['AÇÚCAR', 'PETR4']
+    esperado = esperado.astype({coluna: 'float32' for coluna in COLUNAS_PRECO})
+    esperado.index = esperado.index.as_unit(dados.index.unit)
+    pd.testing.assert_frame_equal(esperado, dados.astype({'Ativo': esperado['Ativo'].dtype, 'Volume': esperado['Volume'].dtype}), check_column_type=False)
+    # O mesmo arquivo num único bloco dá o mesmo resultado
+    with open(caminho, 'rb') as arquivo:
+        pd.testing.assert_frame_equal(ler_intraday_em_blocos(arquivo, caminho), dados)
+
+def test_leitura_em_blocos_rejeita_arquivo_malformado(tmp_path):
+    sem_hora = tmp_path / "sem_hora.csv"
+    como_arquivo(gerar_ohlcv(30)).to_csv(sem_hora, sep=';', decimal=',', encoding='latin1', index=False)
+    with open(sem_hora, 'rb') as arquivo, pytest.raises(ValueError, match="Hora"):
+        ler_intraday_em_blocos(arquivo, str(sem_hora))
+    hora_invalida = tmp_path / "hora_invalida.csv"
+    hora_invalida.write_bytes("Data;Hora;Abertura;Máxima;Mínima;Fechamento;Volume\n02/01/2019;abertura;1,0;1,0;1,0;1,0;10\n".encode('latin1'))
+    with open(hora_invalida, 'rb') as arquivo, pytest.raises(ValueError):
+        ler_intraday_em_blocos(arquivo, str(hora_invalida))
+    with pytest.raises(ValueError, match="não suportado"):
+        ler_intraday_em_blocos(io.BytesIO(b''), 'dados.txt')
@@ -0,0 +1,73 @@
+import json
+import logging
+import time
+
+import pytest
+
+from cache_resultados import CacheResultados
+from instrumentacao import Instrumentacao, contado, registro_log
+
+class RegistrosJson(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, registro):
+        self.registros.append(json.loads(registro.getMessage()))
+
+@pytest.fixture
+def log_etapas():
+    manipulador = RegistrosJson()
+    nivel_anterior = registro_log.level
+    registro_log.addHandler(manipulador)
+    registro_log.setLevel(logging.INFO)
+    yield manipulador.registros
+    registro_log.removeHandler(manipulador)
+    registro_log.setLevel(nivel_anterior)
+
+def test_etapas_aninhadas(log_etapas):
+    instrumentacao = Instrumentacao(sessao='teste')
+    instrumentacao.nova_execucao()
+    with instrumentacao.etapa("externa", 10):
+        time.sleep(0.01)
+        with instrumentacao.etapa("interna") as interna:
+            time.sleep(0.02)
+            interna.linhas = 5
+        with instrumentacao.etapa("interna 2"):
+            with instrumentacao.etapa("mais interna"): pass
+    with instrumentacao.etapa("seguinte"): pass
+    # Cada etapa é registrada ao terminar: as de dentro antes da de fora
+    assert [(etapa.nome, etapa.nivel) for etapa in instrumentacao.etapas] == [("interna", 1), ("mais interna", 2), ("interna 2", 1), ("externa", 0), ("seguinte", 0)]
+    etapas = {etapa.nome: etapa for etapa in instrumentacao.etapas}
+    assert etapas["interna"].duracao_s >= 0.02 and etapas["interna"].linhas == 5
+    assert etapas["externa"].duracao_s >= etapas["interna"].duracao_s + etapas["interna 2"].duracao_s + 0.01
+    # O total só soma o nível 0 (as internas já estão dentro da externa)
+    assert instrumentacao.duracao_total() == etapas["externa"].duracao_s + etapas["seguinte"].duracao_s
+    assert list(instrumentacao.tabela()["Etapa"]) == ["  interna", "    mais interna", "  interna 2", "externa", "seguinte"]
+    assert [(registro['etapa'], registro['nivel'], registro['sessao'], registro['execucao']) for registro in log_etapas] == [
+        ("interna", 1, 'teste', 1), ("mais interna", 2, 'teste', 1), ("interna 2", 1, 'teste', 1), ("externa", 0, 'teste', 1), ("seguinte", 0, 'teste', 1)]
+    assert log_etapas[0]['linhas'] == 5 and log_etapas[3]['duracao_s'] >= 0.03
+
+def test_nivel_volta_ao_normal_depois_de_erro(log_etapas):
+    instrumentacao = Instrumentacao()
+    with pytest.raises(KeyError):
+        with instrumentacao.etapa("externa"):
+            with instrumentacao.etapa("interna"): raise KeyError('x')
+    with instrumentacao.etapa("depois"): pass
+    assert [(etapa.nome, etapa.nivel, etapa.erro) for etapa in instrumentacao.etapas] == [("interna", 1, 'KeyError'), ("externa", 0, 'KeyError'), ("depois", 0, None)]
+    assert log_etapas[0]['erro'] == 'KeyError'
+
+def test_acerto_de_cache_no_registro_json(log_etapas):
+    instrumentacao = Instrumentacao()
+    cache = CacheResultados()
+    calcular = contado(lambda valor: valor * 2)
+    for _ in range(2):
+        with instrumentacao.etapa("Backtest (cache de resultados)", cache=True):
+            cache.obter_ou_calcular('chave', calcular, 21)
+    with instrumentacao.etapa("Sem cache"):
+        cache.obter_ou_calcular('outra', calcular, 1)
+    assert [registro['cache'] for registro in log_etapas] == ['falha', 'acerto', None]
+    assert instrumentacao.resumo_cache() == {"Acertos": 1, "Falhas": 1}
+    # A variação de memória é do processo inteiro e vem rotulada assim
+    assert all('delta_rss_processo_mb' in registro for registro in log_etapas)
+    assert "Δ RSS do Processo (MB)" in instrumentacao.tabela().columns
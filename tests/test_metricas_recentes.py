@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_backtest import calcular_metricas_recentes, calcular_metricas_recentes_por_dia_semana, calcular_series_rolantes, criar_tabela_dia_semana
+
+# As métricas recentes por somas prefixadas têm de bater com as implementações originais por tail(p)
+# abaixo (copiadas da versão anterior do Test.py).
+
+def recentes_por_tail(resumo_periodo):
+    if resumo_periodo is None or len(resumo_periodo) < 5: return None
+    resultados = []
+    periodos = [5, 10, 15, 20, 25]
+    for p in periodos:
+        if len(resumo_periodo) >= p:
+            ultimos_trades = resumo_periodo.tail(p)
+            resultado_op_decimal = ultimos_trades['Resultado %']
+            ganho_medio = resultado_op_decimal.mean() * 100
+            acertos = (resultado_op_decimal > 0).sum()
+            taxa_acerto = (acertos / p) * 100
+            resultados.append({"Período (Últimos Trades)": f"{p}", "Ganho Médio (%)": ganho_medio, "% Acertos": taxa_acerto})
+    if not resultados: return None
+    return pd.DataFrame(resultados).set_index("Período (Últimos Trades)")
+
+def recentes_por_dia_por_tail(resumo_periodo):
+    if resumo_periodo is None or resumo_periodo.empty: return None
+    df = resumo_periodo.copy()
+    mapa_dias = {0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira', 4: 'Sexta-feira'}
+    df['Dia da Semana'] = df.index.dayofweek.map(mapa_dias)
+    df.dropna(subset=['Dia da Semana'], inplace=True)
+    resultados_lista = []
+    periodos = [5, 10, 15, 20, 25]
+    dias_semana_ordenados = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira']
+    for dia in dias_semana_ordenados:
+        trades_do_dia = df[df['Dia da Semana'] == dia]
+        for p in periodos:
+            if len(trades_do_dia) >= p:
+                ultimos_trades = trades_do_dia.tail(p)
+                resultado_op_decimal = ultimos_trades['Resultado %']
+                ganho_medio = resultado_op_decimal.mean() * 100
+                acertos = (resultado_op_decimal > 0).sum()
+                taxa_acerto = (acertos / p) * 100
+                resultados_lista.append({"Dia da Semana": dia, "Período (Trades)": p, "Ganho Médio (%)": ganho_medio, "% Acertos": taxa_acerto})
+    if not resultados_lista: return None
+    df_resultados = pd.DataFrame(resultados_lista)
+    try:
+        pivot = df_resultados.pivot_table(index="Período (Trades)", columns="Dia da Semana", values=["Ganho Médio (%)", "% Acertos"])
+        dias_presentes = df_resultados['Dia da Semana'].unique()
+        dias_ordenados_presentes = [dia for dia in dias_semana_ordenados if dia in dias_presentes]
+        pivot = pivot.swaplevel(0, 1, axis=1)[dias_ordenados_presentes]
+        pivot.index = pd.to_numeric(pivot.index)
+        pivot = pivot.sort_index()
+        pivot.index = pivot.index.astype(str)
+        return pivot
+    except Exception:
+        return None
+
+def tabela_dia_semana_original(resumo_periodo, tipo_operacao):
+    if resumo_periodo is None or resumo_periodo.empty: return None
+    df = resumo_periodo.copy()
+    mapa_dias = {0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'}
+    df['Dia da Semana Num'] = df.index.dayofweek
+    df['Resultado Op'] = df['Resultado %'] * 100
+    df['Acerto'] = df['Resultado Op'] > 0
+    tabela = df.groupby('Dia da Semana Num').agg(Total=('Resultado Op', 'count'), Acertos=('Acerto', 'sum'), Lucro_Medio_Pct=('Resultado Op', 'mean'))
+    tabela.index = tabela.index.map(mapa_dias); tabela.index.name = "Dia da Semana"
+    tabela['Erros'] = tabela['Total'] - tabela['Acertos']
+    tabela['% Acertos'] = (tabela['Acertos'] / tabela['Total']) * 100
+    tabela['% Erros'] = (tabela['Erros'] / tabela['Total']) * 100
+    if not tabela.empty:
+        somas = tabela[['Acertos', 'Erros', 'Total']].sum()
+        medias = tabela[['% Acertos', '% Erros', 'Lucro_Medio_Pct']].mean()
+        total_row = pd.concat([somas, medias]); total_row.name = 'Total / Média'
+        tabela = pd.concat([tabela, pd.DataFrame(total_row).T])
+    ordem_dias = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
+    tabela_ordenada = tabela.reindex(index=ordem_dias).dropna(how='all')
+    if 'Total / Média' in tabela.index: tabela_ordenada = pd.concat([tabela_ordenada, tabela.loc[['Total / Média']]])
+    tabela_ordenada.rename(columns={'Acertos': 'Nº de Acertos', 'Erros': 'Nº de Erros', 'Total': 'Total de Eventos', 'Lucro_Medio_Pct': '% Lucro Médio'}, inplace=True)
+    return tabela_ordenada[['Nº de Acertos', 'Nº de Erros', 'Total de Eventos', '% Acertos', '% Erros', '% Lucro Médio']]
+
+def resumo_sintetico(trades, semente, com_fim_de_semana=True, com_nan=False):
+    # Trades em dias corridos (sábados e domingos incluídos, como em dados de cripto) ou só em dias úteis
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range('2021-01-01', periods=trades, freq='D') if com_fim_de_semana else pd.bdate_range('2021-01-01', periods=trades)
+    resultados = rng.normal(0.0005, 0.01, size=trades)
+    resultados[rng.random(trades) < 0.1] = 0.0
+    if com_nan: resultados[::7] = np.nan
+    return pd.DataFrame({'Resultado %': resultados}, index=pd.DatetimeIndex(datas, name='Data'))
+
+CASOS = [(3, True), (4, False), (7, True), (12, False), (24, True), (60, True), (200, False), (333, True)]
+
+@pytest.mark.parametrize('trades,com_fim_de_semana', CASOS)
+@pytest.mark.parametrize('com_nan', [False, True])
+def test_metricas_recentes_iguais_ao_tail(trades, com_fim_de_semana, com_nan):
+    resumo = resumo_sintetico(trades, trades, com_fim_de_semana, com_nan)
+    esperado, obtido = recentes_por_tail(resumo), calcular_metricas_recentes(resumo)
+    if esperado is None: assert obtido is None
+    else: pd.testing.assert_frame_equal(esperado, obtido, check_exact=False, rtol=1e-12)
+
+@pytest.mark.parametrize('trades,com_fim_de_semana', CASOS)
+@pytest.mark.parametrize('com_nan', [False, True])
+def test_metricas_recentes_por_dia_iguais_ao_tail(trades, com_fim_de_semana, com_nan):
+    resumo = resumo_sintetico(trades, trades, com_fim_de_semana, com_nan)
+    esperado, obtido = recentes_por_dia_por_tail(resumo), calcular_metricas_recentes_por_dia_semana(resumo)
+    if esperado is None:
+        assert obtido is None
+        return
+    # Os fins de semana nunca entram nas colunas; o pivot_table nomeia o segundo nível, o motor não
+    assert set(obtido.columns.get_level_values(0)) <= {'Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira'}
+    # O pivot_table descartava a coluna de um dia sem nenhum resultado válido (todo NaN); o motor a mantém em NaN
+    descartadas = obtido.columns.difference(esperado.columns)
+    assert obtido[descartadas].isna().all().all()
+    pd.testing.assert_frame_equal(esperado.reindex(columns=obtido.columns), obtido, check_exact=False, rtol=1e-12, check_names=False)
+
+@pytest.mark.parametrize('janela', [1, 5, 20])
+@pytest.mark.parametrize('com_nan', [False, True])
+def test_series_rolantes_iguais_ao_rolling(janela, com_nan):
+    resumo = resumo_sintetico(90, janela, com_nan=com_nan)
+    series = calcular_series_rolantes(resumo, janela)
+    resultados = resumo['Resultado %']
+    ganho_medio = resultados.rolling(janela, min_periods=1).mean() * 100
+    ganho_medio.iloc[:janela - 1] = np.nan
+    taxa_acerto = (resultados > 0).astype(float).rolling(janela).sum() / janela * 100
+    np.testing.assert_allclose(series["Ganho Médio (%)"], ganho_medio, rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(series["% Acertos"], taxa_acerto, rtol=1e-9, equal_nan=True)
+    assert series.index.equals(resumo.index)
+    assert calcular_series_rolantes(resumo.iloc[:janela - 1], janela) is None
+
+@pytest.mark.parametrize('trades,com_fim_de_semana', CASOS)
+def test_tabela_dia_semana(trades, com_fim_de_semana):
+    resumo = resumo_sintetico(trades, trades, com_fim_de_semana, com_nan=True)
+    tabela = criar_tabela_dia_semana(resumo, 'Compra')
+    assert list(tabela.columns) == ['Nº de Acertos', 'Nº de Erros', 'Total de Eventos', '% Acertos', '% Erros', '% Lucro Médio']
+    dias = [dia for dia in ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"] if dia in tabela.index]
+    assert list(tabela.index) == dias + ['Total / Média']
+    pd.testing.assert_frame_equal(tabela_dia_semana_original(resumo, 'Compra'), tabela, check_dtype=False, check_exact=False, rtol=1e-12)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from motor_backtest import calcular_metricas_de_resumo, preparar_dados_day_trade, simular_day_trade_com_percentagens, varrer_variacoes_day_trade
+
+# Cada linha da varredura tem de trazer as mesmas métricas que simular uma variação por vez e resumir o resultado.
+
+VARIACOES = [-3.0, -1.0, -0.25, 0.25, 1.0, 3.0, 50.0]
+
+def dados_diarios(semente):
+    dados = preparar_dados_day_trade(gerar_ohlcv(300, semente=semente))
+    # Um dia sem candle no meio do histórico (NaN nunca aciona o gatilho)
+    dados.iloc[100] = np.nan
+    return dados
+
+@pytest.mark.parametrize('semente', range(3))
+def test_varredura_igual_a_simulacao_por_variacao(semente):
+    dados = dados_diarios(semente)
+    grade = varrer_variacoes_day_trade(dados, VARIACOES)
+    assert list(grade.index) == [(tipo, variacao) for tipo in ('Compra', 'Venda') for variacao in VARIACOES]
+    for tipo in ('Compra', 'Venda'):
+        for variacao in VARIACOES:
+            linha = grade.loc[(tipo, variacao)]
+            metricas = calcular_metricas_de_resumo(simular_day_trade_com_percentagens(dados, variacao, tipo), tipo)
+            if metricas is None:
+                # Sem nenhum dia acionado: a linha existe, com zero trades e as demais métricas vazias
+                assert linha["Total de Trades"] == 0 and linha["Nº de Acertos"] == 0
+                continue
+            assert list(linha.index) == list(metricas)
+            np.testing.assert_allclose(linha.to_numpy(dtype=float), np.array(list(metricas.values()), dtype=float), rtol=1e-12, err_msg=f"{tipo} {variacao}")
+
+def test_variacao_sem_trades_na_grade():
+    dados = dados_diarios(0)
+    assert simular_day_trade_com_percentagens(dados, 50.0, 'Compra') is None
+    linha = varrer_variacoes_day_trade(dados, [50.0], tipos_operacao=('Compra',)).loc[('Compra', 50.0)]
+    assert linha["Total de Trades"] == 0
+    assert np.isnan(linha["Resultado Final Acumulado (%)"]) and np.isnan(linha["Ganho Médio (% por Trade)"])
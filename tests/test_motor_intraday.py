@@ -0,0 +1,135 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from motor_backtest import (aplicar_gatilho_e_criar_resumo, calcular_metricas_de_resumo, construir_indice_diario, construir_piramide,
+                            criar_resumo_por_horario_fixo, otimizar_janelas_intraday)
+
+# O motor vetorizado tem de produzir o mesmo resumo, coluna a coluna, que as implementações originais em laço
+# abaixo (copiadas da versão anterior do Test.py).
+
+def gatilho_em_laco(df, variacao_teste, hora_final):
+    df_original = df.copy()
+    fechamentos_diarios = df_original.resample('D')['Fechamento'].last()
+    fechamento_anterior = fechamentos_diarios.shift(1).dropna()
+    dias_com_gatilho = []
+    for dia, fech_anterior in fechamento_anterior.items():
+        preco_gatilho = fech_anterior * (1 + variacao_teste / 100)
+        dados_do_dia = df_original[df_original.index.date == dia.date()]
+        candle_gatilho = None
+        if variacao_teste > 0:
+            primeiro_candle_acima = dados_do_dia[dados_do_dia['Máxima'] >= preco_gatilho]
+            if not primeiro_candle_acima.empty: candle_gatilho = primeiro_candle_acima.iloc[0]
+        else:
+            primeiro_candle_abaixo = dados_do_dia[dados_do_dia['Mínima'] <= preco_gatilho]
+            if not primeiro_candle_abaixo.empty: candle_gatilho = primeiro_candle_abaixo.iloc[0]
+        if candle_gatilho is not None:
+            hora_entrada, hora_saida = candle_gatilho.name, datetime.datetime.combine(dia.date(), hora_final)
+            if hora_saida > hora_entrada:
+                candle_saida_lookup = df_original.asof(hora_saida)
+                dados_operacao = dados_do_dia.loc[hora_entrada:hora_saida]
+                if dados_operacao.empty: continue
+                dias_com_gatilho.append({'Timestamp': dia, 'Hora Abertura': candle_gatilho.name.time(),'Abertura': preco_gatilho, 'Hora Máxima': dados_operacao['Máxima'].idxmax().time(),'Maxima': dados_operacao['Máxima'].max(), 'Hora Mínima': dados_operacao['Mínima'].idxmin().time(),'Minima': dados_operacao['Mínima'].min(), 'Hora Fechamento': candle_saida_lookup.name.time(),'Fechamento': candle_saida_lookup['Fechamento']})
+    if not dias_com_gatilho: return None
+    return pd.DataFrame(dias_com_gatilho).set_index('Timestamp')
+
+def horario_fixo_em_laco(df, hora_inicial, hora_final):
+    operacoes_diarias = []
+    for dia, dados_do_dia in df.groupby(df.index.date):
+        if hora_inicial >= hora_final: continue
+        dados_operacao = dados_do_dia.between_time(hora_inicial, hora_final)
+        if dados_operacao.empty: continue
+        candle_entrada = dados_operacao.iloc[0]
+        candle_saida = dados_operacao.iloc[-1]
+        operacoes_diarias.append({'Timestamp': pd.to_datetime(dia), 'Hora Abertura': candle_entrada.name.time(), 'Abertura': candle_entrada['Abertura'], 'Hora Máxima': dados_operacao['Máxima'].idxmax().time(), 'Maxima': dados_operacao['Máxima'].max(), 'Hora Mínima': dados_operacao['Mínima'].idxmin().time(), 'Minima': dados_operacao['Mínima'].min(), 'Hora Fechamento': candle_saida.name.time(), 'Fechamento': candle_saida['Fechamento']})
+    if not operacoes_diarias: return None
+    return pd.DataFrame(operacoes_diarias).set_index('Timestamp')
+
+def dados_com_falhas(semente, minutos_por_candle=15, dias_uteis=30):
+    # Pregões só em dias úteis (segundas sem fechamento do dia corrido anterior), candles faltando,
+    # linhas inteiras em NaN, linhas com NaN só em algumas colunas e um dia sem nenhum fechamento válido.
+    rng = np.random.default_rng(semente)
+    dados = gerar_ohlcv(dias_uteis, minutos_por_candle, semente=semente)
+    dados = dados[rng.random(len(dados)) > 0.1].copy()
+    linhas = rng.choice(len(dados), size=len(dados) // 20, replace=False)
+    dados.iloc[linhas[:len(linhas) // 2]] = np.nan
+    dados.iloc[linhas[len(linhas) // 2:], rng.integers(0, 4)] = np.nan
+    dia_sem_fechamento = dados.index.normalize() == dados.index.normalize().unique()[dias_uteis // 2]
+    dados.loc[dia_sem_fechamento, 'Fechamento'] = np.nan
+    return dados
+
+def assert_resumos_iguais(esperado, obtido):
+    if esperado is None:
+        assert obtido is None
+    else:
+        # pd.to_datetime(date) no laço escolhe a resolução conforme a versão do pandas; o motor mantém a dos dados
+        esperado.index = esperado.index.as_unit(obtido.index.unit)
+        pd.testing.assert_frame_equal(esperado, obtido, check_freq=False)
+
+@pytest.mark.parametrize('semente', range(4))
+@pytest.mark.parametrize('variacao', [0.5, -0.5, 1.5, -2.0])
+@pytest.mark.parametrize('hora_final', [datetime.time(17, 0), datetime.time(12, 7), datetime.time(10, 0), datetime.time(23, 0)])
+def test_gatilho_igual_ao_laco(semente, variacao, hora_final):
+    dados = dados_com_falhas(semente)
+    esperado = gatilho_em_laco(dados, variacao, hora_final)
+    assert_resumos_iguais(esperado, aplicar_gatilho_e_criar_resumo(dados, variacao, hora_final))
+    assert_resumos_iguais(esperado, aplicar_gatilho_e_criar_resumo(dados, variacao, hora_final, construir_indice_diario(dados)))
+
+@pytest.mark.parametrize('semente', range(4))
+@pytest.mark.parametrize('hora_inicial,hora_final', [(datetime.time(10, 0), datetime.time(17, 45)), (datetime.time(10, 7), datetime.time(13, 52)),
+                                                     (datetime.time(12, 0), datetime.time(12, 10)), (datetime.time(15, 0), datetime.time(11, 0))])
+def test_horario_fixo_igual_ao_laco(semente, hora_inicial, hora_final):
+    dados = dados_com_falhas(semente)
+    try:
+        esperado = horario_fixo_em_laco(dados, hora_inicial, hora_final)
+    except ValueError:
+        # O laço quebrava (idxmax sem valores) quando a janela do dia só tinha candles em NaN; o motor não quebra
+        criar_resumo_por_horario_fixo(dados, hora_inicial, hora_final)
+        return
+    assert_resumos_iguais(esperado, criar_resumo_por_horario_fixo(dados, hora_inicial, hora_final))
+    assert_resumos_iguais(esperado, criar_resumo_por_horario_fixo(dados, hora_inicial, hora_final, construir_indice_diario(dados)))
+
+@pytest.mark.parametrize('variacao', [0.5, -1.0])
+def test_niveis_da_piramide_iguais_ao_laco(variacao):
+    dados = dados_com_falhas(7, minutos_por_candle=5)
+    piramide = construir_piramide(dados)
+    for nivel, quadro in piramide.intraday.items():
+        esperado = gatilho_em_laco(quadro, variacao, datetime.time(16, 33))
+        assert_resumos_iguais(esperado, aplicar_gatilho_e_criar_resumo(quadro, variacao, datetime.time(16, 33), piramide.indices[nivel]))
+
+@pytest.mark.parametrize('semente', range(3))
+def test_otimizacao_de_janelas_igual_ao_horario_fixo(semente):
+    # Candles de 30 min com buracos: em vários dias falta o candle exato da entrada ou da saída e o par usa o
+    # primeiro candle depois da hora inicial / o último antes da hora final, como criar_resumo_por_horario_fixo.
+    dados = dados_com_falhas(semente, minutos_por_candle=30, dias_uteis=20)
+    grade = otimizar_janelas_intraday(dados)
+    horarios = sorted(set(dados.index.time))
+    pares = [(inicio, fim) for posicao, inicio in enumerate(horarios) for fim in horarios[posicao + 1:]]
+    assert list(grade.index) == [(tipo, inicio, fim) for tipo in ('Compra', 'Venda') for inicio, fim in pares]
+    for tipo in ('Compra', 'Venda'):
+        for inicio, fim in pares:
+            linha = grade.loc[(tipo, inicio, fim)]
+            resumo = criar_resumo_por_horario_fixo(dados, inicio, fim)
+            metricas = calcular_metricas_de_resumo(resumo, tipo)
+            if metricas is None:
+                assert linha["Total de Trades"] == 0
+                continue
+            np.testing.assert_allclose(linha.to_numpy(dtype=float), np.array(list(metricas.values()), dtype=float), rtol=1e-12, err_msg=f"{tipo} {inicio}-{fim}")
+
+def test_otimizacao_de_janelas_sem_candle_na_entrada_ou_saida():
+    dados = gerar_ohlcv(5, 60)
+    dias = dados.index.normalize().unique()
+    # Dia 1 sem o candle das 10h (entrada), dia 2 sem o das 13h (saída), dia 3 sem nenhum candle entre 11h e 12h
+    removidos = [dias[1] + pd.Timedelta(hours=10), dias[2] + pd.Timedelta(hours=13), dias[3] + pd.Timedelta(hours=11), dias[3] + pd.Timedelta(hours=12)]
+    dados = dados.drop(removidos)
+    grade = otimizar_janelas_intraday(dados, tipos_operacao=('Compra',))
+    for inicio, fim in [(datetime.time(10), datetime.time(13)), (datetime.time(11), datetime.time(12)), (datetime.time(10), datetime.time(17))]:
+        resumo = criar_resumo_por_horario_fixo(dados, inicio, fim)
+        linha = grade.loc[('Compra', inicio, fim)]
+        assert linha["Total de Trades"] == len(resumo)
+        np.testing.assert_allclose(linha.to_numpy(dtype=float), np.array(list(calcular_metricas_de_resumo(resumo, 'Compra').values()), dtype=float), rtol=1e-12)
+    # A janela 11h-12h não tem candle no dia 3: ele não conta como trade
+    assert grade.loc[('Compra', datetime.time(11), datetime.time(12)), "Total de Trades"] == len(dias) - 1
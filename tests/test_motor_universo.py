@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from motor_backtest import alinhar_universo, calcular_metricas_de_resumo, preparar_dados_day_trade, simular_day_trade_com_percentagens, simular_day_trade_universo
+
+# A simulação do universo tem de dar, ticker a ticker, as mesmas métricas da simulação individual, e a curva
+# combinada tem de ser a média diária dos trades abertos. Os tickers têm históricos de tamanhos diferentes.
+
+@pytest.fixture(scope='module')
+def universo():
+    dados = {f"T{posicao}": preparar_dados_day_trade(gerar_ohlcv(250 - 10 * posicao, semente=posicao, inicio=pd.Timestamp('2019-01-02') + pd.offsets.BDay(10 * posicao))) for posicao in range(6)}
+    return dados, alinhar_universo(dados)
+
+@pytest.mark.parametrize('tipo_operacao', ['Compra', 'Venda'])
+@pytest.mark.parametrize('variacao', [0.5, -1.0, 2.5])
+def test_universo_igual_a_simulacao_por_ticker(universo, tipo_operacao, variacao):
+    dados, alinhado = universo
+    ranking, curva = simular_day_trade_universo(alinhado, variacao, tipo_operacao)
+    resultados = {ticker: simular_day_trade_com_percentagens(df, variacao, tipo_operacao) for ticker, df in dados.items()}
+    for ticker, resultado in resultados.items():
+        metricas = calcular_metricas_de_resumo(resultado, tipo_operacao)
+        if metricas is None:
+            assert ranking.loc[ticker, 'Total de Trades'] == 0
+            continue
+        for nome, valor in metricas.items(): assert np.isclose(ranking.loc[ticker, nome], valor, equal_nan=True), (ticker, nome)
+    por_dia = pd.concat([resultado['Resultado %'] for resultado in resultados.values() if resultado is not None]).groupby(level=0).mean()
+    assert np.allclose(curva['Resultado Médio (%)'].dropna().to_numpy(), por_dia.to_numpy() * 100)
+    assert np.isclose(curva['Resultado Acumulado (%)'].iloc[-1], por_dia.sum() * 100)
+
+def test_alinhar_universo_sem_dados():
+    assert alinhar_universo({}) is None
+    assert alinhar_universo({'T0': pd.DataFrame()}) is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import motor_backtest
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from motor_backtest import calcular_metricas_de_resumo, preparar_dados_day_trade, reamostrar_trades, simular_day_trade_com_percentagens
+
+def resumo_day_trade(tipo_operacao='Compra'):
+    # 221 trades: um total ímpar, que não divide os blocos de forma exata
+    return simular_day_trade_com_percentagens(preparar_dados_day_trade(gerar_ohlcv(300)), -0.5, tipo_operacao)
+
+@pytest.mark.parametrize('metodo', ['bootstrap', 'embaralhamento'])
+def test_mesma_semente_mesmo_resultado(metodo):
+    resumo = resumo_day_trade()
+    tabela, drawdowns = reamostrar_trades(resumo, 'Compra', reamostragens=500, metodo=metodo, semente=7)
+    outra_tabela, outros_drawdowns = reamostrar_trades(resumo, 'Compra', reamostragens=500, metodo=metodo, semente=7)
+    pd.testing.assert_frame_equal(tabela, outra_tabela)
+    np.testing.assert_array_equal(drawdowns, outros_drawdowns)
+    assert not np.array_equal(drawdowns, reamostrar_trades(resumo, 'Compra', reamostragens=500, metodo=metodo, semente=8)[1])
+
+@pytest.mark.parametrize('metodo', ['bootstrap', 'embaralhamento'])
+@pytest.mark.parametrize('elementos_por_bloco', [1, 1000, 5000])
+def test_resultado_nao_depende_do_tamanho_do_bloco(monkeypatch, metodo, elementos_por_bloco):
+    resumo = resumo_day_trade()
+    tabela, drawdowns = reamostrar_trades(resumo, 'Compra', reamostragens=301, metodo=metodo)
+    monkeypatch.setattr(motor_backtest, 'ELEMENTOS_POR_BLOCO', elementos_por_bloco)
+    tabela_em_blocos, drawdowns_em_blocos = reamostrar_trades(resumo, 'Compra', reamostragens=301, metodo=metodo)
+    # Só a ordem das somas entre blocos muda
+    pd.testing.assert_frame_equal(tabela, tabela_em_blocos, check_exact=False, rtol=1e-12)
+    np.testing.assert_allclose(drawdowns, drawdowns_em_blocos, rtol=1e-12)
+
+@pytest.mark.parametrize('tipo_operacao', ['Compra', 'Venda'])
+def test_observado_igual_ao_resumo(tipo_operacao):
+    resumo = resumo_day_trade(tipo_operacao)
+    tabela, _ = reamostrar_trades(resumo, tipo_operacao, reamostragens=200)
+    metricas = calcular_metricas_de_resumo(resumo, tipo_operacao)
+    assert list(tabela.index) == list(metricas) + ["Drawdown Máximo (%)"]
+    np.testing.assert_allclose(tabela.loc[list(metricas), "Observado"].to_numpy(dtype=float), np.array(list(metricas.values()), dtype=float), rtol=1e-12)
+    assert list(tabela.columns) == ["Observado", "Média", "IC Inferior", "IC Superior"]
+
+def test_embaralhamento_nao_muda_o_resultado_total():
+    resumo = resumo_day_trade()
+    tabela, drawdowns = reamostrar_trades(resumo, 'Compra', reamostragens=300, metodo='embaralhamento')
+    # Só a ordem dos trades muda: o acumulado é o mesmo em toda sequência, o drawdown não
+    linha = tabela.loc["Resultado Final Acumulado (%)"]
+    np.testing.assert_allclose(linha[["Média", "IC Inferior", "IC Superior"]].to_numpy(dtype=float), linha["Observado"], rtol=1e-9)
+    assert drawdowns.min() < drawdowns.max()
+
+def test_metodo_desconhecido():
+    with pytest.raises(ValueError):
+        reamostrar_trades(resumo_day_trade(), 'Compra', metodo='jackknife')
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from tarefas import ExecutorTarefas
+
+def esperar(tarefa, limite=10):
+    for _ in range(limite * 100):
+        if not tarefa.ativa: return tarefa
+        time.sleep(0.01)
+    raise AssertionError(f"A tarefa {tarefa.chave} não terminou.")
+
+@pytest.fixture
+def executor():
+    executor = ExecutorTarefas(max_workers=2, max_por_usuario=2)
+    yield executor
+    executor.encerrar()
+
+def test_cancelar_para_no_proximo_informar(executor):
+    iniciou, liberar, passos = threading.Event(), threading.Event(), []
+    def longa(tarefa):
+        iniciou.set()
+        liberar.wait(5)
+        for passo in range(100):
+            tarefa.informar(passo, 100)
+            passos.append(passo)
+        return 'terminou'
+    tarefa = executor.enviar('u1', 'longa', "Longa", longa)
+    assert iniciou.wait(5) and tarefa.estado == 'Executando'
+    executor.cancelar('longa')
+    liberar.set()
+    esperar(tarefa)
+    assert tarefa.estado == 'Cancelada' and passos == [] and not tarefa.ativa
+    assert executor.resultado('longa') is None
+
+def test_mesma_chave_reaproveita_a_tarefa_em_andamento(executor):
+    liberar, chamadas = threading.Event(), []
+    def funcao(tarefa, valor):
+        chamadas.append(valor)
+        liberar.wait(5)
+        return valor * 2
+    primeira = executor.enviar('u1', ('chave', 1), "Dobro", funcao, 21)
+    # Outra sessão com os mesmos parâmetros recebe a mesma tarefa
+    assert executor.enviar('u2', ('chave', 1), "Dobro", funcao, 21) is primeira
+    liberar.set()
+    esperar(primeira)
+    assert chamadas == [21] and primeira.estado == 'Concluída'
+
+def test_limite_por_usuario(executor):
+    liberar = threading.Event()
+    bloqueada = lambda tarefa: liberar.wait(5)
+    executor.enviar('u1', 'a', "A", bloqueada)
+    executor.enviar('u1', 'b', "B", bloqueada)
+    with pytest.raises(ValueError):
+        executor.enviar('u1', 'c', "C", bloqueada)
+    # O limite é por usuário
+    outra = executor.enviar('u2', 'c', "C", bloqueada)
+    liberar.set()
+    esperar(outra)
+    for tarefa in executor.tarefas('u1'): esperar(tarefa)
+    assert executor.enviar('u1', 'd', "D", lambda tarefa: 1) is not None
+
+def test_resultado_guardado_depois_de_terminar(executor):
+    chamadas = []
+    def funcao(tarefa):
+        chamadas.append(1)
+        tarefa.informar(1, 1, "pronto")
+        return {'valor': 42}
+    tarefa = esperar(executor.enviar('u1', 'r', "R", funcao))
+    assert tarefa.estado == 'Concluída' and tarefa.progresso == 1.0 and tarefa.duracao() >= 0
+    assert executor.resultado('r') == {'valor': 42}
+    # Reenviar com o resultado ainda guardado não roda de novo
+    assert executor.enviar('u2', 'r', "R", funcao) is tarefa and chamadas == [1]
+    executor.descartar('r')
+    assert executor.resultado('r') is None and executor.obter('r') is None
+    esperar(executor.enviar('u1', 'r', "R", funcao))
+    assert chamadas == [1, 1]
+
+def test_erro_fica_registrado(executor):
+    def falha(tarefa): raise RuntimeError("quebrou")
+    tarefa = esperar(executor.enviar('u1', 'erro', "Erro", falha))
+    assert tarefa.estado == 'Erro' and tarefa.erro == "quebrou" and executor.resultado('erro') is None
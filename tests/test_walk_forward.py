@@ -0,0 +1,66 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_ohlcv
+from motor_backtest import preparar_dados_day_trade
+from walk_forward import criar_pool_processos, executar_walk_forward, planejar_dobras
+
+@pytest.fixture(scope='module')
+def intraday():
+    return gerar_ohlcv(80, 15, semente=2)
+
+@pytest.fixture(scope='module')
+def day_trade():
+    return preparar_dados_day_trade(gerar_ohlcv(400, semente=5))
+
+@pytest.mark.parametrize('dias_treino,dias_teste,passo', [(20, 5, None), (30, 10, None), (20, 5, 10)])
+def test_dobras_em_ordem_e_sem_vazamento(intraday, dias_treino, dias_teste, passo):
+    dobras = planejar_dobras(intraday.index, dias_treino, dias_teste, passo)
+    dias = intraday.index.normalize()
+    assert len(dobras) == (dias.nunique() - dias_treino - dias_teste) // (passo or dias_teste) + 1
+    for inicio, inicio_teste, fim in dobras:
+        assert 0 <= inicio < inicio_teste < fim <= len(intraday)
+        # Janelas de dias inteiros: o treino termina num dia anterior ao primeiro dia do teste
+        assert dias[inicio_teste - 1] < dias[inicio_teste]
+        assert inicio == 0 or dias[inicio - 1] < dias[inicio]
+        assert dias[inicio:inicio_teste].nunique() == dias_treino and dias[inicio_teste:fim].nunique() == dias_teste
+    for (inicio, inicio_teste, fim), (proximo_inicio, proximo_teste, proximo_fim) in zip(dobras, dobras[1:]):
+        assert proximo_inicio > inicio and proximo_teste >= fim
+        if passo is None: assert proximo_teste == fim
+
+def test_dobras_sem_historico_suficiente(intraday):
+    assert planejar_dobras(intraday.index, 70, 20) == []
+
+def test_walk_forward_day_trade_paralelo_igual_ao_serial(day_trade):
+    serial = executar_walk_forward(day_trade, 'daytrade', 120, 20, 'Compra', [-1.0, 0.5, 1.5], max_workers=1)
+    paralelo = executar_walk_forward(day_trade, 'daytrade', 120, 20, 'Compra', [-1.0, 0.5, 1.5], max_workers=2)
+    assert list(serial[0].index) == list(range(1, len(serial[0]) + 1))
+    pd.testing.assert_frame_equal(serial[0], paralelo[0])
+    pd.testing.assert_frame_equal(serial[2], paralelo[2])
+    assert serial[1] == paralelo[1]
+    # Os testes fora da amostra não se sobrepõem e ficam depois do treino da própria dobra
+    tabela = serial[0]
+    assert (tabela['Fim Treino'] < tabela['Início Teste']).all()
+    assert (tabela['Início Teste'].iloc[1:].to_numpy() > tabela['Fim Teste'].iloc[:-1].to_numpy()).all()
+    assert serial[2].index.is_unique and serial[2].index.is_monotonic_increasing
+
+def test_walk_forward_intraday_em_pool_compartilhado(intraday):
+    argumentos = (intraday, 'intraday', 20, 5, 'Venda', [0.5, -0.5], [datetime.time(13, 0), datetime.time(17, 0)])
+    serial = executar_walk_forward(*argumentos, max_workers=1)
+    pool = criar_pool_processos(2)
+    try:
+        progresso = []
+        compartilhado = executar_walk_forward(*argumentos, pool=pool, progresso=lambda feitas, total: progresso.append(feitas))
+    finally:
+        pool.shutdown()
+    pd.testing.assert_frame_equal(serial[0], compartilhado[0])
+    pd.testing.assert_frame_equal(serial[2], compartilhado[2])
+    assert progresso == list(range(1, len(serial[0]) + 1))
+
+def test_walk_forward_interrompido_pelo_progresso(day_trade):
+    def interromper(feitas, total):
+        if feitas == 2: raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        executar_walk_forward(day_trade, 'daytrade', 120, 20, 'Compra', [1.0], max_workers=2, progresso=interromper)
@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from motor_backtest import (aplicar_gatilho_e_criar_resumo, calcular_metricas_de_resumo, construir_indice_diario, criar_resumo_por_horario_fixo,
+                            otimizar_janelas_intraday, simular_day_trade_com_percentagens, varrer_variacoes_day_trade)
+
+# Avaliação fora da amostra: o histórico é dividido em dobras móveis de treino/teste (em dias de pregão),
+# o melhor parâmetro é escolhido no treino e pontuado no teste seguinte. As dobras são independentes e
+# rodam num pool de processos; cada processo recebe só a fatia de dados da sua dobra.
+
+CRITERIO_PADRAO = "Resultado Final Acumulado (%)"
+# Processos por walk-forward quando não informado, e tamanho do pool compartilhado do app.
+PROCESSOS_PADRAO = min(4, os.cpu_count() or 1)
+
+def _contexto_processos():
+    # O walk-forward também roda a partir de threads (o executor de tarefas do app), e fork a partir de um
+    # processo com várias threads pode herdar travas presas; forkserver/spawn partem de um processo limpo.
+    if 'forkserver' not in multiprocessing.get_all_start_methods(): return multiprocessing.get_context('spawn')
+    contexto = multiprocessing.get_context('forkserver')
+    # O servidor pré-carrega só o que os processos usam (o motor e este módulo, com numpy e pandas), no lugar do
+    # padrão '__main__': cada processo nasce dele com tudo já importado.
+    contexto.set_forkserver_preload(['motor_backtest', __name__])
+    return contexto
+
+def criar_pool_processos(max_workers=PROCESSOS_PADRAO):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_contexto_processos())
+
+def planejar_dobras(indice, dias_treino, dias_teste, passo=None):
+    # Posições [inicio_treino, inicio_teste, fim_teste) no índice para cada dobra. As dobras andam
+    # `passo` dias (padrão: o tamanho do teste, de modo que os testes não se sobrepõem).
+    passo = passo or dias_teste
+    dias = indice.normalize().unique()
+    limites = np.searchsorted(indice.values, dias.values)
+    limites = np.append(limites, len(indice))
+    dobras = []
+    for primeiro_dia in range(0, len(dias) - dias_treino - dias_teste + 1, passo):
+        inicio_teste = primeiro_dia + dias_treino
+        dobras.append((limites[primeiro_dia], limites[inicio_teste], limites[inicio_teste + dias_teste]))
+    return dobras
+
+def _melhor_linha(grade, criterio, minimo_trades):
+    # Linha da grade com o melhor critério entre as configurações com trades suficientes (primeira em empate).
+    elegiveis = grade[grade["Total de Trades"] >= minimo_trades]
+    valores = elegiveis[criterio].to_numpy(dtype=float)
+    if len(valores) == 0 or np.isnan(valores).all(): return None
+    return elegiveis.iloc[int(np.nanargmax(valores))]
+
+def _escolher_day_trade(treino, parametros):
+    grade = varrer_variacoes_day_trade(treino, parametros['variacoes'], (parametros['tipo_operacao'],))
+    melhor = _melhor_linha(grade, parametros['criterio'], parametros['minimo_trades'])
+    if melhor is None: return None, np.nan
+    return {'Variação Teste (%)': melhor.name[1]}, melhor[parametros['criterio']]
+
+def _escolher_intraday(treino, parametros):
+    tipo_operacao, criterio = parametros['tipo_operacao'], parametros['criterio']
+    if not parametros.get('variacoes'):
+        grade = otimizar_janelas_intraday(treino, (tipo_operacao,))
+        melhor = _melhor_linha(grade, criterio, parametros['minimo_trades']) if grade is not None else None
+        if melhor is None: return None, np.nan
+        return {'Hora Inicial': melhor.name[1], 'Hora Final': melhor.name[2]}, melhor[criterio]
+    # Gatilho por variação: grade variação x hora final, com o índice por dia montado uma vez para o treino.
+    indice = construir_indice_diario(treino)
+    linhas = []
+    for variacao in parametros['variacoes']:
+        for hora_final in parametros['horas_finais']:
+            metricas = calcular_metricas_de_resumo(aplicar_gatilho_e_criar_resumo(treino, variacao, hora_final, indice), tipo_operacao)
+            if metricas: linhas.append({'Variação Teste (%)': variacao, 'Hora Final': hora_final, **metricas})
+    if not linhas: return None, np.nan
+    grade = pd.DataFrame(linhas).set_index(['Variação Teste (%)', 'Hora Final'])
+    melhor = _melhor_linha(grade, criterio, parametros['minimo_trades'])
+    if melhor is None: return None, np.nan
+    return {'Variação Teste (%)': melhor.name[0], 'Hora Final': melhor.name[1]}, melhor[criterio]
+
+def _resumo_teste(dados, inicio_teste, escolha, parametros):
+    tipo_operacao = parametros['tipo_operacao']
+    teste = dados.iloc[inicio_teste:]
+    if parametros['modo'] == 'daytrade':
+        return simular_day_trade_com_percentagens(teste, escolha['Variação Teste (%)'], tipo_operacao)
+    if 'Variação Teste (%)' not in escolha:
+        return criar_resumo_por_horario_fixo(teste, escolha['Hora Inicial'], escolha['Hora Final'])
+    # O gatilho precisa do fechamento do dia anterior: roda a partir do último dia do treino e descarta esse dia.
+    primeiro_dia_teste = teste.index[0].normalize()
+    contexto = dados.iloc[dados.index.searchsorted(dados.index[inicio_teste - 1].normalize()):]
+    resumo = aplicar_gatilho_e_criar_resumo(contexto, escolha['Variação Teste (%)'], escolha['Hora Final'])
+    if resumo is None: return None
+    resumo = resumo[resumo.index >= primeiro_dia_teste]
+    return resumo if len(resumo) else None
+
+def avaliar_dobra(tarefa):
+    # Executada em outro processo: recebe (número, fatia treino+teste, posição do início do teste, parâmetros).
+    numero, dados, inicio_teste, parametros = tarefa
+    treino = dados.iloc[:inicio_teste]
+    escolher = _escolher_day_trade if parametros['modo'] == 'daytrade' else _escolher_intraday
+    escolha, criterio_treino = escolher(treino, parametros)
+    linha = {'Dobra': numero, 'Início Treino': treino.index[0], 'Fim Treino': treino.index[-1],
+             'Início Teste': dados.index[inicio_teste], 'Fim Teste': dados.index[-1], **(escolha or {}), f"Treino: {parametros['criterio']}": criterio_treino}
+    resumo = _resumo_teste(dados, inicio_teste, escolha, parametros) if escolha is not None else None
+    metricas = calcular_metricas_de_resumo(resumo, parametros['tipo_operacao']) or {"Total de Trades": 0}
+    return linha, metricas, resumo
+
+def executar_walk_forward(df, modo, dias_treino, dias_teste, tipo_operacao='Compra', variacoes=None, horas_finais=None, passo=None,
+                          criterio=CRITERIO_PADRAO, minimo_trades=1, max_workers=None, progresso=None, pool=None):
+    # modo 'daytrade': escolhe a variação (df de preparar_dados_day_trade). modo 'intraday': escolhe a janela fixa
+    # (hora inicial x hora final) ou, se `variacoes` for dado, a variação do gatilho x hora final.
+    # Retorna (tabela por dobra, métricas agregadas de todos os testes, resumo fora da amostra concatenado).
+    # `progresso(dobras_feitas, total)` é chamado a cada dobra avaliada; se levantar exceção, as dobras restantes são abandonadas.
+    # `pool`: pool de processos compartilhado (de criar_pool_processos), onde as dobras de vários walk-forwards
+    # simultâneos dividem os mesmos processos; sem ele, a chamada abre e fecha um pool próprio de `max_workers`.
+    if not df.index.is_monotonic_increasing: df = df.sort_index()
+    if modo == 'daytrade' and not variacoes: raise ValueError("O walk-forward do Day Trade precisa de ao menos uma variação de teste.")
+    if modo == 'intraday' and variacoes and not horas_finais: raise ValueError("O gatilho por variação precisa de ao menos uma hora final.")
+    parametros = {'modo': modo, 'tipo_operacao': tipo_operacao, 'variacoes': list(variacoes or []), 'horas_finais': list(horas_finais or []),
+                  'criterio': criterio, 'minimo_trades': minimo_trades}
+    dobras = planejar_dobras(df.index, dias_treino, dias_teste, passo)
+    if not dobras: return None, None, None
+    tarefas = [(numero, df.iloc[inicio:fim], inicio_teste - inicio, parametros) for numero, (inicio, inicio_teste, fim) in enumerate(dobras, start=1)]
+    max_workers = min(max_workers or PROCESSOS_PADRAO, len(tarefas))
+    resultados = []
+    if pool is None and max_workers <= 1:
+        for tarefa in tarefas:
+            resultados.append(avaliar_dobra(tarefa))
+            if progresso: progresso(len(resultados), len(tarefas))
+    else:
+        executor = pool if pool is not None else criar_pool_processos(max_workers)
+        futuros = [executor.submit(avaliar_dobra, tarefa) for tarefa in tarefas]
+        try:
+            for futuro in futuros:
+                resultados.append(futuro.result())
+                if progresso: progresso(len(resultados), len(tarefas))
+        except BaseException:
+            for futuro in futuros: futuro.cancel()
+            if pool is None: executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        if pool is None: executor.shutdown()
+    tabela = pd.DataFrame([{**linha, **{f"Teste: {nome}": valor for nome, valor in metricas.items()}} for linha, metricas, _ in resultados]).set_index('Dobra')
+    resumos = [resumo for _, _, resumo in resultados if resumo is not None]
+    resumo_fora_da_amostra = pd.concat(resumos) if resumos else None
+    return tabela, calcular_metricas_de_resumo(resumo_fora_da_amostra, tipo_operacao), resumo_fora_da_amostra